@@ -0,0 +1,85 @@
+"""bench_decode.py - messages/sec for compiled root block decoders
+
+usage: PYTHONPATH=. python benchmarks/bench_decode.py [schema.xml [message name ...]]
+"""
+import os
+import struct
+import sys
+import timeit
+
+from pysbe.codec.compiler import compileSchema
+from pysbe.codec.source import leafFormat, structPrefix
+from pysbe.parser.fix_parser import SBESpecParser
+
+DEFAULT_SCHEMA = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "tests", "data", "car.xml"
+)
+
+NUMBER = 200000
+
+
+def perFieldDecoder(layout, byteOrder):
+    """reference decoder that unpacks one field at a time"""
+    prefix = structPrefix(byteOrder)
+    unpackers = [
+        (
+            leaf.name,
+            struct.Struct(prefix + leafFormat(leaf)[0]).unpack_from,
+            leaf.offset,
+        )
+        for field in layout.fields
+        for leaf in field.leaves()
+        if leaf.size
+    ]
+
+    def decode(buffer, offset=0):
+        return {
+            name: unpack_from(buffer, offset + fieldOffset)[0]
+            for name, unpack_from, fieldOffset in unpackers
+        }
+
+    return decode
+
+
+def flyweightReader(codec, fieldCount=3):
+    """read the first fieldCount fields through a re-wrapped flyweight"""
+    names = [field.name for field in codec.layout.fields if field.size][:fieldCount]
+    decoder = codec.Decoder()
+    getters = [getattr(codec.Decoder, name).fget for name in names]
+
+    def decode(buffer, offset=0):
+        decoder.wrap(buffer, offset)
+        return [getter(decoder) for getter in getters]
+
+    return decode
+
+
+def rate(decode, buffer, number=NUMBER):
+    """return decode calls per second"""
+    elapsed = timeit.timeit(lambda: decode(buffer, 0), number=number)
+    return number / elapsed
+
+
+def main(argv):
+    filename = argv[1] if len(argv) > 1 else DEFAULT_SCHEMA
+    messageSchema = SBESpecParser().parseFile(filename)
+    schemaCodec = compileSchema(messageSchema)
+    names = argv[2:] or list(messageSchema.message_name_map)
+    for name in names:
+        codec = schemaCodec[name]
+        # root block pattern followed by empty groups and data
+        block = bytes(range(256)) * (codec.blockLength // 256 + 1)
+        buffer = memoryview(block[: codec.blockLength] + bytes(256))
+        compiled = rate(codec.decode, buffer)
+        perField = rate(perFieldDecoder(codec.layout, schemaCodec.byteOrder), buffer)
+        flyweight = rate(flyweightReader(codec), buffer)
+        print(
+            f"{name} (blockLength {codec.blockLength}):"
+            f" compiled {compiled:,.0f} messages/sec,"
+            f" per-field {perField:,.0f} messages/sec,"
+            f" flyweight 3 fields {flyweight:,.0f} messages/sec"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,159 @@
+"""bench_parse.py - schema parse time with compiled attribute validators
+
+usage: PYTHONPATH=. python benchmarks/bench_parse.py [schema.xml ...]
+"""
+import glob
+import io
+import os
+import sys
+import timeit
+
+from pysbe.parser import fix_parser
+from pysbe.parser.fix_parser import ALL_ATTRIBUTES_MAP, MISSING, SBESpecParser
+
+DATA_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "tests", "data"
+)
+
+NUMBER = 50
+
+REPEAT = 5
+
+
+def interpretedAttributes(self, element, attributes):
+    """reference, the validator before compileAttributes, reads every spec"""
+    result_attributes = {}
+    for attribute in attributes:
+        attrib_info = ALL_ATTRIBUTES_MAP[attribute]
+        if attrib_info.get("default", MISSING) is not MISSING:
+            default_value = attrib_info["default"]
+        else:
+            default_value = MISSING
+        attribute_name = attrib_info.get("attribute_name", attribute)
+        value = element.attrib.get(attribute_name, default_value)
+        if value is MISSING or value == "":
+            if attrib_info.get("use") == "optional":
+                continue
+
+            else:
+                raise ValueError(
+                    f"element {element.tag} missing required "
+                    f"attribute {attribute_name}"
+                )
+
+        if attrib_info.get("type"):
+            try:
+                value = attrib_info["type"](value)
+            except ValueError as exc:
+                raise ValueError(
+                    f"element {element.tag} invalid value "
+                    f"{repr(value)} for attribute {attribute_name}"
+                ) from exc
+
+        if attrib_info.get("minimumValue"):
+            if value < attrib_info["minimumValue"]:
+                raise ValueError(
+                    f"element {element.tag} invalid value {repr(value)}"
+                    f" for attribute {attribute_name},"
+                    "less than allowed minimum "
+                    f"{repr(attrib_info['minimumValue'])}"
+                )
+
+        if attrib_info.get("pattern"):
+            if not attrib_info["pattern"].match(value):
+                raise ValueError(
+                    f"element {element.tag} invalid value {repr(value)} "
+                    f"for attribute {attribute_name},"
+                    "does not match expected pattern "
+                    f"{repr(attrib_info['pattern'])}"
+                )
+
+        if attrib_info.get("map"):
+            try:
+                value = attrib_info["map"][value]
+            except (KeyError, IndexError) as exc:
+                raise ValueError(
+                    f"element {element.tag} invalid value {repr(value)} "
+                    f"for attribute {attribute_name}"
+                    f", must be one of {repr(attrib_info['map'].keys())}"
+                ) from exc
+
+        if attrib_info.get("rename"):
+            attribute = attrib_info["rename"]
+
+        result_attributes[attribute] = value
+
+    return result_attributes
+
+
+def recordCalls(content: bytes) -> list:
+    """return (element, attributes) of every validator call parsing content"""
+    calls = []
+    compiled = fix_parser.BaseParser.parse_common_attributes
+
+    def record(self, element, attributes):
+        calls.append((element, attributes))
+        return compiled(self, element, attributes)
+
+    fix_parser.BaseParser.parse_common_attributes = record
+    try:
+        SBESpecParser().parseFile(io.BytesIO(content))
+    finally:
+        fix_parser.BaseParser.parse_common_attributes = compiled
+
+    return calls
+
+
+def bestTimes(content: bytes, validator, calls, number=NUMBER) -> tuple:
+    """return best seconds per parse and per validation of every element"""
+    compiled = fix_parser.BaseParser.parse_common_attributes
+    parser = fix_parser.BaseParser()
+    fix_parser.BaseParser.parse_common_attributes = validator
+    try:
+        parse = timeit.timeit(
+            lambda: SBESpecParser().parseFile(io.BytesIO(content)), number=number
+        )
+    finally:
+        fix_parser.BaseParser.parse_common_attributes = compiled
+
+    def validate():
+        for element, attributes in calls:
+            validator(parser, element, attributes)
+
+    return parse / number, timeit.timeit(validate, number=number) / number
+
+
+def main(argv):
+    filenames = argv[1:] or sorted(glob.glob(os.path.join(DATA_DIRECTORY, "*.xml")))
+    compiled = fix_parser.BaseParser.parse_common_attributes
+    for filename in filenames:
+        with open(filename, "rb") as schemaFile:
+            content = schemaFile.read()
+
+        try:
+            calls = recordCalls(content)
+        except ValueError:
+            # invalid samples exercise error handling, not parse speed
+            continue
+
+        # alternate the validators so machine noise affects both alike
+        results = {compiled: [], interpretedAttributes: []}
+        for _ in range(REPEAT):
+            for validator, times in results.items():
+                times.append(bestTimes(content, validator, calls))
+
+        current = [min(values) for values in zip(*results[compiled])]
+        interpreted = [min(values) for values in zip(*results[interpretedAttributes])]
+        print(
+            f"{os.path.basename(filename)}:"
+            f" parse {current[0] * 1000:.2f} ms"
+            f" (interpreted {interpreted[0] * 1000:.2f} ms,"
+            f" {interpreted[0] / current[0]:.2f}x),"
+            f" attributes {current[1] * 1000:.2f} ms"
+            f" (interpreted {interpreted[1] * 1000:.2f} ms,"
+            f" {interpreted[1] / current[1]:.2f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,165 @@
+"""cache.py - persistent cache of parsed schemas and compiled codecs
+
+Entries are keyed by a hash of the schema file content, so an edited
+schema is parsed again while an unchanged one is loaded with a single
+unpickle. The built MessageSchema, including its layouts, is pickled
+together with the marshalled byte code of every generated codec, which
+skips both xml parsing and code generation on later loads. The key also
+covers the pysbe version and sources, an upgraded or edited pysbe never
+loads what another one pickled.
+
+usage:
+
+    cache = SchemaCache()
+    schemaCodec = cache.loadCodec("schema.xml")
+"""
+import functools
+import hashlib
+import io
+import marshal
+import os
+import pickle
+import sys
+import tempfile
+
+import pysbe
+from pysbe.codec.compiler import SchemaCodec
+from pysbe.parser.fix_parser import SBESpecParser
+
+# bump when the pickled schema or generated code changes shape
+CACHE_FORMAT_VERSION = 4
+
+CACHE_DIR_ENVIRONMENT = "PYSBE_CACHE_DIR"
+
+
+def defaultCacheDirectory() -> str:
+    """return $PYSBE_CACHE_DIR or ~/.cache/pysbe"""
+    directory = os.environ.get(CACHE_DIR_ENVIRONMENT)
+    if directory:
+        return directory
+
+    return os.path.join(os.path.expanduser("~"), ".cache", "pysbe")
+
+
+@functools.lru_cache(maxsize=None)
+def sourceDigest() -> str:
+    """return a hash of the pysbe sources generating and pickling codecs"""
+    digest = hashlib.sha256()
+    root = os.path.dirname(os.path.abspath(pysbe.__file__))
+    for directory, subdirectories, filenames in sorted(os.walk(root)):
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            if filename.endswith(".py"):
+                path = os.path.join(directory, filename)
+                digest.update(os.path.relpath(path, root).encode("utf-8"))
+                with open(path, "rb") as sourceFile:
+                    digest.update(sourceFile.read())
+
+    return digest.hexdigest()
+
+
+def dumpCompiled(schemaCodec: SchemaCodec) -> dict:
+    """return the generated code of every compiled message in picklable form"""
+    codecs = {}
+    for name, codec in schemaCodec.messages.items():
+        source, code, names = codec.compiled
+        codecs[name] = (source, marshal.dumps(code), names)
+
+    return codecs
+
+
+def loadCompiled(codecs: dict) -> dict:
+    """return SchemaCodec compiled argument from dumpCompiled output"""
+    return {
+        name: (source, marshal.loads(code), names)
+        for name, (source, code, names) in codecs.items()
+    }
+
+
+class SchemaCache:
+    """load schemas and codecs through an on-disk cache"""
+
+    def __init__(self, directory: str = None) -> None:
+        self.directory = directory or defaultCacheDirectory()
+
+    def key(self, content: bytes) -> str:
+        """return cache key for schema file content"""
+        digest = hashlib.sha256()
+        # marshalled code is only valid for the interpreter that wrote it
+        tag = (
+            f"{CACHE_FORMAT_VERSION}:{pysbe.__version__}:{sourceDigest()}:"
+            f"{sys.implementation.cache_tag}:"
+        )
+        digest.update(tag.encode("ascii"))
+        digest.update(content)
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        """return filename of a cache entry"""
+        return os.path.join(self.directory, f"{key}.pickle")
+
+    def read(self, key: str):
+        """return cached entry, None when missing or unreadable"""
+        try:
+            with open(self.path(key), "rb") as cacheFile:
+                return pickle.load(cacheFile)
+        except Exception:
+            # a missing, truncated or stale entry is rebuilt rather than trusted
+            return None
+
+    def write(self, key: str, entry: dict) -> None:
+        """atomically store an entry, concurrent writers may race safely"""
+        os.makedirs(self.directory, exist_ok=True)
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as cacheFile:
+                pickle.dump(entry, cacheFile, protocol=pickle.HIGHEST_PROTOCOL)
+
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def lookup(self, filename: str):
+        """return cache key, cached entry or None, and the schema content"""
+        with open(filename, "rb") as schemaFile:
+            content = schemaFile.read()
+
+        key = self.key(content)
+        return key, self.read(key), content
+
+    def loadSchema(self, filename: str):
+        """return MessageSchema for filename"""
+        key, entry, content = self.lookup(filename)
+        if entry is not None:
+            return entry["schema"]
+
+        messageSchema = SBESpecParser().parseFile(io.BytesIO(content))
+        self.write(key, {"schema": messageSchema, "codecs": None})
+        return messageSchema
+
+    def loadCodec(self, filename: str) -> SchemaCodec:
+        """return SchemaCodec for filename, generated code is cached too"""
+        key, entry, content = self.lookup(filename)
+        if entry is not None and entry["codecs"] is not None:
+            return SchemaCodec(entry["schema"], loadCompiled(entry["codecs"]))
+
+        if entry is not None:
+            messageSchema = entry["schema"]
+        else:
+            messageSchema = SBESpecParser().parseFile(io.BytesIO(content))
+
+        schemaCodec = SchemaCodec(messageSchema)
+        codecs = dumpCompiled(schemaCodec)
+        self.write(key, {"schema": messageSchema, "codecs": codecs})
+        return schemaCodec
+
+
+def loadSchema(filename: str, directory: str = None):
+    """return MessageSchema for filename through the cache"""
+    return SchemaCache(directory).loadSchema(filename)
+
+
+def loadCodec(filename: str, directory: str = None) -> SchemaCodec:
+    """return SchemaCodec for filename through the cache"""
+    return SchemaCache(directory).loadCodec(filename)
@@ -0,0 +1,183 @@
+"""aio.py - decode messages received by asyncio connections
+
+SBEProtocol is an asyncio.Protocol framing messages with a StreamDecoder
+as data_received delivers bytes, each message is passed to the handler
+registered for its templateId. Plain functions are called straight from
+data_received, coroutine functions are awaited one at a time by a task of
+the connection so messages are handled in the order they arrived. Reading
+from the transport is paused while maxQueued messages wait for a handler
+and resumed once the backlog is half cleared.
+
+readMessages decodes messages from an asyncio.StreamReader for code using
+the streams API.
+"""
+import asyncio
+import inspect
+from typing import AsyncIterator, Callable, Dict, Optional, Union
+
+from .stream import DEFAULT_CAPACITY, DEFAULT_CHUNK_SIZE, StreamDecoder, copyData
+
+# messages waiting for a handler before reading is paused
+DEFAULT_MAX_QUEUED = 1024
+
+
+class SBEProtocol(asyncio.Protocol):
+    """asyncio protocol dispatching decoded messages to handlers by templateId
+
+    handlers are called with the templateId and the decoded root block,
+    messages without a handler go to default, or are dropped when it is
+    None. Data values passed to a plain function are slices of the receive
+    buffer, valid until it returns.
+    """
+
+    def __init__(
+        self,
+        schemaCodec,
+        handlers: Optional[Dict[Union[int, str], Callable]] = None,
+        default: Optional[Callable] = None,
+        maxQueued: int = DEFAULT_MAX_QUEUED,
+        capacity: int = DEFAULT_CAPACITY,
+    ) -> None:
+        """handlers maps templateIds or message names to handlers"""
+        if maxQueued < 1:
+            raise ValueError("maxQueued must be at least 1")
+
+        self.schemaCodec = schemaCodec
+        self.decoder = StreamDecoder(schemaCodec, capacity)
+        # templateId -> (handler, is coroutine function)
+        self.handlers = {}
+        for key, handler in (handlers or {}).items():
+            self.addHandler(key, handler)
+
+        self.default = None
+        if default is not None:
+            self.default = (default, inspect.iscoroutinefunction(default))
+
+        self.maxQueued = maxQueued
+        self.transport = None
+        self.queue = None
+        self.worker = None
+        # the worker is calling a handler for a message taken from the queue
+        self.active = False
+        self.paused = False
+        self.lost = False
+        self.closed = None
+        self.exception = None
+
+    def addHandler(self, key: Union[int, str], handler: Callable) -> None:
+        """register handler for a templateId or message name"""
+        if isinstance(key, str):
+            key = self.schemaCodec[key].templateId
+
+        self.handlers[key] = (handler, inspect.iscoroutinefunction(handler))
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        self.closed = asyncio.get_running_loop().create_future()
+
+    def data_received(self, data) -> None:
+        handlers = self.handlers
+        default = self.default
+        for templateId, values in self.decoder.feed(data):
+            entry = handlers.get(templateId, default)
+            if entry is None:
+                continue
+
+            handler, isAsync = entry
+            queued = self.active or (self.queue is not None and self.queue.qsize())
+            if isAsync or queued:
+                # queued behind earlier messages, keep the order
+                self.enqueue(handler, isAsync, templateId, values)
+            else:
+                handler(templateId, values)
+
+    def enqueue(self, handler, isAsync: bool, templateId: int, values) -> None:
+        """queue a message for the handler task, pausing reads when it lags"""
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.get_running_loop().create_task(self.run())
+
+        self.queue.put_nowait((handler, isAsync, templateId, copyData(values)))
+        if not self.paused and self.queue.qsize() >= self.maxQueued:
+            self.paused = True
+            self.transport.pause_reading()
+
+    async def run(self) -> None:
+        """call queued handlers in order until the connection is lost"""
+        queue = self.queue
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+
+            handler, isAsync, templateId, values = item
+            self.active = True
+            try:
+                result = handler(templateId, values)
+                if isAsync:
+                    await result
+            except Exception as exc:
+                # stop reading, wait_closed raises the error
+                self.exception = exc
+                self.transport.close()
+                break
+            finally:
+                self.active = False
+
+            if self.paused and queue.qsize() <= self.maxQueued // 2:
+                self.paused = False
+                if not self.lost:
+                    self.transport.resume_reading()
+
+        if self.lost:
+            self.finish()
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.lost = True
+        if self.exception is None:
+            self.exception = exc
+
+        if self.worker is None or self.worker.done():
+            self.finish()
+        else:
+            # handle the messages already received first
+            self.queue.put_nowait(None)
+
+    def finish(self) -> None:
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+    async def wait_closed(self) -> None:
+        """wait until the connection is lost and every message is handled
+
+        raises the error of a handler or of the connection
+        """
+        await self.closed
+        if self.exception is not None:
+            raise self.exception
+
+
+async def readMessages(
+    reader: asyncio.StreamReader,
+    schemaCodec,
+    chunkSize: int = DEFAULT_CHUNK_SIZE,
+    flyweights: bool = False,
+) -> AsyncIterator:
+    """yield messages read from reader until end of stream
+
+    messages are as yielded by StreamDecoder.messages and valid until the
+    next one is requested
+    """
+    decoder = StreamDecoder(schemaCodec, flyweights=flyweights)
+    while True:
+        chunk = await reader.read(chunkSize)
+        if not chunk:
+            break
+
+        for message in decoder.feed(chunk):
+            yield message
+
+    if decoder.pending:
+        raise ValueError(
+            f"stream ended inside a message, {decoder.pending} bytes left over"
+        )
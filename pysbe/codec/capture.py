@@ -0,0 +1,299 @@
+"""capture.py - random access to messages in a memory mapped capture file
+
+A capture file holds messages of one schema either back to back or each
+preceded by a length prefix. CaptureReader maps the file and returns
+flyweights wrapping the mapping, message bytes are never copied.
+
+The first open walks every message once and records the offset and
+templateId of each in an index written next to the capture file, later
+opens load the index instead. Message number N, every message of a
+templateId or the count per templateId are then found without reading the
+capture. The index is rebuilt when the capture file size or modification
+time, the framing or the schema change.
+
+index file layout, little endian:
+
+    INDEX_HEADER   magic, format version, key length, message count, end
+    key            repr of the key tuple, compared and never evaluated
+    offsets        uint64 header offset of each message
+    templateIds    uint32 templateId of each message
+"""
+import array
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from typing import Dict, Iterator, List, Optional
+
+# bump when the persisted index changes shape
+INDEX_FORMAT_VERSION = 3
+
+INDEX_SUFFIX = ".sbeidx"
+
+INDEX_MAGIC = b"PYSBEIDX"
+
+INDEX_HEADER = struct.Struct("<8sIIQQ")
+
+
+class CaptureIndex:
+    """offsets and templateIds of the messages of a capture file"""
+
+    def __init__(
+        self, key: tuple, offsets=None, templateIds=None, end: int = 0
+    ) -> None:
+        """key identifies the capture file state the index was built from"""
+        self.key = key
+        # end of the last complete message
+        self.end = end
+        if offsets is None:
+            offsets, templateIds = array.array("Q"), array.array("I")
+
+        # offset of each message header
+        self.offsets = offsets
+        self.templateIds = templateIds
+        self.counts: Dict[int, int] = {}
+        for templateId in self.templateIds:
+            self.counts[templateId] = self.counts.get(templateId, 0) + 1
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def append(self, offset: int, templateId: int, end: int) -> None:
+        self.end = end
+        self.offsets.append(offset)
+        self.templateIds.append(templateId)
+        self.counts[templateId] = self.counts.get(templateId, 0) + 1
+
+
+def littleEndian(values: array.array) -> array.array:
+    """return values in little endian byte order, swapping a copy if needed"""
+    if sys.byteorder == "big":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+
+    return values
+
+
+def readIndex(filename: str, key: tuple) -> Optional[CaptureIndex]:
+    """return the persisted index, None when missing, unreadable or stale"""
+    try:
+        with open(filename, "rb") as indexFile:
+            content = indexFile.read()
+    except OSError:
+        return None
+
+    if len(content) < INDEX_HEADER.size:
+        return None
+
+    magic, version, keyLength, count, end = INDEX_HEADER.unpack_from(content)
+    start = INDEX_HEADER.size + keyLength
+    if (
+        magic != INDEX_MAGIC
+        or version != INDEX_FORMAT_VERSION
+        or content[INDEX_HEADER.size : start] != repr(key).encode("utf-8")
+        or len(content) != start + 12 * count
+    ):
+        # a truncated or stale index is rebuilt rather than trusted
+        return None
+
+    offsets, templateIds = array.array("Q"), array.array("I")
+    offsets.frombytes(content[start : start + 8 * count])
+    templateIds.frombytes(content[start + 8 * count :])
+    return CaptureIndex(key, littleEndian(offsets), littleEndian(templateIds), end)
+
+
+def writeIndex(filename: str, index: CaptureIndex) -> None:
+    """atomically store index, a capture in a read only directory is skipped"""
+    directory = os.path.dirname(os.path.abspath(filename))
+    try:
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    except OSError:
+        return
+
+    key = repr(index.key).encode("utf-8")
+    try:
+        with os.fdopen(handle, "wb") as indexFile:
+            indexFile.write(
+                INDEX_HEADER.pack(
+                    INDEX_MAGIC, INDEX_FORMAT_VERSION, len(key), len(index), index.end
+                )
+            )
+            indexFile.write(key)
+            indexFile.write(littleEndian(index.offsets).tobytes())
+            indexFile.write(littleEndian(index.templateIds).tobytes())
+
+        os.replace(temporary, filename)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def iterFrames(buffer, end: int, schemaCodec, prefix=None, offset: int = 0):
+    """yield header offset and end of each complete message before end
+
+    prefix is a struct.Struct of the length preceding each message, offset
+    is where the first message, or its length prefix, starts
+    """
+    headerLength = schemaCodec.headerLength
+    messageLength = schemaCodec.messageLength
+    while True:
+        start = offset
+        if prefix is not None:
+            if start + prefix.size > end:
+                break
+
+            start += prefix.size
+            offset = start + prefix.unpack_from(buffer, offset)[0]
+        else:
+            if start + headerLength > end:
+                break
+
+            try:
+                offset = start + messageLength(buffer, start)
+            except struct.error:
+                # group or data headers past the end of the buffer
+                break
+
+        if offset > end or offset - start < headerLength:
+            break
+
+        yield start, offset
+
+
+class CaptureReader:
+    """memory mapped capture file of messages decoded by schemaCodec
+
+    lengthPrefix is the struct format of a length preceding each message,
+    e.g. "<I", messages are back to back when it is None. A partial
+    message at the end of the file, e.g. of a capture still being written,
+    is not indexed.
+
+    flyweights returned by the reader wrap the mapping, data read through
+    them must be released before close()
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        schemaCodec,
+        lengthPrefix: Optional[str] = None,
+        indexFilename: Optional[str] = None,
+    ) -> None:
+        if schemaCodec.headerStruct is None:
+            raise ValueError("messageSchema does not define a message header")
+
+        self.filename = filename
+        self.schemaCodec = schemaCodec
+        self.lengthPrefix = struct.Struct(lengthPrefix) if lengthPrefix else None
+        self.indexFilename = indexFilename or f"{filename}{INDEX_SUFFIX}"
+        with open(filename, "rb") as captureFile:
+            status = os.fstat(captureFile.fileno())
+            self.size = status.st_size
+            if self.size:
+                self.buffer = mmap.mmap(
+                    captureFile.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            else:
+                # an empty file can not be mapped
+                self.buffer = b""
+
+        messageSchema = schemaCodec.messageSchema
+        key = (
+            INDEX_FORMAT_VERSION,
+            self.size,
+            status.st_mtime_ns,
+            lengthPrefix,
+            schemaCodec.headerStruct.format,
+            messageSchema.schema_id,
+            messageSchema.version,
+        )
+        self.index = readIndex(self.indexFilename, key)
+        if self.index is None:
+            self.index = self.buildIndex(key)
+            writeIndex(self.indexFilename, self.index)
+
+        self._offsets = self.index.offsets
+        self._templateIdPositions: Dict[int, List[int]] = {}
+
+    def buildIndex(self, key: tuple) -> CaptureIndex:
+        """walk every complete message of the capture"""
+        index = CaptureIndex(key)
+        templateId = self.schemaCodec.templateId
+        buffer = self.buffer
+        frames = iterFrames(buffer, self.size, self.schemaCodec, self.lengthPrefix)
+        for offset, end in frames:
+            index.append(offset, templateId(buffer, offset), end)
+
+        return index
+
+    def frameOffset(self, number: int) -> int:
+        """return file offset of message number including its length prefix"""
+        if number == len(self._offsets):
+            return self.index.end
+
+        offset = self._offsets[number]
+        if self.lengthPrefix is not None:
+            offset -= self.lengthPrefix.size
+
+        return offset
+
+    def close(self) -> None:
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def __enter__(self) -> "CaptureReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    @property
+    def counts(self) -> Dict[int, int]:
+        """number of messages of each templateId"""
+        return dict(self.index.counts)
+
+    def offset(self, number: int) -> int:
+        """return file offset of the header of message number"""
+        return self._offsets[number]
+
+    def __getitem__(self, number: int):
+        """return a new flyweight of message number
+
+        iterating reuses one flyweight per templateId instead
+        """
+        return self.schemaCodec.wrap(self.buffer, self._offsets[number], fresh=True)
+
+    def decode(self, number: int):
+        """return templateId and decoded root block of message number"""
+        return self.schemaCodec.decode(self.buffer, self._offsets[number])
+
+    def __iter__(self) -> Iterator:
+        wrap = self.schemaCodec.wrap
+        buffer = self.buffer
+        for offset in self._offsets:
+            yield wrap(buffer, offset)
+
+    def positions(self, templateId: int) -> List[int]:
+        """return message numbers of every message of templateId"""
+        positions = self._templateIdPositions.get(templateId)
+        if positions is None:
+            positions = [
+                number
+                for number, messageTemplateId in enumerate(self.index.templateIds)
+                if messageTemplateId == templateId
+            ]
+            self._templateIdPositions[templateId] = positions
+
+        return positions
+
+    def messages(self, templateId: int) -> Iterator:
+        """yield flyweights of every message of templateId"""
+        wrap = self.schemaCodec.wrap
+        buffer = self.buffer
+        offsets = self._offsets
+        for number in self.positions(templateId):
+            yield wrap(buffer, offsets[number])
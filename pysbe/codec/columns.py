@@ -0,0 +1,372 @@
+"""columns.py - decode selected fields of many messages into columns
+
+Rows are unpacked with a single struct covering the templateId and the
+selected fields, then moved into one array.array per field a chunk at a
+time, so no dict is built per message and memory stays close to the size
+of the columns. With numpy installed the columns are returned as numpy
+arrays, a contiguous buffer of fixed size messages is then viewed through
+a structured dtype and never unpacked row by row.
+"""
+import array
+import struct
+from typing import Dict, Iterable, List, Optional, Union
+
+from pysbe.schema.constants import TYPE_PRIMITIVE_TYPE, TYPE_PRIMITIVE_TYPE_MAP
+from pysbe.schema.layout import ElementLayout
+
+from .dtype import elementDtype, messageDtype, numpy
+from .source import inVersion, leafFormat, nullValue, structPrefix
+
+# rows unpacked before they are moved into the columns
+CHUNK_SIZE = 65536
+
+ARRAY_TYPE_CODE_MAP = {
+    TYPE_PRIMITIVE_TYPE_MAP[name]: code
+    for name, code in (
+        ("int8", "b"),
+        ("int16", "h"),
+        ("int32", "i"),
+        ("int64", "q"),
+        ("uint8", "B"),
+        ("uint16", "H"),
+        ("uint32", "I"),
+        ("uint64", "Q"),
+        ("float", "f"),
+        ("double", "d"),
+    )
+}
+
+BUFFER_TYPES = (bytes, bytearray, memoryview)
+
+
+class Column:
+    """values of a single leaf field accumulated across messages"""
+
+    def __init__(self, name: str, leaf: ElementLayout, index: int) -> None:
+        self.name = name
+        self.leaf = leaf
+        # position of the first value in an unpacked row
+        self.index = index
+        _, self.count = leafFormat(leaf)
+        if leaf.primitiveType == TYPE_PRIMITIVE_TYPE.CHAR or self.count > 1:
+            # bytes and fixed length arrays are kept as python objects
+            self.values = []
+        else:
+            self.values = array.array(ARRAY_TYPE_CODE_MAP[leaf.primitiveType])
+
+    def extend(self, rows: List[tuple]) -> None:
+        """move this column's values out of unpacked rows"""
+        index = self.index
+        if self.count == 1:
+            self.values.extend(row[index] for row in rows)
+        else:
+            end = index + self.count
+            self.values.extend(row[index:end] for row in rows)
+
+    def toNumpy(self, byteOrder):
+        """return values as a numpy array"""
+        if isinstance(self.values, array.array):
+            return numpy.frombuffer(self.values, dtype=self.values.typecode)
+
+        dtype = elementDtype(self.leaf, byteOrder)
+        return numpy.array(self.values, dtype=dtype.base if self.count > 1 else dtype)
+
+
+def rowFormat(byteOrder, located) -> tuple:
+    """return struct format unpacking (offset, leaf) pairs, first value index
+    of each leaf keyed by id and the end of the last leaf
+    """
+    codes = [structPrefix(byteOrder)]
+    position = 0
+    index = {}
+    count = 0
+    for offset, leaf in sorted(located, key=lambda item: item[0]):
+        if offset > position:
+            codes.append(f"{offset - position}x")
+
+        code, values = leafFormat(leaf)
+        codes.append(code)
+        index[id(leaf)] = count
+        count += values
+        position = offset + leaf.size
+
+    return "".join(codes), index, position
+
+
+def selectLeaves(layout, fields: Optional[Iterable[str]] = None):
+    """return (column name, leaf) for selected fields, composites expand
+
+    composite members are named field.member, all encoded fields are
+    selected when fields is None
+    """
+    elements = {}
+
+    def collect(element: ElementLayout, name: str) -> None:
+        elements[name] = element
+        for member in element.members or ():
+            collect(member, f"{name}.{member.name}")
+
+    for field in layout.fields:
+        collect(field, field.name)
+
+    if fields is None:
+        fields = [field.name for field in layout.fields]
+
+    leaves = []
+    for name in fields:
+        if name not in elements:
+            raise KeyError(f"message '{layout.name}' has no field '{name}'")
+
+        element = elements[name]
+        if not element.isComposite:
+            if element.size:
+                leaves.append((name, element))
+
+            continue
+
+        leaves.extend(
+            (f"{name}.{leaf.name}", leaf)
+            for leaf in element.leaves()
+            if leaf.size and not leaf.isConstant
+        )
+
+    return leaves
+
+
+class ColumnDecoder:
+    """decode selected root block fields of one message type into columns
+
+    messages whose header blockLength or version says they do not carry a
+    selected field, sent by an older schema version, give it its null value
+    """
+
+    def __init__(self, schemaCodec, message: Union[int, str], fields=None) -> None:
+        if isinstance(message, str):
+            self.codec = schemaCodec[message]
+        else:
+            self.codec = schemaCodec.getMessageById(message)
+
+        self.schemaCodec = schemaCodec
+        self.byteOrder = schemaCodec.byteOrder
+        self.templateId = self.codec.templateId
+        self.leaves = selectLeaves(self.codec.layout, fields)
+
+        headerLayout = schemaCodec.messageSchema.headerLayout
+        self.headerLength = headerLayout.size
+        blockLength = headerLayout.member("blockLength")
+        templateId = headerLayout.member("templateId")
+        version = headerLayout.member("version")
+        # one struct reading blockLength, templateId, version and every
+        # selected leaf
+        self.headerLocated = [
+            (element.offset, element) for element in (blockLength, templateId, version)
+        ]
+        self.located = [
+            (self.headerLength + leaf.offset, leaf) for _, leaf in self.leaves
+        ]
+        format, index, position = rowFormat(
+            self.byteOrder, self.headerLocated + self.located
+        )
+        self.fixedLength = None
+        if not self.codec.layout.groups and not self.codec.layout.varData:
+            self.fixedLength = self.headerLength + self.codec.blockLength
+            if self.fixedLength > position:
+                format += f"{self.fixedLength - position}x"
+
+        self.rowStruct = struct.Struct(format)
+        self.index = index
+        self.valueCount = sum(
+            leafFormat(leaf)[1] for _, leaf in self.headerLocated + self.located
+        )
+        self.blockLengthIndex = index[id(blockLength)]
+        self.templateIdIndex = index[id(templateId)]
+        self.versionIndex = index[id(version)]
+        # messages of this version or newer carry every selected leaf
+        self.sinceVersion = max(
+            (leaf.sinceVersion or 0 for _, leaf in self.leaves), default=0
+        )
+        # (blockLength, version) -> row reader of messages missing leaves
+        self.readers = {}
+        self.columns = [
+            Column(name, leaf, index[id(leaf)]) for name, leaf in self.leaves
+        ]
+
+    def rowReader(self, blockLength: int, version: int):
+        """return function unpacking the row of a message of blockLength and
+        version, selected leaves it does not carry hold their null value
+        """
+        key = (blockLength, version)
+        reader = self.readers.get(key)
+        if reader is not None:
+            return reader
+
+        present = [
+            (offset, leaf)
+            for offset, leaf in self.located
+            if inVersion(leaf, version) and leaf.offset + leaf.size <= blockLength
+        ]
+        format, index, _ = rowFormat(self.byteOrder, self.headerLocated + present)
+        unpack_from = struct.Struct(format).unpack_from
+        template = [None] * self.valueCount
+        for _, leaf in self.located:
+            _, count = leafFormat(leaf)
+            start = self.index[id(leaf)]
+            template[start : start + count] = [nullValue(leaf)] * count
+
+        moves = [
+            (self.index[id(leaf)] + value, index[id(leaf)] + value)
+            for _, leaf in self.headerLocated + present
+            for value in range(leafFormat(leaf)[1])
+        ]
+
+        def reader(buffer, offset: int = 0) -> tuple:
+            values = unpack_from(buffer, offset)
+            row = template.copy()
+            for target, source in moves:
+                row[target] = values[source]
+
+            return tuple(row)
+
+        self.readers[key] = reader
+        return reader
+
+    def readRow(self, header, buffer, offset: int = 0) -> tuple:
+        """return the unpacked row of the message at offset with header"""
+        if (
+            header.blockLength >= self.codec.blockLength
+            and header.version >= self.sinceVersion
+        ):
+            return self.rowStruct.unpack_from(buffer, offset)
+
+        return self.rowReader(header.blockLength, header.version)(buffer, offset)
+
+    def rows(self, source) -> Iterable[tuple]:
+        """yield unpacked rows of every matching message in source"""
+        readRow = self.readRow
+        templateIdIndex = self.templateIdIndex
+        templateId = self.templateId
+        if not isinstance(source, BUFFER_TYPES):
+            peekHeader = self.schemaCodec.peekHeader
+            for message in source:
+                header = peekHeader(message)
+                if header.templateId == templateId:
+                    yield readRow(header, message)
+
+            return
+
+        offset = 0
+        if self.fixedLength and len(source) % self.fixedLength == 0:
+            blockLengthIndex = self.blockLengthIndex
+            blockLength = self.codec.blockLength
+            versionIndex = self.versionIndex
+            sinceVersion = self.sinceVersion
+            for row in self.rowStruct.iter_unpack(source):
+                if (
+                    row[templateIdIndex] != templateId
+                    or row[blockLengthIndex] != blockLength
+                    or row[versionIndex] < sinceVersion
+                ):
+                    # not a run of equal size messages, walk from here
+                    break
+
+                yield row
+                offset += self.fixedLength
+            else:
+                return
+
+        peek = self.schemaCodec.peek
+        end = len(source)
+        while offset < end:
+            header, length = peek(source, offset)
+            if header.templateId == templateId:
+                yield readRow(header, source, offset)
+
+            offset += length
+
+    def decode(self, source, asNumpy: Optional[bool] = None) -> Dict[str, object]:
+        """return column name -> values for every matching message in source
+
+        source is a buffer of consecutive messages or an iterable of
+        buffers each holding one message, messages of other schema message
+        types are skipped
+        """
+        if asNumpy is None:
+            asNumpy = numpy is not None
+
+        for column in self.columns:
+            column.values = column.values[:0]
+
+        if asNumpy and isinstance(source, BUFFER_TYPES):
+            columns = self.decodeFixedNumpy(source)
+            if columns is not None:
+                return columns
+
+        chunk = []
+        for row in self.rows(source):
+            chunk.append(row)
+            if len(chunk) >= CHUNK_SIZE:
+                self.flush(chunk)
+
+        self.flush(chunk)
+        if asNumpy:
+            if numpy is None:
+                raise ImportError("numpy is required for numpy columns")
+
+            return {
+                column.name: column.toNumpy(self.byteOrder) for column in self.columns
+            }
+
+        return {column.name: column.values for column in self.columns}
+
+    def flush(self, chunk: List[tuple]) -> None:
+        """move a chunk of rows into the columns and empty it"""
+        for column in self.columns:
+            column.extend(chunk)
+
+        del chunk[:]
+
+    def decodeFixedNumpy(self, source):
+        """return numpy columns viewing a run of fixed size messages
+
+        return None when source is not made of only this message type
+        """
+        if not self.fixedLength or len(source) % self.fixedLength:
+            return None
+
+        dtype = messageDtype(self.schemaCodec.messageSchema, self.codec.layout)
+        records = numpy.frombuffer(source, dtype=dtype)
+        header = records["header"]
+        if not (
+            (header["templateId"] == self.templateId).all()
+            and (header["blockLength"] == self.codec.blockLength).all()
+            and (header["version"] >= self.sinceVersion).all()
+        ):
+            return None
+
+        columns = {}
+        for name, _ in self.leaves:
+            values = records
+            for part in name.split("."):
+                values = values[part]
+
+            columns[name] = values.copy()
+
+        return columns
+
+
+def decodeColumns(
+    schemaCodec,
+    message: Union[int, str],
+    source,
+    fields: Optional[Iterable[str]] = None,
+    asNumpy: Optional[bool] = None,
+) -> Dict[str, object]:
+    """decode selected fields of every message in source into columns
+
+    message is a templateId or message name, fields lists field names or
+    field.member names, columns are numpy arrays when numpy is installed,
+    array.array for numbers and lists for bytes and fixed length arrays
+    otherwise
+    """
+    decoder = ColumnDecoder(schemaCodec, message, fields)
+    return decoder.decode(source, asNumpy=asNumpy)
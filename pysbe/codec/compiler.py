@@ -0,0 +1,450 @@
+"""compiler.py - compile message layouts into struct based codecs"""
+import operator
+import struct
+import threading
+from collections import namedtuple
+from typing import Optional
+
+from pysbe.schema.layout import HEADER_FIELD_NAMES, MessageLayout
+
+from .encoder import HEADER_STRUCT_NAME, encoderSource
+from .flyweight import flyweightSource
+from .length import dataLengthSource, groupSkipLines, skipSource
+from .source import (
+    BlockFormat,
+    SourceBuilder,
+    blockStructName,
+    executeCode,
+    inVersion,
+    newestVersion,
+    offsetSource,
+    pythonName,
+)
+
+# ids up to twice the message count plus this are looked up in a list
+DENSE_ID_SLACK = 64
+
+MessageHeader = namedtuple("MessageHeader", HEADER_FIELD_NAMES)
+
+
+def headerReader(headerLayout, byteOrder):
+    """return header struct and where it unpacks each HEADER_FIELD_NAMES value"""
+    headerFormat = BlockFormat([headerLayout], headerLayout.size, byteOrder)
+    indexes = [
+        headerFormat.index[id(headerLayout.member(name))][0]
+        for name in HEADER_FIELD_NAMES
+    ]
+    return struct.Struct(headerFormat.format), indexes
+
+
+def decoderSource(
+    builder: SourceBuilder, layout: MessageLayout, actingVersion: Optional[int] = None
+) -> str:
+    """generate a message root block decoder, return function name
+
+    variable length data is returned as memoryview slices of buffer. The
+    decoder takes the acting blockLength from the message header so groups
+    and data after a longer root block of a newer version are found.
+
+    with actingVersion the decoder reads only what messages of that older
+    version encode, fields added later decode as their null value
+    """
+    if actingVersion is None:
+        blockFormat = BlockFormat(layout.fields, layout.blockLength, builder.byteOrder)
+        structName = builder.struct(blockFormat.format, blockStructName(layout))
+        name = f"decode_{pythonName(layout.name)}"
+    else:
+        # no padding, an older root block may end before blockLength
+        blockFormat = BlockFormat(layout.fields, 0, builder.byteOrder, actingVersion)
+        structName = builder.struct(
+            blockFormat.format, blockStructName(layout, f"v{actingVersion}_")
+        )
+        name = f"decode_{pythonName(layout.name)}_v{actingVersion}"
+
+    signature = (
+        f"def {name}(\n"
+        f"    buffer, offset=0, blockLength={layout.blockLength},"
+        f" _unpack_from={structName}.unpack_from\n"
+        "):\n"
+    )
+    if not layout.varData:
+        builder.add(
+            f"{signature}"
+            f'    """decode root block of message {layout.name}"""\n'
+            "    v = _unpack_from(buffer, offset)\n"
+            f"    return {blockFormat.dictSource(layout.fields)}\n"
+        )
+        return name
+
+    lines = [
+        "v = _unpack_from(buffer, offset)",
+        "view = memoryview(buffer)",
+        "offset += blockLength",
+    ]
+    lines.extend(groupSkipLines(builder, layout.groups, actingVersion=actingVersion))
+    values = []
+    for index, data in enumerate(layout.varData):
+        if not inVersion(data, actingVersion):
+            values.append((data.name, 'b""'))
+            continue
+
+        lines.extend(
+            [
+                f"length = {dataLengthSource(builder, data)}",
+                f"offset += {data.headerLength}",
+                f"d{index} = view[offset:offset + length]",
+                "offset += length",
+            ]
+        )
+        values.append((data.name, f"d{index}"))
+
+    body = "".join(f"    {line}\n" for line in lines)
+    builder.add(
+        f"{signature}"
+        f'    """decode root block and data of message {layout.name}"""\n'
+        f"{body}"
+        f"    return {blockFormat.dictSource(layout.fields, extra=values)}\n"
+    )
+    return name
+
+
+def dispatchSource(
+    builder: SourceBuilder, messageSchema, decoders: str, skippers: str
+) -> None:
+    """generate decode() and messageLength() dispatching on the templateId
+
+    decoders and skippers name templateId keyed registries, an unknown
+    templateId raises the UnknownTemplateId class of the generated module
+    """
+    headerLayout = messageSchema.headerLayout
+    headerFormat = BlockFormat([headerLayout], headerLayout.size, builder.byteOrder)
+    structName = builder.struct(headerFormat.format, HEADER_STRUCT_NAME)
+    blockLengthIndex, _ = headerFormat.index[id(headerLayout.member("blockLength"))]
+    templateIdIndex, _ = headerFormat.index[id(headerLayout.member("templateId"))]
+    blockOffset = offsetSource("offset", headerLayout.size)
+    builder.add(
+        "def decode(\n"
+        f"    buffer, offset=0, _unpack_from={structName}.unpack_from,"
+        f" _decoders={decoders}\n"
+        "):\n"
+        '    """decode header and root block, return templateId and values"""\n'
+        "    header = _unpack_from(buffer, offset)\n"
+        f"    templateId = header[{templateIdIndex}]\n"
+        "    try:\n"
+        "        decoder = _decoders[templateId]\n"
+        "    except KeyError:\n"
+        "        raise UnknownTemplateId(\n"
+        '            f"unknown templateId {templateId}"\n'
+        "        ) from None\n"
+        "    return templateId, decoder(\n"
+        f"        buffer, {blockOffset}, header[{blockLengthIndex}]\n"
+        "    )\n"
+    )
+    builder.add(
+        "def messageLength(\n"
+        f"    buffer, offset=0, _unpack_from={structName}.unpack_from,"
+        f" _skippers={skippers}\n"
+        "):\n"
+        '    """return encoded length of the message at offset, nothing is decoded"""\n'
+        "    header = _unpack_from(buffer, offset)\n"
+        "    try:\n"
+        f"        skip = _skippers[header[{templateIdIndex}]]\n"
+        "    except KeyError:\n"
+        "        raise UnknownTemplateId(\n"
+        f'            f"unknown templateId {{header[{templateIdIndex}]}}"\n'
+        "        ) from None\n"
+        f"    end = {blockOffset} + header[{blockLengthIndex}]\n"
+        "    return skip(buffer, end) - offset\n"
+    )
+
+
+def dispatchTable(entries):
+    """return a dense list indexed by templateId, or a dict for sparse ids"""
+    if not entries:
+        return {}
+
+    if max(entries) < 2 * len(entries) + DENSE_ID_SLACK:
+        table = [None] * (max(entries) + 1)
+        for templateId, value in entries.items():
+            table[templateId] = value
+
+        return table
+
+    return dict(entries)
+
+
+def tableEntry(table, templateId: int):
+    """return dispatch table entry for templateId, None when it has none"""
+    try:
+        return table[templateId]
+    except (IndexError, KeyError, TypeError):
+        return None
+
+
+def generateMessage(messageSchema, message):
+    """generate codec source for a message
+
+    return source and the generated names of each codec piece
+    """
+    layout = message.layout
+    builder = SourceBuilder(messageSchema.byteOrder)
+    decodeName = decoderSource(builder, layout)
+    decoderName, groupDecoderNames = flyweightSource(builder, layout)
+    encodeName, encoderName = encoderSource(builder, messageSchema, layout)
+    names = {
+        "blockStruct": blockStructName(layout),
+        "decode": decodeName,
+        "Decoder": decoderName,
+        "groupDecoders": groupDecoderNames,
+        "encode": encodeName,
+        "Encoder": encoderName,
+        "skip": skipSource(builder, layout),
+    }
+    return builder.source(), names
+
+
+def generateVersion(messageSchema, message, actingVersion: int):
+    """generate decode, skip and flyweight for messages of an older version
+
+    return source and the generated (decode, skip, Decoder) names
+    """
+    layout = message.layout
+    builder = SourceBuilder(messageSchema.byteOrder)
+    decodeName = decoderSource(builder, layout, actingVersion)
+    skipName = skipSource(builder, layout, actingVersion)
+    decoderName, _ = flyweightSource(builder, layout, actingVersion)
+    return builder.source(), (decodeName, skipName, decoderName)
+
+
+class MessageCodec:
+    """compiled codec for a single message"""
+
+    def __init__(self, messageSchema, message, compiled=None) -> None:
+        """compiled is a (source, code, names) tuple from a previous compile"""
+        self.message = message
+        self.layout = message.layout
+        self.name = message.name
+        self.templateId = message.message_id
+        self.blockLength = message.layout.blockLength
+        # messages of this version or newer use the regular decoder
+        self.sinceVersion = newestVersion(message.layout)
+        self.messageSchema = messageSchema
+
+        filename = f"<pysbe {self.name}>"
+        if compiled is None:
+            source, names = generateMessage(messageSchema, message)
+            compiled = (source, compile(source, filename, "exec"), names)
+
+        self.compiled = compiled
+        self.source, code, names = compiled
+        self.namespace = executeCode(code, filename)
+
+        self.blockStruct = self.namespace[names["blockStruct"]]
+        self.decode = self.namespace[names["decode"]]
+        self.Decoder = self.namespace[names["Decoder"]]
+        self.groupDecoders = {
+            path: self.namespace[className]
+            for path, className in names["groupDecoders"].items()
+        }
+        self.encode = self.namespace[names["encode"]]
+        self.Encoder = self.namespace[names["Encoder"]]
+        self.skip = self.namespace[names["skip"]]
+
+    def versionCodec(self, actingVersion: int):
+        """return decode, skip and Decoder class for messages of actingVersion"""
+        if actingVersion >= self.sinceVersion:
+            return self.decode, self.skip, self.Decoder
+
+        filename = f"<pysbe {self.name} v{actingVersion}>"
+        source, names = generateVersion(self.messageSchema, self.message, actingVersion)
+        namespace = executeCode(compile(source, filename, "exec"), filename)
+        return tuple(namespace[name] for name in names)
+
+
+class SchemaCodec:
+    """compiled codecs for every message in a messageSchema
+
+    messages not built yet by a lazily parsed messageSchema are built and
+    compiled the first time they are requested or decoded. Messages with a
+    header version older than the schema get decoders and flyweights
+    reading only what that version encodes, compiled once per
+    (templateId, version). Building and compiling happens under a lock so
+    threads sharing a SchemaCodec compile each message once
+    """
+
+    def __init__(self, messageSchema, compiled=None) -> None:
+        """compiled maps message names to MessageCodec.compiled tuples"""
+        self.compiled = compiled or {}
+        self.messageSchema = messageSchema
+        self.byteOrder = messageSchema.byteOrder
+        self.messages = {}
+        self.version = messageSchema.version or 0
+        # (templateId, version) -> (decode, skip, flyweight) of older versions
+        self.versions = {}
+        self._lock = threading.RLock()
+        self.headerStruct = None
+        self.headerLength = 0
+        self._templateIdIndex = None
+        self._blockLengthIndex = None
+        self._versionIndex = None
+        self._headerFields = None
+        headerLayout = messageSchema.headerLayout
+        if headerLayout is not None:
+            self.headerStruct, indexes = headerReader(headerLayout, self.byteOrder)
+            self.headerLength = headerLayout.size
+            self._blockLengthIndex, self._templateIdIndex = indexes[:2]
+            self._versionIndex = indexes[3]
+            self._headerFields = operator.itemgetter(*indexes)
+
+        # sized for every templateId, entries are filled in by addCodec
+        templateIds = dict.fromkeys(messageSchema.messageIds())
+        self._codecs = dispatchTable(templateIds)
+        self._decoders = dispatchTable(templateIds)
+        self._flyweights = dispatchTable(templateIds)
+        self._skippers = dispatchTable(templateIds)
+        for message in list(messageSchema.message_name_map.values()):
+            self.addCodec(message)
+
+    def addCodec(self, message) -> MessageCodec:
+        """compile message and enter it in the dispatch tables"""
+        codec = MessageCodec(
+            self.messageSchema, message, self.compiled.get(message.name)
+        )
+        self.messages[message.name] = codec
+        templateId = codec.templateId
+        self._codecs[templateId] = codec
+        self._decoders[templateId] = codec.decode
+        self._flyweights[templateId] = codec.Decoder()
+        self._skippers[templateId] = codec.skip
+        return codec
+
+    def __getitem__(self, name: str) -> MessageCodec:
+        codec = self.messages.get(name)
+        if codec is None:
+            with self._lock:
+                # another thread may have compiled it while this one waited
+                codec = self.messages.get(name)
+                if codec is None:
+                    codec = self.addCodec(self.messageSchema.getMessage(name))
+
+        return codec
+
+    def lookup(self, table, templateId: int):
+        """return table entry for templateId, compiling its codec if needed"""
+        entry = tableEntry(table, templateId)
+        if entry is None:
+            with self._lock:
+                # another thread may have compiled it while this one waited
+                entry = tableEntry(table, templateId)
+                if entry is None:
+                    # raises UnknownTemplateId when the schema has no such message
+                    self.addCodec(self.messageSchema.getMessageById(templateId))
+                    entry = table[templateId]
+
+        return entry
+
+    def versionCodec(self, templateId: int, version: int):
+        """return decode, skip and flyweight for templateId messages of version
+
+        the flyweight instance is reused by wrap
+        """
+        key = (templateId, version)
+        entry = self.versions.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self.versions.get(key)
+                if entry is None:
+                    codec = self.lookup(self._codecs, templateId)
+                    decode, skip, Decoder = codec.versionCodec(version)
+                    entry = self.versions[key] = (decode, skip, Decoder())
+
+        return entry
+
+    def getMessageById(self, templateId: int) -> MessageCodec:
+        """return message codec for a templateId"""
+        return self.lookup(self._codecs, templateId)
+
+    def unpackHeader(self, buffer, offset: int = 0) -> tuple:
+        """return every value of the message header at offset"""
+        if self.headerStruct is None:
+            raise ValueError("messageSchema does not define a message header")
+
+        return self.headerStruct.unpack_from(buffer, offset)
+
+    def templateId(self, buffer, offset: int = 0) -> int:
+        """return templateId from the message header at offset"""
+        return self.unpackHeader(buffer, offset)[self._templateIdIndex]
+
+    def peekHeader(self, buffer, offset: int = 0) -> MessageHeader:
+        """return blockLength, templateId, schemaId and version at offset"""
+        header = self.unpackHeader(buffer, offset)
+        return MessageHeader._make(self._headerFields(header))
+
+    def peek(self, buffer, offset: int = 0):
+        """return header and total encoded length of the message at offset
+
+        only the header and group dimensions are read, payload is skipped
+        """
+        header = self.unpackHeader(buffer, offset)
+        end = offset + self.headerLength + header[self._blockLengthIndex]
+        return (
+            MessageHeader._make(self._headerFields(header)),
+            self.skipper(header)(buffer, end) - offset,
+        )
+
+    def messageLength(self, buffer, offset: int = 0) -> int:
+        """return total encoded length of the message at offset"""
+        header = self.unpackHeader(buffer, offset)
+        end = offset + self.headerLength + header[self._blockLengthIndex]
+        return self.skipper(header)(buffer, end) - offset
+
+    def skipper(self, header: tuple):
+        """return the function skipping groups and data of a message
+
+        header holds every unpacked message header value
+        """
+        templateId = header[self._templateIdIndex]
+        if header[self._versionIndex] < self.version:
+            return self.versionCodec(templateId, header[self._versionIndex])[1]
+
+        return self.lookup(self._skippers, templateId)
+
+    def decode(self, buffer, offset: int = 0):
+        """decode header and root block of the message at offset
+
+        return templateId and the decoded root block, the header version
+        and blockLength say which fields are present and where groups start
+        """
+        header = self.unpackHeader(buffer, offset)
+        templateId = header[self._templateIdIndex]
+        if header[self._versionIndex] < self.version:
+            decode = self.versionCodec(templateId, header[self._versionIndex])[0]
+        else:
+            decode = self.lookup(self._decoders, templateId)
+        return templateId, decode(
+            buffer, offset + self.headerLength, header[self._blockLengthIndex]
+        )
+
+    def wrap(self, buffer, offset: int = 0, fresh: bool = False):
+        """wrap the message at offset with its flyweight decoder
+
+        one flyweight instance per message type and version is reused
+        across calls unless fresh asks for a new one, the header
+        blockLength says where groups start
+        """
+        header = self.unpackHeader(buffer, offset)
+        templateId = header[self._templateIdIndex]
+        if header[self._versionIndex] < self.version:
+            flyweight = self.versionCodec(templateId, header[self._versionIndex])[2]
+        else:
+            flyweight = self.lookup(self._flyweights, templateId)
+        if fresh:
+            flyweight = flyweight.__class__()
+        return flyweight.wrap(
+            buffer, offset + self.headerLength, header[self._blockLengthIndex]
+        )
+
+
+def compileSchema(messageSchema) -> SchemaCodec:
+    """compile struct based codecs for messageSchema"""
+    return SchemaCodec(messageSchema)
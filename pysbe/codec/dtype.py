@@ -0,0 +1,130 @@
+"""dtype.py - export block layouts as numpy structured dtypes
+
+A root block or group entry becomes a numpy.dtype with explicit offsets,
+byte order and itemsize, so numpy.frombuffer can view a whole repeating
+group or a file of fixed size records without copying. numpy is optional,
+it is only imported when one of these functions is called.
+"""
+from pysbe.schema.constants import TYPE_PRIMITIVE_TYPE, TYPE_PRIMITIVE_TYPE_MAP
+from pysbe.schema.layout import BlockLayout, ElementLayout, GroupLayout
+
+from .source import structPrefix
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - numpy is an optional dependency
+    numpy = None
+
+NUMPY_TYPE_CODE_MAP = {
+    TYPE_PRIMITIVE_TYPE_MAP[name]: code
+    for name, code in (
+        ("char", "S1"),
+        ("int8", "i1"),
+        ("int16", "i2"),
+        ("int32", "i4"),
+        ("int64", "i8"),
+        ("uint8", "u1"),
+        ("uint16", "u2"),
+        ("uint32", "u4"),
+        ("uint64", "u8"),
+        ("float", "f4"),
+        ("double", "f8"),
+    )
+}
+
+
+def requireNumpy():
+    """return the numpy module, raise ImportError when it is not installed"""
+    if numpy is None:
+        raise ImportError("numpy is required for structured dtype export")
+
+    return numpy
+
+
+def elementDtype(element: ElementLayout, byteOrder=None):
+    """return numpy dtype of a field or composite member"""
+    np = requireNumpy()
+    if element.isComposite:
+        return fieldsDtype(element.members, element.size, byteOrder, element.offset)
+
+    if element.primitiveType == TYPE_PRIMITIVE_TYPE.CHAR:
+        return np.dtype(f"S{element.length}")
+
+    code = NUMPY_TYPE_CODE_MAP[element.primitiveType]
+    scalar = np.dtype(structPrefix(byteOrder) + code)
+    if element.length == 1:
+        return scalar
+
+    return np.dtype((scalar, (element.length,)))
+
+
+def fieldsDtype(fields, itemsize: int, byteOrder=None, base: int = 0):
+    """return structured dtype of fields at offsets relative to base
+
+    constant and zero length fields are not encoded so they are left out
+    """
+    np = requireNumpy()
+    fields = [field for field in fields if field.size]
+    return np.dtype(
+        {
+            "names": [field.name for field in fields],
+            "formats": [elementDtype(field, byteOrder) for field in fields],
+            "offsets": [field.offset - base for field in fields],
+            "itemsize": itemsize,
+        }
+    )
+
+
+def blockDtype(layout: BlockLayout, byteOrder=None, blockLength: int = None):
+    """return structured dtype of a message root block or group entry
+
+    blockLength overrides the itemsize, pass the blockLength found on the
+    wire when it differs from the schema
+    """
+    if blockLength is None:
+        blockLength = layout.blockLength
+
+    return fieldsDtype(layout.fields, blockLength, byteOrder)
+
+
+def messageDtype(messageSchema, layout: BlockLayout):
+    """return structured dtype of a message header followed by its root block
+
+    the header is a nested field named header, suitable for files of
+    fixed size messages without groups or data
+    """
+    np = requireNumpy()
+    byteOrder = messageSchema.byteOrder
+    headerLayout = messageSchema.headerLayout
+    fields = [field for field in layout.fields if field.size]
+    return np.dtype(
+        {
+            "names": ["header"] + [field.name for field in fields],
+            "formats": [elementDtype(headerLayout, byteOrder)]
+            + [elementDtype(field, byteOrder) for field in fields],
+            "offsets": [0] + [headerLayout.size + field.offset for field in fields],
+            "itemsize": headerLayout.size + layout.blockLength,
+        }
+    )
+
+
+def groupArray(cursor, layout: GroupLayout, byteOrder=None):
+    """return a zero copy structured array over the entries of a group
+
+    cursor is a group cursor positioned by its wrapGroup, entries must be
+    fixed size so the group may not contain nested groups or data
+    """
+    np = requireNumpy()
+    if layout.groups or layout.varData:
+        raise ValueError(
+            f"group '{layout.name}' entries are not fixed size, they contain"
+            " groups or data"
+        )
+
+    buffer, offset, count, blockLength = cursor.groupExtent()
+    return np.frombuffer(
+        buffer,
+        dtype=blockDtype(layout, byteOrder, blockLength),
+        count=count,
+        offset=offset,
+    )
@@ -0,0 +1,386 @@
+"""encoder.py - generate encoders writing into caller supplied buffers
+
+Encoders write the message header and root block with a single pack_into
+call straight into a bytearray or writable memoryview, nothing is
+allocated per message beyond the argument tuple. Repeating groups take a
+sequence of entry mappings, each entry is written with one pack_into.
+Variable length data takes bytes like values, or str when the schema
+declares a characterEncoding.
+"""
+from typing import Dict, List
+
+from pysbe.schema.constants import PRESENCE, TYPE_PRIMITIVE_TYPE
+from pysbe.schema.layout import (
+    BlockLayout,
+    ElementLayout,
+    GroupLayout,
+    MessageLayout,
+    VarDataLayout,
+)
+
+from .source import (
+    BlockFormat,
+    SourceBuilder,
+    leafFormat,
+    nullValue,
+    offsetSource,
+    pythonName,
+)
+
+HEADER_STRUCT_NAME = "_header"
+
+
+class EncoderGenerator:
+    """generate encode functions and flyweight encoder classes"""
+
+    def __init__(self, builder: SourceBuilder, messageSchema) -> None:
+        self.builder = builder
+        self.messageSchema = messageSchema
+        self.headerLayout = messageSchema.headerLayout
+
+    def headerArguments(self, layout: MessageLayout) -> List[str]:
+        """return source of header values, in wire order"""
+        values = {
+            "blockLength": layout.blockLength,
+            "templateId": layout.message_id,
+            "schemaId": self.messageSchema.schema_id or 0,
+            "version": self.messageSchema.version,
+        }
+        headerFormat = BlockFormat(
+            [self.headerLayout], self.headerLayout.size, self.builder.byteOrder
+        )
+        arguments = []
+        for leaf in headerFormat.leaves:
+            if leaf.name in values:
+                arguments.append(repr(values[leaf.name]))
+            elif leaf.primitiveType == TYPE_PRIMITIVE_TYPE.CHAR:
+                arguments.append(repr(b""))
+            else:
+                arguments.append("0")
+
+        return arguments
+
+    def headerFormat(self) -> str:
+        """return struct format of the message header"""
+        return BlockFormat(
+            [self.headerLayout], self.headerLayout.size, self.builder.byteOrder
+        ).format
+
+    def packArguments(
+        self, blockFormat: BlockFormat, fields: List[ElementLayout], values: str
+    ) -> List[str]:
+        """return source of pack_into arguments taken from the values mapping"""
+        expressions: Dict[int, str] = {}
+
+        def walk(element: ElementLayout, container: str) -> None:
+            if element.isConstant or not element.size:
+                return
+
+            access = f"{container}[{element.name!r}]"
+            if element.isComposite:
+                for member in element.members:
+                    walk(member, access)
+
+                return
+
+            if element.presence == PRESENCE.OPTIONAL:
+                default = self.builder.literal(nullValue(element))
+                access = f"{container}.get({element.name!r}, {default})"
+
+            _, count = blockFormat.index[id(element)]
+            expressions[id(element)] = f"*{access}" if count > 1 else access
+
+        for field in fields:
+            walk(field, values)
+
+        return [expressions[id(leaf)] for leaf in blockFormat.leaves]
+
+    def dimensionArguments(self, layout: GroupLayout, count: str) -> List[str]:
+        """return source of group dimension values, in wire order"""
+        dimension = layout.dimension
+        values = {"blockLength": repr(layout.blockLength), "numInGroup": count}
+        dimensionFormat = BlockFormat(
+            [dimension], dimension.size, self.builder.byteOrder
+        )
+        arguments = []
+        for leaf in dimensionFormat.leaves:
+            if leaf.name in values:
+                arguments.append(values[leaf.name])
+            elif leaf.primitiveType == TYPE_PRIMITIVE_TYPE.CHAR:
+                arguments.append(repr(b""))
+            else:
+                arguments.append("0")
+
+        return arguments
+
+    def groupLines(
+        self, block: BlockLayout, values: str, prefix: str, depth: int = 0
+    ) -> List[str]:
+        """return source lines writing the groups and data of block"""
+        lines = []
+        for group in block.groups:
+            name = f"{prefix}_{pythonName(group.name)}"
+            entries = f"entries{depth}"
+            entry = f"g{depth}"
+            dimension = group.dimension
+            dimensionFormat = BlockFormat(
+                [dimension], dimension.size, self.builder.byteOrder
+            )
+            packer = self.builder.packer(dimensionFormat.format[1:])
+            arguments = ", ".join(
+                self.dimensionArguments(group, f"len({entries})")
+            )
+            blockFormat = BlockFormat(
+                group.fields, group.blockLength, self.builder.byteOrder
+            )
+            structName = self.builder.struct(blockFormat.format, f"_{name}_entry")
+            entryArguments = "".join(
+                f", {argument}"
+                for argument in self.packArguments(blockFormat, group.fields, entry)
+            )
+            lines.extend(
+                [
+                    f"{entries} = {values}.get({group.name!r}, ())",
+                    f"{packer}(buffer, position, {arguments})",
+                    f"position += {dimension.size}",
+                    f"for {entry} in {entries}:",
+                    f"    {structName}.pack_into(buffer, position{entryArguments})",
+                    f"    position += {group.blockLength}",
+                ]
+            )
+            lines.extend(
+                f"    {line}"
+                for line in self.groupLines(group, entry, name, depth + 1)
+            )
+
+        for data in block.varData:
+            lines.extend(self.dataLines(data, values))
+
+        return lines
+
+    def dataLines(self, data: VarDataLayout, values: str) -> List[str]:
+        """return source lines writing length prefixed variable length data"""
+        packer = self.builder.packer(leafFormat(data.length)[0])
+        lines = [f"value = {values}.get({data.name!r}, b'')"]
+        if data.characterEncoding:
+            lines.extend(
+                [
+                    "if value.__class__ is str:",
+                    f"    value = value.encode({data.characterEncoding!r})",
+                ]
+            )
+
+        lines.extend(
+            [
+                "length = len(value)",
+                # slice assignment would grow a bytearray instead of failing
+                f"if position + {data.headerLength} + length > len(buffer):",
+                "    raise ValueError(",
+                f'        f"{data.name} of {{length}} bytes does not fit in buffer"',
+                "    )",
+                f"{packer}(buffer, {offsetSource('position', data.length.offset)},"
+                " length)",
+                f"position += {data.headerLength}",
+                "buffer[position:position + length] = value",
+                "position += length",
+            ]
+        )
+        return lines
+
+    def encodeFunction(self, layout: MessageLayout) -> str:
+        """generate encode function for header and root block"""
+        name = pythonName(layout.name)
+        blockFormat = BlockFormat(
+            layout.fields, layout.blockLength, self.builder.byteOrder
+        )
+        format = blockFormat.format
+        arguments = self.packArguments(blockFormat, layout.fields, "m")
+        length = layout.blockLength
+        if self.headerLayout is not None:
+            format = self.headerFormat() + format[1:]
+            arguments = self.headerArguments(layout) + arguments
+            length += self.headerLayout.size
+
+        structName = self.builder.struct(format, f"_{name}_message")
+        functionName = f"encode_{name}"
+        argumentLines = "".join(f"        {argument},\n" for argument in arguments)
+        if layout.groups or layout.varData:
+            lines = self.groupLines(layout, "m", name)
+            body = "".join(f"    {line}\n" for line in lines)
+            self.builder.add(
+                f"def {functionName}(\n"
+                f"    buffer, offset, m, _pack_into={structName}.pack_into\n"
+                "):\n"
+                f'    """encode message {layout.name}\n'
+                "\n"
+                "    m maps field names to values, group names to sequences of\n"
+                "    entry mappings and data names to bytes, return number of\n"
+                "    bytes written\n"
+                '    """\n'
+                "    _pack_into(\n"
+                "        buffer,\n"
+                "        offset,\n"
+                f"{argumentLines}"
+                "    )\n"
+                f"    position = {offsetSource('offset', length)}\n"
+                f"{body}"
+                "    return position - offset\n"
+            )
+            return functionName
+
+        self.builder.add(
+            f"def {functionName}(\n"
+            f"    buffer, offset, m, _pack_into={structName}.pack_into\n"
+            "):\n"
+            f'    """encode header and root block of message {layout.name}\n'
+            "\n"
+            "    m maps field names to values, return number of bytes written\n"
+            '    """\n'
+            "    _pack_into(\n"
+            "        buffer,\n"
+            "        offset,\n"
+            f"{argumentLines}"
+            "    )\n"
+            f"    return {length}\n"
+        )
+        return functionName
+
+    def messageClass(self, layout: MessageLayout, functionName: str) -> str:
+        """generate flyweight encoder for a message root block"""
+        name = pythonName(layout.name)
+        className = self.builder.className(f"{name}Encoder")
+        headerLength = 0
+        header = []
+        if self.headerLayout is not None:
+            headerLength = self.headerLayout.size
+            structName = self.builder.struct(self.headerFormat(), HEADER_STRUCT_NAME)
+            arguments = ", ".join(self.headerArguments(layout))
+            header = [
+                "",
+                "    def wrapAndApplyHeader(self, buffer, offset=0):",
+                '        """write message header, wrap the root block after it"""',
+                f"        {structName}.pack_into(buffer, offset, {arguments})",
+                "        self._buffer = buffer",
+                f"        self._offset = {offsetSource('offset', headerLength)}",
+                "        return self",
+            ]
+
+        self.classSource(
+            className,
+            f"flyweight encoder for message {layout.name}",
+            layout.fields,
+            attributes=(
+                ("sbeTemplateId", repr(layout.message_id)),
+                ("sbeBlockLength", repr(layout.blockLength)),
+                ("sbeHeaderLength", repr(headerLength)),
+                ("encode", f"staticmethod({functionName})"),
+            ),
+            methods=header,
+        )
+        return className
+
+    def compositeClass(self, element: ElementLayout) -> str:
+        """generate encoder for a composite once, return class name"""
+        key = ("encoder", id(element.sbeType), element.presence)
+        if key in self.builder.compositeNames:
+            return self.builder.compositeNames[key]
+
+        className = self.builder.className(
+            f"{pythonName(element.sbeType.name)}Encoder"
+        )
+        self.builder.compositeNames[key] = className
+        self.classSource(
+            className,
+            f"flyweight encoder for composite {element.sbeType.name}",
+            element.members,
+            base=element.offset,
+            attributes=(("sbeEncodedLength", repr(element.size)),),
+        )
+        return className
+
+    def classSource(
+        self,
+        className: str,
+        description: str,
+        fields: List[ElementLayout],
+        base: int = 0,
+        attributes=(),
+        methods=(),
+    ) -> None:
+        """generate an encoder class with a write-only property per field"""
+        fields = [field for field in fields if field.size and not field.isConstant]
+        composites = [
+            (field, self.compositeClass(field)) for field in fields if field.isComposite
+        ]
+        slots = ["_buffer", "_offset"] + [
+            f"_{pythonName(field.name)}" for field, _ in composites
+        ]
+        lines = [
+            f"class {className}:",
+            f'    """{description}"""',
+            f"    __slots__ = {tuple(slots)!r}",
+        ]
+        lines.extend(f"    {name} = {value}" for name, value in attributes)
+        lines.extend(
+            [
+                "",
+                "    def __init__(self, buffer=None, offset=0):",
+                "        self._buffer = buffer",
+                "        self._offset = offset",
+            ]
+        )
+        lines.extend(
+            f"        self._{pythonName(field.name)} = {compositeClassName}()"
+            for field, compositeClassName in composites
+        )
+        lines.extend(
+            [
+                "",
+                "    def wrap(self, buffer, offset=0):",
+                '        """point this flyweight at buffer, offset"""',
+                "        self._buffer = buffer",
+                "        self._offset = offset",
+                "        return self",
+            ]
+        )
+        lines.extend(methods)
+        for field in fields:
+            fieldName = pythonName(field.name)
+            position = offsetSource("self._offset", field.offset - base)
+            if field.isComposite:
+                lines.extend(
+                    [
+                        "",
+                        "    @property",
+                        f"    def {fieldName}(self):",
+                        f"        return self._{fieldName}.wrap("
+                        f"self._buffer, {position})",
+                    ]
+                )
+                continue
+
+            code, count = leafFormat(field)
+            packer = self.builder.packer(code)
+            value = "*value" if count > 1 else "value"
+            lines.extend(
+                [
+                    "",
+                    f"    def {fieldName}(self, value):",
+                    f"        {packer}(self._buffer, {position}, {value})",
+                    "",
+                    f"    {fieldName} = property(None, {fieldName})",
+                ]
+            )
+
+        self.builder.add("\n".join(lines) + "\n")
+
+
+def encoderSource(builder: SourceBuilder, messageSchema, layout: MessageLayout):
+    """generate encoders for a message
+
+    return encode function name and flyweight encoder class name
+    """
+    generator = EncoderGenerator(builder, messageSchema)
+    functionName = generator.encodeFunction(layout)
+    className = generator.messageClass(layout, functionName)
+    return functionName, className
@@ -0,0 +1,439 @@
+"""flyweight.py - generate zero copy flyweight decoder classes
+
+A flyweight wraps a buffer and an offset, each property decodes its field
+from the buffer only when read. wrap() re-points an existing instance at
+the next message so nothing is copied or allocated per field. Variable
+length data is returned as a memoryview slice, text is only decoded when
+the <name>Text property is read.
+
+A repeating group property returns a cursor over the group entries. The
+cursor is the entry flyweight itself, iterating re-wraps it at the next
+entry using the blockLength read from the group dimension header, so one
+instance serves every entry of the group.
+
+A message flyweight is wrapped with the blockLength of its message header,
+groups and data after a longer root block of a newer version are found.
+Flyweights generated for an older actingVersion expose fields, groups and
+data added by later versions as their null value, empty and b"".
+"""
+from typing import List, Optional
+
+from pysbe.schema.constants import TYPE_PRIMITIVE_TYPE
+from pysbe.schema.layout import (
+    BlockLayout,
+    ElementLayout,
+    GroupLayout,
+    MessageLayout,
+)
+
+from .length import (
+    dataLengthSource,
+    dataSkipLines,
+    dimensionLines,
+    groupSkipLines,
+    skipLines,
+)
+from .source import (
+    SourceBuilder,
+    constantValue,
+    leafFormat,
+    absentSource,
+    inVersion,
+    offsetSource,
+    pythonName,
+)
+
+CURSOR_SLOTS = ("_blockLength", "_count", "_index", "_next", "_start")
+
+
+class FlyweightGenerator:
+    """generate flyweight decoder classes into a SourceBuilder"""
+
+    def __init__(
+        self, builder: SourceBuilder, actingVersion: Optional[int] = None
+    ) -> None:
+        self.builder = builder
+        self.actingVersion = actingVersion
+        # older versions get their own class names
+        self.suffix = "" if actingVersion is None else f"_v{actingVersion}"
+        # group entry decoder class names keyed by dotted group path
+        self.groupClassNames = {}
+
+    def messageClass(self, layout: MessageLayout) -> str:
+        """generate decoder for a message root block, return class name"""
+        name = pythonName(layout.name)
+        className = self.builder.className(f"{name}Decoder{self.suffix}")
+        groups = [
+            (group, self.groupClass(group, name, group.name))
+            for group in layout.groups
+        ]
+        self.classSource(
+            className,
+            f"flyweight decoder for message {layout.name}",
+            layout.fields,
+            attributes=(
+                ("sbeTemplateId", layout.message_id),
+                ("sbeBlockLength", layout.blockLength),
+            ),
+            block=layout,
+            blockLength="self._blockLength",
+            groups=groups,
+            slots=("_blockLength",),
+            initialise=(f"self._blockLength = {layout.blockLength}",),
+            wrapArguments=(("blockLength", layout.blockLength),),
+        )
+        return className
+
+    def groupClass(self, layout: GroupLayout, prefix: str, path: str) -> str:
+        """generate cursor and decoder for group entries, return class name"""
+        name = f"{prefix}_{pythonName(layout.name)}"
+        className = self.builder.className(f"{name}Decoder{self.suffix}")
+        self.groupClassNames[path] = className
+        groups = [
+            (group, self.groupClass(group, name, f"{path}.{group.name}"))
+            for group in layout.groups
+        ]
+        self.classSource(
+            className,
+            f"cursor and flyweight decoder for group {layout.name} entries",
+            layout.fields,
+            attributes=(("sbeBlockLength", layout.blockLength),),
+            block=layout,
+            blockLength="self._blockLength",
+            groups=groups,
+            slots=CURSOR_SLOTS,
+            initialise=(
+                f"self._blockLength = {layout.blockLength}",
+                "self._count = 0",
+                "self._index = 0",
+                "self._next = offset",
+                "self._start = offset",
+            ),
+            methods=self.cursorMethods(layout),
+        )
+        return className
+
+    def cursorMethods(self, layout: GroupLayout) -> List[str]:
+        """return source lines of the cursor methods of a group class"""
+        size = layout.dimension.size
+        lines = [
+            "",
+            "    def wrapGroup(self, buffer, offset):",
+            '        """read the group dimension header at offset, rewind"""',
+        ]
+        lines.extend(
+            f"        {line}"
+            for line in dimensionLines(self.builder, layout, "blockLength", "count")
+        )
+        lines.extend(
+            [
+                "        self._buffer = buffer",
+                "        self._blockLength = blockLength",
+                "        self._count = count",
+                "        self._index = 0",
+                f"        self._offset = self._next = self._start = offset + {size}",
+                "        return self",
+                "",
+                "    def wrapEmpty(self, buffer, offset):",
+                '        """point at a group the acting version does not encode"""',
+                "        self._buffer = buffer",
+                "        self._count = 0",
+                "        self._index = 0",
+                "        self._offset = self._next = self._start = offset",
+                "        return self",
+                "",
+                "    @property",
+                "    def count(self):",
+                '        """number of entries in the group"""',
+                "        return self._count",
+                "",
+                "    def groupExtent(self):",
+                '        """return buffer, first entry offset, count, blockLength"""',
+                "        return (",
+                "            self._buffer, self._start, self._count, self._blockLength",
+                "        )",
+                "",
+                "    def __len__(self):",
+                "        return self._count",
+                "",
+                "    def __iter__(self):",
+                "        return self",
+                "",
+                "    def __next__(self):",
+                "        index = self._index",
+                "        if index >= self._count:",
+                "            raise StopIteration",
+                "        self._index = index + 1",
+                "        offset = self._offset = self._next",
+            ]
+        )
+        nested = skipLines(self.builder, layout, actingVersion=self.actingVersion)
+        if not nested:
+            lines.append("        self._next = offset + self._blockLength")
+        else:
+            # entries are not a fixed size, find where the next one starts
+            lines.extend(
+                [
+                    "        buffer = self._buffer",
+                    "        offset += self._blockLength",
+                ]
+            )
+            lines.extend(f"        {line}" for line in nested)
+            lines.append("        self._next = offset")
+
+        lines.append("        return self")
+        return lines
+
+    def compositeClass(self, element: ElementLayout) -> str:
+        """generate decoder for a composite once, return class name"""
+        key = (id(element.sbeType), element.presence)
+        if key in self.builder.compositeNames:
+            return self.builder.compositeNames[key]
+
+        className = self.builder.className(
+            f"{pythonName(element.sbeType.name)}Decoder{self.suffix}"
+        )
+        self.builder.compositeNames[key] = className
+        self.classSource(
+            className,
+            f"flyweight decoder for composite {element.sbeType.name}",
+            element.members,
+            base=element.offset,
+            attributes=(("sbeEncodedLength", element.size),),
+        )
+        return className
+
+    def classSource(
+        self,
+        className: str,
+        description: str,
+        fields: List[ElementLayout],
+        base: int = 0,
+        attributes=(),
+        block: BlockLayout = None,
+        blockLength: str = None,
+        groups=(),
+        slots=(),
+        initialise=(),
+        methods=(),
+        wrapArguments=(),
+    ) -> None:
+        """generate a flyweight class, field offsets are relative to base
+
+        block supplies the groups and variable length data of a message or
+        group entry, which start blockLength bytes after self._offset.
+        wrapArguments lists (name, default) of extra wrap arguments stored
+        as self._name
+        """
+        composites = [
+            (field, self.compositeClass(field))
+            for field in fields
+            if field.isComposite and not self.isFixed(field)
+        ]
+        nested = composites + list(groups)
+        slots = (
+            ["_buffer", "_offset"]
+            + list(slots)
+            + [f"_{pythonName(element.name)}" for element, _ in nested]
+        )
+        lines = [
+            f"class {className}:",
+            f'    """{description}"""',
+            f"    __slots__ = {tuple(slots)!r}",
+        ]
+        lines.extend(f"    {name} = {value!r}" for name, value in attributes)
+        lines.extend(
+            f"    {pythonName(field.name)} = {self.constantSource(field)}"
+            for field in fields
+            if self.isFixed(field)
+        )
+        lines.extend(
+            [
+                "",
+                "    def __init__(self, buffer=None, offset=0):",
+                "        self._buffer = buffer",
+                "        self._offset = offset",
+            ]
+        )
+        lines.extend(f"        {line}" for line in initialise)
+        lines.extend(
+            f"        self._{pythonName(element.name)} = {nestedClassName}()"
+            for element, nestedClassName in nested
+        )
+        arguments = "".join(
+            f", {name}={default!r}" for name, default in wrapArguments
+        )
+        lines.extend(
+            [
+                "",
+                f"    def wrap(self, buffer, offset=0{arguments}):",
+                '        """point this flyweight at buffer, offset"""',
+                "        self._buffer = buffer",
+                "        self._offset = offset",
+            ]
+        )
+        lines.extend(f"        self._{name} = {name}" for name, _ in wrapArguments)
+        lines.append("        return self")
+        lines.extend(methods)
+        for field in fields:
+            if self.isFixed(field):
+                continue
+
+            lines.extend(
+                [
+                    "",
+                    "    @property",
+                    f"    def {pythonName(field.name)}(self):",
+                ]
+            )
+            lines.extend(
+                f"        {line}"
+                for line in self.propertyBody(field, field.offset - base)
+            )
+
+        if block is not None:
+            for index in range(len(block.groups)):
+                lines.extend(self.groupProperty(block, blockLength, index))
+
+            for index in range(len(block.varData)):
+                lines.extend(self.dataProperty(block, blockLength, index))
+
+        self.builder.add("\n".join(lines) + "\n")
+
+    def groupProperty(
+        self, block: BlockLayout, blockLength: str, index: int
+    ) -> List[str]:
+        """return source lines of the property returning a group cursor
+
+        the group position is found by walking the preceding groups
+        """
+        group = block.groups[index]
+        name = pythonName(group.name)
+        if not inVersion(group, self.actingVersion):
+            body = [f"return self._{name}.wrapEmpty(self._buffer, self._offset)"]
+        else:
+            body = [
+                "buffer = self._buffer",
+                f"offset = self._offset + {blockLength}",
+            ]
+            body.extend(
+                groupSkipLines(
+                    self.builder, block.groups[:index], actingVersion=self.actingVersion
+                )
+            )
+            body.append(f"return self._{name}.wrapGroup(buffer, offset)")
+        lines = ["", "    @property", f"    def {name}(self):"]
+        lines.extend(f"        {line}" for line in body)
+        return lines
+
+    def dataProperty(
+        self, block: BlockLayout, blockLength: str, index: int
+    ) -> List[str]:
+        """return source lines of the properties for variable length data
+
+        the data position is found by walking the groups and preceding data
+        """
+        data = block.varData[index]
+        name = pythonName(data.name)
+        if not inVersion(data, self.actingVersion):
+            lines = ["", f"    {name} = b''"]
+            if data.characterEncoding:
+                lines.append(f"    {data.name}Text = ''")
+
+            return lines
+
+        body = [
+            "buffer = self._buffer",
+            f"offset = self._offset + {blockLength}",
+        ]
+        body.extend(
+            groupSkipLines(
+                self.builder, block.groups, actingVersion=self.actingVersion
+            )
+        )
+        body.extend(
+            dataSkipLines(
+                self.builder, block.varData[:index], actingVersion=self.actingVersion
+            )
+        )
+        body.extend(
+            [
+                f"length = {dataLengthSource(self.builder, data)}",
+                f"offset += {data.headerLength}",
+                "return memoryview(buffer)[offset:offset + length]",
+            ]
+        )
+        lines = ["", "    @property", f"    def {name}(self):"]
+        lines.extend(f"        {line}" for line in body)
+        if data.characterEncoding:
+            lines.extend(
+                [
+                    "",
+                    "    @property",
+                    f"    def {data.name}Text(self):",
+                    f"        return str(self.{name}, {data.characterEncoding!r})",
+                ]
+            )
+
+        return lines
+
+    def isFixed(self, field: ElementLayout) -> bool:
+        """return whether field is a class attribute instead of a property
+
+        constants, empty fields and fields the acting version does not
+        encode never read the buffer
+        """
+        return (
+            field.isConstant
+            or not field.size
+            or not inVersion(field, self.actingVersion)
+        )
+
+    def constantSource(self, field: ElementLayout) -> str:
+        """return class attribute value for constant, empty or absent fields"""
+        if not field.isConstant and not inVersion(field, self.actingVersion):
+            return absentSource(field)
+
+        if field.isComposite:
+            # every member is constant, expose them as a plain mapping
+            return repr(
+                {member.name: constantValue(member) for member in field.members}
+            )
+
+        return repr(constantValue(field))
+
+    def propertyBody(self, field: ElementLayout, offset: int) -> List[str]:
+        """return source lines decoding field at offset from self._offset"""
+        position = offsetSource("self._offset", offset)
+        if field.isComposite:
+            return [
+                f"return self._{pythonName(field.name)}.wrap(self._buffer, {position})"
+            ]
+
+        if field.primitiveType == TYPE_PRIMITIVE_TYPE.CHAR and field.length > 1:
+            # zero copy slice when wrapping a memoryview
+            return [
+                f"offset = {position}",
+                f"return self._buffer[offset:offset + {field.length}]",
+            ]
+
+        code, count = leafFormat(field)
+        unpacker = self.builder.unpacker(code)
+        if count == 1:
+            return [f"return {unpacker}(self._buffer, {position})[0]"]
+
+        return [f"return {unpacker}(self._buffer, {position})"]
+
+
+def flyweightSource(
+    builder: SourceBuilder, layout: MessageLayout, actingVersion: Optional[int] = None
+):
+    """generate flyweight classes for a message
+
+    with actingVersion the classes read only what messages of that older
+    version encode. Return decoder class name and group entry class names
+    by group path
+    """
+    generator = FlyweightGenerator(builder, actingVersion)
+    className = generator.messageClass(layout)
+    return className, generator.groupClassNames
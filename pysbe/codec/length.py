@@ -0,0 +1,135 @@
+"""length.py - generate functions measuring encoded messages
+
+A skip function starts at the end of a root block and walks the group
+dimension headers using the blockLength and numInGroup found on the wire,
+then the length prefix of each variable length data field. No payload
+field is decoded, groups without nested groups or data are skipped with a
+single multiplication.
+"""
+from typing import List, Optional
+
+from pysbe.schema.layout import (
+    BlockLayout,
+    GroupLayout,
+    MessageLayout,
+    VarDataLayout,
+)
+
+from .source import (
+    BlockFormat,
+    SourceBuilder,
+    inVersion,
+    leafFormat,
+    offsetSource,
+    pythonName,
+)
+
+
+def dataLengthSource(builder: SourceBuilder, data: VarDataLayout) -> str:
+    """return expression reading the length prefix of data at offset"""
+    unpacker = builder.unpacker(leafFormat(data.length)[0])
+    return f"{unpacker}(buffer, {offsetSource('offset', data.length.offset)})[0]"
+
+
+def dataSkipLines(
+    builder: SourceBuilder,
+    varData: List[VarDataLayout],
+    actingVersion: Optional[int] = None,
+) -> List[str]:
+    """return source lines advancing offset past variable length data"""
+    return [
+        f"offset += {data.headerLength} + {dataLengthSource(builder, data)}"
+        for data in varData
+        if inVersion(data, actingVersion)
+    ]
+
+
+def skipLines(
+    builder: SourceBuilder,
+    block: BlockLayout,
+    depth: int = 0,
+    actingVersion: Optional[int] = None,
+) -> List[str]:
+    """return source lines advancing offset past the groups and data of block
+
+    with actingVersion, groups and data added by later versions are not on
+    the wire and are not read
+    """
+    return groupSkipLines(builder, block.groups, depth, actingVersion) + dataSkipLines(
+        builder, block.varData, actingVersion
+    )
+
+
+def dimensionLines(
+    builder: SourceBuilder, group: GroupLayout, blockLength: str, count: str
+) -> List[str]:
+    """return source lines reading the dimension header at offset"""
+    dimension = group.dimension
+    dimensionFormat = BlockFormat([dimension], dimension.size, builder.byteOrder)
+    unpacker = builder.unpacker(dimensionFormat.format[1:])
+    blockLengthIndex, _ = dimensionFormat.index[id(dimension.member("blockLength"))]
+    countIndex, _ = dimensionFormat.index[id(dimension.member("numInGroup"))]
+    if dimensionFormat.valueCount == 2 and blockLengthIndex == 0:
+        return [f"{blockLength}, {count} = {unpacker}(buffer, offset)"]
+
+    return [
+        f"dimension = {unpacker}(buffer, offset)",
+        f"{blockLength} = dimension[{blockLengthIndex}]",
+        f"{count} = dimension[{countIndex}]",
+    ]
+
+
+def groupSkipLines(
+    builder: SourceBuilder,
+    groups: List[GroupLayout],
+    depth: int = 0,
+    actingVersion: Optional[int] = None,
+) -> List[str]:
+    """return source lines advancing offset past groups"""
+    lines = []
+    for group in groups:
+        if not inVersion(group, actingVersion):
+            continue
+
+        blockLength = f"blockLength{depth}"
+        count = f"numInGroup{depth}"
+        lines.extend(dimensionLines(builder, group, blockLength, count))
+        lines.append(f"offset += {group.dimension.size}")
+        nested = skipLines(builder, group, depth + 1, actingVersion)
+        if not nested:
+            lines.append(f"offset += {blockLength} * {count}")
+            continue
+
+        lines.extend(
+            [
+                f"for _ in range({count}):",
+                f"    offset += {blockLength}",
+            ]
+        )
+        lines.extend(f"    {line}" for line in nested)
+
+    return lines
+
+
+def skipSource(
+    builder: SourceBuilder, layout: MessageLayout, actingVersion: Optional[int] = None
+) -> str:
+    """generate a function returning the offset just past a message
+
+    the function is called with the offset of the end of the root block,
+    actingVersion specialises it for messages of an older version, return
+    function name
+    """
+    name = f"skip_{pythonName(layout.name)}"
+    if actingVersion is not None:
+        name = f"{name}_v{actingVersion}"
+
+    lines = [
+        f"def {name}(buffer, offset):",
+        f'    """return offset after groups and data of message {layout.name}"""',
+    ]
+    body = skipLines(builder, layout, actingVersion=actingVersion)
+    lines.extend(f"    {line}" for line in body)
+    lines.append("    return offset")
+    builder.add("\n".join(lines) + "\n")
+    return name
@@ -0,0 +1,117 @@
+"""parallel.py - decode a capture file across a pool of processes
+
+mapCapture splits a capture file into shards of whole messages using the
+CaptureReader index and hands each shard to a ProcessPoolExecutor. A
+shard is sent as a byte range only, every worker maps the capture file
+itself and builds its SchemaCodec once from the pickled schema and the
+marshalled generated code of the parent, so neither message bytes nor
+codec generation cross the process boundary.
+
+The mapper is called once per shard with an iterator over its messages
+and returns a picklable result, results come back in capture order and
+are combined with reducer when one is given. Mapper and reducer must be
+picklable, e.g. module level functions.
+"""
+import functools
+import mmap
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional
+
+from pysbe.cache import dumpCompiled, loadCompiled
+
+from .capture import CaptureReader, iterFrames
+from .compiler import SchemaCodec
+from .stream import copyData
+
+# shards per worker process, several even out shards that decode slower
+DEFAULT_SHARDS_PER_WORKER = 4
+
+# per process worker state set up by initWorker
+_worker = {}
+
+
+def decodeMessages(messages: Iterator) -> List[tuple]:
+    """mapper returning (templateId, values) of every message, data as bytes"""
+    return [(templateId, copyData(values)) for templateId, values in messages]
+
+
+def initWorker(filename, messageSchema, codecs, lengthPrefix, flyweights) -> None:
+    """map the capture and build the schema codec of a worker process"""
+    schemaCodec = SchemaCodec(messageSchema, loadCompiled(codecs))
+    with open(filename, "rb") as captureFile:
+        buffer = mmap.mmap(captureFile.fileno(), 0, access=mmap.ACCESS_READ)
+
+    _worker.update(
+        schemaCodec=schemaCodec,
+        buffer=buffer,
+        prefix=struct.Struct(lengthPrefix) if lengthPrefix else None,
+        flyweights=flyweights,
+    )
+
+
+def shardMessages(start: int, end: int) -> Iterator:
+    """yield the messages of the worker capture between start and end"""
+    schemaCodec = _worker["schemaCodec"]
+    buffer = _worker["buffer"]
+    decode = schemaCodec.wrap if _worker["flyweights"] else schemaCodec.decode
+    for offset, _ in iterFrames(buffer, end, schemaCodec, _worker["prefix"], start):
+        yield decode(buffer, offset)
+
+
+def mapShard(mapper: Callable, start: int, end: int):
+    return mapper(shardMessages(start, end))
+
+
+def mapCapture(
+    filename: str,
+    schemaCodec: SchemaCodec,
+    mapper: Callable = decodeMessages,
+    reducer: Optional[Callable] = None,
+    lengthPrefix: Optional[str] = None,
+    flyweights: bool = False,
+    workers: Optional[int] = None,
+    shards: Optional[int] = None,
+):
+    """map every shard of a capture file in worker processes
+
+    mapper receives an iterator over the messages of a shard, flyweights or
+    (templateId, values) tuples as returned by SchemaCodec.decode, both
+    only valid until the next message. Return the list of mapper results in
+    capture order, or their reduction by reducer.
+    """
+    workers = workers or os.cpu_count() or 1
+    with CaptureReader(filename, schemaCodec, lengthPrefix) as reader:
+        count = len(reader)
+        shards = min(shards or workers * DEFAULT_SHARDS_PER_WORKER, count)
+        # message aligned byte offsets of the shard boundaries
+        bounds = [
+            reader.frameOffset(shard * count // shards) for shard in range(shards)
+        ]
+        bounds.append(reader.frameOffset(count))
+
+    if not count:
+        # an empty capture can not be mapped by the workers
+        results = [mapper(iter(()))]
+    else:
+        initargs = (
+            filename,
+            schemaCodec.messageSchema,
+            dumpCompiled(schemaCodec),
+            lengthPrefix,
+            flyweights,
+        )
+        with ProcessPoolExecutor(
+            min(workers, shards), initializer=initWorker, initargs=initargs
+        ) as executor:
+            results = list(
+                executor.map(
+                    functools.partial(mapShard, mapper), bounds[:-1], bounds[1:]
+                )
+            )
+
+    if reducer is None:
+        return results
+
+    return functools.reduce(reducer, results)
@@ -0,0 +1,199 @@
+"""registry.py - codecs for several schemas keyed by (schemaId, version)
+
+A SchemaRegistry holds any number of message schemas and compiles their
+codecs when a message of that schema is first seen. The schemaId and
+version in each message header pick the schema. A message of a version
+that is not registered is decoded by the newest registered version of its
+schema that is not newer than the message, older decoders skip fields
+they do not know using the blockLength from the header. A message older
+than every registered version is decoded by the oldest one, which reads
+only what that message version encodes.
+
+At most maxCodecs compiled SchemaCodecs are kept, the least recently used
+one is dropped first and compiled again when it is needed. Schemas
+themselves are always kept. Lookups may run from several threads, wrap
+returns a new flyweight on each call so threads never share one.
+"""
+import bisect
+import operator
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from pysbe.schema.exceptions import DuplicateId, InvalidLayout, UnknownSchema
+
+from .compiler import MessageHeader, SchemaCodec, headerReader
+
+DEFAULT_MAX_CODECS = 32
+
+
+class SchemaRegistry:
+    """message schemas and their compiled codecs keyed by (schemaId, version)"""
+
+    def __init__(self, maxCodecs: int = DEFAULT_MAX_CODECS) -> None:
+        if maxCodecs < 1:
+            raise ValueError("maxCodecs must be at least 1")
+
+        self.maxCodecs = maxCodecs
+        self.schemas: Dict[Tuple[int, int], object] = {}
+        # registered versions of each schemaId, sorted
+        self.versions: Dict[int, List[int]] = {}
+        # least recently used first
+        self.codecs: "OrderedDict[Tuple[int, int], SchemaCodec]" = OrderedDict()
+        # header (schemaId, version) -> registered key
+        self._resolved = {}
+        self._lock = threading.RLock()
+        self.headerStruct = None
+        self.headerLength = 0
+        self._schemaIdIndex = None
+        self._versionIndex = None
+        self._headerFields = None
+        self._headerKey = None
+
+    def __len__(self) -> int:
+        return len(self.schemas)
+
+    def __contains__(self, key) -> bool:
+        return key in self.schemas
+
+    def addSchema(self, messageSchema) -> Tuple[int, int]:
+        """register messageSchema, return its (schemaId, version) key
+
+        every schema must encode its message header the same way
+        """
+        if messageSchema.schema_id is None:
+            raise ValueError("messageSchema must have an id to be registered")
+
+        headerLayout = messageSchema.headerLayout
+        if headerLayout is None:
+            raise ValueError("messageSchema does not define a message header")
+
+        headerStruct, indexes = headerReader(headerLayout, messageSchema.byteOrder)
+        headerKey = (headerStruct.format, tuple(indexes))
+        key = (messageSchema.schema_id, messageSchema.version)
+        with self._lock:
+            if key in self.schemas:
+                raise DuplicateId(
+                    f"schema id {key[0]} version {key[1]} is already registered"
+                )
+
+            if self._headerKey is None:
+                self.headerStruct = headerStruct
+                self.headerLength = headerLayout.size
+                self._headerKey = headerKey
+                self._headerFields = operator.itemgetter(*indexes)
+                self._schemaIdIndex, self._versionIndex = indexes[2:]
+            elif headerKey != self._headerKey:
+                raise InvalidLayout(
+                    f"schema id {key[0]} version {key[1]} message header"
+                    " differs from the header of the registered schemas"
+                )
+
+            self.schemas[key] = messageSchema
+            bisect.insort(self.versions.setdefault(key[0], []), key[1])
+            self._resolved.clear()
+
+        return key
+
+    def removeSchema(self, schemaId: int, version: int) -> None:
+        """forget a registered schema and its codec"""
+        key = (schemaId, version)
+        with self._lock:
+            if key not in self.schemas:
+                raise UnknownSchema(
+                    f"schema id {schemaId} version {version} is not registered"
+                )
+
+            del self.schemas[key]
+            self.codecs.pop(key, None)
+            versions = self.versions[schemaId]
+            versions.remove(version)
+            if not versions:
+                del self.versions[schemaId]
+
+            self._resolved.clear()
+
+    def resolve(self, schemaId: int, version: int) -> Tuple[int, int]:
+        """return the registered key decoding messages of schemaId, version"""
+        key = (schemaId, version)
+        resolved = self._resolved.get(key)
+        if resolved is not None:
+            return resolved
+
+        with self._lock:
+            versions = self.versions.get(schemaId)
+            if not versions:
+                raise UnknownSchema(
+                    f"schema id {schemaId!r} version {version!r}"
+                    " does not match a registered schema"
+                )
+
+            # older than every registered version falls back to the oldest
+            position = max(bisect.bisect_right(versions, version), 1)
+            resolved = (schemaId, versions[position - 1])
+            self._resolved[key] = resolved
+
+        return resolved
+
+    def getSchema(self, schemaId: int, version: int):
+        """return the messageSchema decoding messages of schemaId, version"""
+        return self.schemas[self.resolve(schemaId, version)]
+
+    def getCodec(self, schemaId: int, version: int) -> SchemaCodec:
+        """return the SchemaCodec for schemaId, version, compiling it if needed"""
+        key = self.resolve(schemaId, version)
+        with self._lock:
+            schemaCodec = self.codecs.get(key)
+            if schemaCodec is not None:
+                self.codecs.move_to_end(key)
+                return schemaCodec
+
+            messageSchema = self.schemas.get(key)
+            if messageSchema is None:
+                raise UnknownSchema(
+                    f"schema id {key[0]} version {key[1]} is not registered"
+                )
+
+        # compile without holding the lock, other schemas stay available
+        schemaCodec = SchemaCodec(messageSchema)
+        with self._lock:
+            if self.schemas.get(key) is not messageSchema:
+                # removed or replaced while compiling, do not cache
+                return schemaCodec
+
+            schemaCodec = self.codecs.setdefault(key, schemaCodec)
+            self.codecs.move_to_end(key)
+            while len(self.codecs) > self.maxCodecs:
+                self.codecs.popitem(last=False)
+
+        return schemaCodec
+
+    def unpackHeader(self, buffer, offset: int = 0) -> tuple:
+        """return every value of the message header at offset"""
+        if self.headerStruct is None:
+            raise UnknownSchema("no schema is registered")
+
+        return self.headerStruct.unpack_from(buffer, offset)
+
+    def peekHeader(self, buffer, offset: int = 0) -> MessageHeader:
+        """return blockLength, templateId, schemaId and version at offset"""
+        header = self.unpackHeader(buffer, offset)
+        return MessageHeader._make(self._headerFields(header))
+
+    def codecFor(self, buffer, offset: int = 0) -> SchemaCodec:
+        """return the SchemaCodec for the message at offset"""
+        header = self.unpackHeader(buffer, offset)
+        return self.getCodec(header[self._schemaIdIndex], header[self._versionIndex])
+
+    def decode(self, buffer, offset: int = 0):
+        """decode header and root block of the message at offset
+
+        return the message header and the decoded root block
+        """
+        header = self.peekHeader(buffer, offset)
+        schemaCodec = self.getCodec(header.schemaId, header.version)
+        return header, schemaCodec.decode(buffer, offset)[1]
+
+    def wrap(self, buffer, offset: int = 0):
+        """wrap the message at offset with a new flyweight decoder"""
+        return self.codecFor(buffer, offset).wrap(buffer, offset, fresh=True)
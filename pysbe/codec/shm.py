@@ -0,0 +1,300 @@
+"""shm.py - single producer, multiple consumer ring buffer in shared memory
+
+A RingProducer creates a multiprocessing.shared_memory block holding a
+control area and a ring of capacity bytes. Messages are encoded straight
+into the ring with the schema encoders, RingConsumers attached in other
+processes read them in place with flyweight decoders, so messages are
+never copied or pickled between processes.
+
+shared memory layout, every counter on its own 64 byte line:
+
+    0     capacity, maxConsumers
+    64    published position, bytes written by the producer so far
+    128   position of each consumer slot, unused slots hold INACTIVE
+    ...   ring of capacity bytes
+
+Positions only grow, the ring offset of a position is position modulo
+capacity. Each record in the ring is an 8 byte header, message length and
+kind, followed by the message and padded to a multiple of 8 bytes. A
+message that does not fit before the end of the ring is preceded by a
+padding record filling the rest and starts at ring offset 0.
+
+The producer claims space, writes the message, then stores the published
+position, consumers read the published position and then the records
+before it. Consumers store their position once done with each message,
+the producer never claims space a registered consumer has not read yet.
+The ordering relies on aligned 8 byte stores becoming visible in program
+order, as on x86-64.
+"""
+import struct
+import sys
+from multiprocessing import shared_memory
+from typing import Iterator, Optional
+
+CACHE_LINE = 64
+
+CONFIG = struct.Struct("<QQ")
+
+COUNTER = struct.Struct("<Q")
+
+PUBLISHED_OFFSET = CACHE_LINE
+
+CONSUMERS_OFFSET = 2 * CACHE_LINE
+
+RECORD_HEADER = struct.Struct("<ii")
+
+RECORD_MESSAGE = 0
+
+RECORD_PADDING = 1
+
+INACTIVE = 2**64 - 1
+
+DEFAULT_CAPACITY = 1 << 20
+
+DEFAULT_MAX_CONSUMERS = 8
+
+# space claimed by offer for a message with groups or data
+DEFAULT_MAX_MESSAGE_LENGTH = 4096
+
+
+def recordLength(length: int) -> int:
+    """return ring bytes used by a message of length bytes"""
+    return (RECORD_HEADER.size + length + 7) & ~7
+
+
+def ringOffset(maxConsumers: int) -> int:
+    """return offset of the ring from the start of the shared memory"""
+    return CONSUMERS_OFFSET + maxConsumers * CACHE_LINE
+
+
+class RingBuffer:
+    """shared memory block holding the ring, its counters and consumer slots"""
+
+    def __init__(self, schemaCodec, sharedMemory) -> None:
+        if schemaCodec.headerStruct is None:
+            raise ValueError("messageSchema does not define a message header")
+
+        self.schemaCodec = schemaCodec
+        self.sharedMemory = sharedMemory
+        self.name = sharedMemory.name
+        self.buffer = sharedMemory.buf
+        self.capacity, self.maxConsumers = CONFIG.unpack_from(self.buffer, 0)
+        self.mask = self.capacity - 1
+        self.ring = ringOffset(self.maxConsumers)
+        # every consumer position in one unpack
+        self.consumers = struct.Struct(
+            "<" + f"Q{CACHE_LINE - COUNTER.size}x" * self.maxConsumers
+        )
+
+    def published(self) -> int:
+        return COUNTER.unpack_from(self.buffer, PUBLISHED_OFFSET)[0]
+
+    def slotOffset(self, slot: int) -> int:
+        if not 0 <= slot < self.maxConsumers:
+            raise ValueError(f"consumer slot must be below {self.maxConsumers}")
+
+        return CONSUMERS_OFFSET + slot * CACHE_LINE
+
+    def close(self) -> None:
+        """detach from the shared memory, views of it must be released"""
+        self.buffer = None
+        self.sharedMemory.close()
+
+
+class RingProducer(RingBuffer):
+    """create a ring buffer and publish messages into it"""
+
+    def __init__(
+        self,
+        schemaCodec,
+        name: Optional[str] = None,
+        capacity: int = DEFAULT_CAPACITY,
+        maxConsumers: int = DEFAULT_MAX_CONSUMERS,
+        maxMessageLength: int = DEFAULT_MAX_MESSAGE_LENGTH,
+    ) -> None:
+        """capacity must be a power of two, name is chosen when None"""
+        if capacity < CACHE_LINE or capacity & (capacity - 1):
+            raise ValueError("capacity must be a power of two of at least 64")
+
+        if recordLength(maxMessageLength) > capacity // 2:
+            raise ValueError("maxMessageLength must fit in half the ring")
+
+        sharedMemory = shared_memory.SharedMemory(
+            name, create=True, size=ringOffset(maxConsumers) + capacity
+        )
+        CONFIG.pack_into(sharedMemory.buf, 0, capacity, maxConsumers)
+        COUNTER.pack_into(sharedMemory.buf, PUBLISHED_OFFSET, 0)
+        for slot in range(maxConsumers):
+            COUNTER.pack_into(
+                sharedMemory.buf, CONSUMERS_OFFSET + slot * CACHE_LINE, INACTIVE
+            )
+
+        super().__init__(schemaCodec, sharedMemory)
+        self.maxMessageLength = maxMessageLength
+        # written but not necessarily published
+        self.position = 0
+        self.claimed = None
+        # lowest consumer position seen, refreshed when the ring looks full
+        self.limit = 0
+        # message name -> (encode function, bytes claimed)
+        self.encoders = {}
+
+    def unlink(self) -> None:
+        """destroy the shared memory once every process has closed it"""
+        self.sharedMemory.unlink()
+
+    def consumerLimit(self) -> Optional[int]:
+        """return the position of the slowest consumer, None without any"""
+        positions = [
+            position
+            for position in self.consumers.unpack_from(self.buffer, CONSUMERS_OFFSET)
+            if position != INACTIVE
+        ]
+        return min(positions, default=None)
+
+    def claim(self, length: int) -> Optional[int]:
+        """claim space for a message of at most length bytes
+
+        return offset in buffer to encode the message at, None when the
+        slowest consumer has not read enough of the ring yet
+        """
+        if self.claimed is not None:
+            raise ValueError("the previous claim was not committed")
+
+        size = recordLength(length)
+        if size > self.capacity // 2:
+            # with the padding before it, a larger record may never fit
+            raise ValueError(f"message of {length} bytes does not fit in half the ring")
+
+        position = self.position
+        index = position & self.mask
+        padding = self.capacity - index if size > self.capacity - index else 0
+        end = position + padding + size
+        if end - self.limit > self.capacity:
+            limit = self.consumerLimit()
+            if limit is not None:
+                self.limit = limit
+                if end - limit > self.capacity:
+                    return None
+
+        if padding:
+            RECORD_HEADER.pack_into(
+                self.buffer,
+                self.ring + index,
+                padding - RECORD_HEADER.size,
+                RECORD_PADDING,
+            )
+            position += padding
+            index = 0
+
+        self.claimed = (position, length)
+        return self.ring + index + RECORD_HEADER.size
+
+    def commit(self, length: int) -> None:
+        """publish the claimed message, length is the number of bytes written"""
+        position, claimedLength = self.claimed
+        self.claimed = None
+        if length > claimedLength:
+            # nothing is published, the space is claimed again next time
+            raise ValueError(
+                f"message of {length} bytes overran the {claimedLength} bytes claimed"
+            )
+
+        RECORD_HEADER.pack_into(
+            self.buffer, self.ring + (position & self.mask), length, RECORD_MESSAGE
+        )
+        self.position = position + recordLength(length)
+        COUNTER.pack_into(self.buffer, PUBLISHED_OFFSET, self.position)
+
+    def offer(self, name: str, values: dict) -> bool:
+        """encode and publish message name, False when the ring is full"""
+        entry = self.encoders.get(name)
+        if entry is None:
+            codec = self.schemaCodec[name]
+            if codec.layout.groups or codec.layout.varData:
+                length = self.maxMessageLength
+            else:
+                length = self.schemaCodec.headerLength + codec.blockLength
+
+            entry = self.encoders[name] = (codec.encode, length)
+
+        encode, length = entry
+        offset = self.claim(length)
+        if offset is None:
+            return False
+
+        try:
+            # a message longer than the claim fails before it reaches bytes
+            # consumers have not read
+            with self.buffer[offset : offset + length] as view:
+                written = encode(view, 0, values)
+        except BaseException:
+            # nothing was published, the space is claimed again next time
+            self.claimed = None
+            raise
+
+        self.commit(written)
+        return True
+
+
+class RingConsumer(RingBuffer):
+    """attach to a ring buffer and read its messages in place
+
+    slot numbers consumer positions, each attached consumer needs its own
+    slot below maxConsumers. A consumer starts with the next message
+    published after it attached.
+    """
+
+    def __init__(self, schemaCodec, name: str, slot: int) -> None:
+        if sys.version_info >= (3, 13):
+            # the creating producer owns the shared memory
+            sharedMemory = shared_memory.SharedMemory(name, track=False)
+        else:
+            sharedMemory = shared_memory.SharedMemory(name)
+
+        super().__init__(schemaCodec, sharedMemory)
+        self.slot = self.slotOffset(slot)
+        if COUNTER.unpack_from(self.buffer, self.slot)[0] != INACTIVE:
+            sharedMemory.close()
+            raise ValueError(f"consumer slot {slot} is in use")
+
+        self.position = self.published()
+        COUNTER.pack_into(self.buffer, self.slot, self.position)
+
+    def close(self) -> None:
+        """release the slot and detach"""
+        if self.buffer is not None:
+            COUNTER.pack_into(self.buffer, self.slot, INACTIVE)
+
+        super().close()
+
+    def poll(self, flyweights: bool = True) -> Iterator:
+        """yield messages published since the last poll
+
+        flyweights are yielded by default, else (templateId, values) as
+        returned by SchemaCodec.decode. A message is valid until the next
+        one is requested or the iteration stops, its space is then released
+        to the producer.
+        """
+        buffer = self.buffer
+        ring = self.ring
+        mask = self.mask
+        slot = self.slot
+        decode = self.schemaCodec.wrap if flyweights else self.schemaCodec.decode
+        published = self.published()
+        position = self.position
+        try:
+            while position < published:
+                index = ring + (position & mask)
+                length, kind = RECORD_HEADER.unpack_from(buffer, index)
+                position += recordLength(length)
+                if kind == RECORD_MESSAGE:
+                    yield decode(buffer, index + RECORD_HEADER.size)
+
+                self.position = position
+                COUNTER.pack_into(buffer, slot, position)
+        finally:
+            # a caller breaking out of the loop is done with its message
+            if self.buffer is not None and position != self.position:
+                self.position = position
+                COUNTER.pack_into(buffer, slot, position)
@@ -0,0 +1,295 @@
+"""source.py - helpers shared by the python source generators"""
+import keyword
+import struct
+from typing import Dict, List, Optional
+
+from pysbe.schema.constants import (
+    BYTE_ORDER,
+    BYTE_ORDER_STRUCT_PREFIX_MAP,
+    PRIMITIVE_TYPE_NULL_VALUE_MAP,
+    PRIMITIVE_TYPE_STRUCT_FORMAT_MAP,
+    TYPE_PRIMITIVE_TYPE,
+)
+from pysbe.schema.layout import BlockLayout, ElementLayout
+from pysbe.schema.types import Type
+
+
+def pythonName(name: str) -> str:
+    """return name usable as a python identifier"""
+    if keyword.iskeyword(name):
+        return f"{name}_"
+
+    return name
+
+
+def structPrefix(byteOrder: Optional[BYTE_ORDER]) -> str:
+    """return struct byte order prefix, SBE defaults to littleEndian"""
+    return BYTE_ORDER_STRUCT_PREFIX_MAP[byteOrder or BYTE_ORDER.LITTLE_ENDIAN]
+
+
+def leafFormat(leaf: ElementLayout):
+    """return struct format code and number of unpacked values for a leaf"""
+    code = PRIMITIVE_TYPE_STRUCT_FORMAT_MAP[leaf.primitiveType]
+    if leaf.length == 1:
+        return code, 1
+
+    if leaf.primitiveType == TYPE_PRIMITIVE_TYPE.CHAR:
+        return f"{leaf.length}s", 1
+
+    return f"{leaf.length}{code}", leaf.length
+
+
+def primitiveValue(text: str, primitiveType: TYPE_PRIMITIVE_TYPE):
+    """convert schema text to the python value of a primitive type"""
+    if primitiveType == TYPE_PRIMITIVE_TYPE.CHAR:
+        return text.encode("latin-1")
+
+    if primitiveType in (TYPE_PRIMITIVE_TYPE.FLOAT, TYPE_PRIMITIVE_TYPE.DOUBLE):
+        return float(text)
+
+    return int(text)
+
+
+def constantValue(element: ElementLayout):
+    """convert constValue text to the value a decoder returns"""
+    if element.constValue is None:
+        return None
+
+    return primitiveValue(element.constValue, element.primitiveType)
+
+
+def nullValue(element: ElementLayout):
+    """return the value representing null for an optional leaf"""
+    if isinstance(element.sbeType, Type) and element.sbeType.nullValue:
+        return primitiveValue(element.sbeType.nullValue, element.primitiveType)
+
+    if element.primitiveType == TYPE_PRIMITIVE_TYPE.CHAR and element.length > 1:
+        return b""
+
+    return PRIMITIVE_TYPE_NULL_VALUE_MAP[element.primitiveType]
+
+
+def inVersion(element, actingVersion: Optional[int]) -> bool:
+    """return whether messages of actingVersion encode element
+
+    an actingVersion of None stands for the schema version itself
+    """
+    return actingVersion is None or (element.sinceVersion or 0) <= actingVersion
+
+
+def newestVersion(block: BlockLayout) -> int:
+    """return the highest sinceVersion of anything encoded in block"""
+    versions = [block.sinceVersion or 0]
+    versions.extend(
+        leaf.sinceVersion or 0 for field in block.fields for leaf in field.leaves()
+    )
+    versions.extend(data.sinceVersion or 0 for data in block.varData)
+    versions.extend(newestVersion(group) for group in block.groups)
+    return max(versions)
+
+
+def valueLiteral(value) -> str:
+    """return python source for a decoded value, nan has no literal"""
+    if isinstance(value, float) and value != value:
+        return 'float("nan")'
+
+    return repr(value)
+
+
+def absentSource(element: ElementLayout) -> str:
+    """return python expression for a field not encoded in a message version
+
+    constants keep their value, everything else decodes as its null value
+    """
+    if element.isConstant:
+        return repr(constantValue(element))
+
+    if element.isComposite:
+        items = ", ".join(
+            f"{member.name!r}: {absentSource(member)}" for member in element.members
+        )
+        return f"{{{items}}}"
+
+    value = nullValue(element)
+    if element.length > 1 and element.primitiveType != TYPE_PRIMITIVE_TYPE.CHAR:
+        return f"({valueLiteral(value)},) * {element.length}"
+
+    return valueLiteral(value)
+
+
+def offsetSource(base: str, offset: int) -> str:
+    """return python expression for base + offset"""
+    if offset:
+        return f"{base} + {offset}"
+
+    return base
+
+
+class BlockFormat:
+    """single struct format covering every fixed field of a block"""
+
+    def __init__(
+        self,
+        fields: List[ElementLayout],
+        blockLength: int,
+        byteOrder,
+        actingVersion: Optional[int] = None,
+    ) -> None:
+        """only leaves encoded by messages of actingVersion are unpacked"""
+        codes = [structPrefix(byteOrder)]
+        # maps id(leaf) to (index into unpacked tuple, number of values)
+        self.index = {}
+        self.actingVersion = actingVersion
+        self.leaves = sorted(
+            (
+                leaf
+                for field in fields
+                for leaf in field.leaves()
+                if leaf.size and inVersion(leaf, actingVersion)
+            ),
+            key=lambda leaf: leaf.offset,
+        )
+        position = 0
+        count = 0
+        for leaf in self.leaves:
+            if leaf.offset > position:
+                codes.append(f"{leaf.offset - position}x")
+
+            code, values = leafFormat(leaf)
+            codes.append(code)
+            self.index[id(leaf)] = (count, values)
+            count += values
+            position = leaf.offset + leaf.size
+
+        if blockLength > position:
+            codes.append(f"{blockLength - position}x")
+
+        self.format = "".join(codes)
+        self.valueCount = count
+
+    def valueSource(self, element: ElementLayout, values: str = "v") -> str:
+        """return python expression rebuilding element from unpacked values"""
+        if element.isConstant:
+            return repr(constantValue(element))
+
+        if element.isComposite:
+            items = ", ".join(
+                f"{member.name!r}: {self.valueSource(member, values)}"
+                for member in element.members
+            )
+            return f"{{{items}}}"
+
+        if not inVersion(element, self.actingVersion):
+            return absentSource(element)
+
+        if id(element) not in self.index:
+            return "None"
+
+        index, count = self.index[id(element)]
+        if count == 1:
+            return f"{values}[{index}]"
+
+        return f"{values}[{index}:{index + count}]"
+
+    def dictSource(
+        self, fields: List[ElementLayout], values: str = "v", extra=()
+    ) -> str:
+        """return python dict display rebuilding fields from unpacked values
+
+        extra lists additional (name, expression) items
+        """
+        items = [(field.name, self.valueSource(field, values)) for field in fields]
+        lines = "".join(
+            f"        {name!r}: {expression},\n"
+            for name, expression in items + list(extra)
+        )
+        return f"{{\n{lines}    }}"
+
+
+def blockStructName(layout: BlockLayout, prefix: str = "") -> str:
+    """return module level name of the struct for a block"""
+    return f"_{prefix}{pythonName(layout.name)}_block"
+
+
+class SourceBuilder:
+    """accumulate generated python source for one or more message codecs"""
+
+    def __init__(self, byteOrder) -> None:
+        self.byteOrder = byteOrder
+        self.prefix = structPrefix(byteOrder)
+        # module level struct definitions, name -> full format
+        self.structs: Dict[str, str] = {}
+        # bound struct methods, name -> (struct name, method name)
+        self.methods: Dict[str, tuple] = {}
+        self.usesNan = False
+        self.chunks: List[str] = []
+        # generated class name for each composite, keyed by identity
+        self.compositeNames: Dict[tuple, str] = {}
+        self.classNames = set()
+
+    def struct(self, format: str, name: Optional[str] = None) -> str:
+        """return module level name of a struct.Struct for format"""
+        if name is None:
+            name = f"_s_{format}"
+
+        full = format if format[:1] in "<>" else self.prefix + format
+        existing = self.structs.setdefault(name, full)
+        if existing != full:
+            raise ValueError(f"struct name {name} reused for different format")
+
+        return name
+
+    def unpacker(self, format: str) -> str:
+        """return module level name of the bound unpack_from for format"""
+        name = f"_unpack_{format}"
+        self.methods[name] = (self.struct(format), "unpack_from")
+        return name
+
+    def packer(self, format: str) -> str:
+        """return module level name of the bound pack_into for format"""
+        name = f"_pack_{format}"
+        self.methods[name] = (self.struct(format), "pack_into")
+        return name
+
+    def literal(self, value) -> str:
+        """return python source for a constant value"""
+        if isinstance(value, float) and value != value:
+            self.usesNan = True
+            return "_NAN"
+
+        return repr(value)
+
+    def className(self, name: str) -> str:
+        """reserve and return a unique generated class name"""
+        candidate = name
+        suffix = 1
+        while candidate in self.classNames:
+            suffix += 1
+            candidate = f"{name}{suffix}"
+
+        self.classNames.add(candidate)
+        return candidate
+
+    def add(self, chunk: str) -> None:
+        """append generated source"""
+        self.chunks.append(chunk)
+
+    def source(self) -> str:
+        """return complete generated source"""
+        lines = ['_NAN = float("nan")\n'] if self.usesNan else []
+        lines.extend(
+            f"{name} = struct.Struct({format!r})\n"
+            for name, format in self.structs.items()
+        )
+        lines.extend(
+            f"{name} = {structName}.{method}\n"
+            for name, (structName, method) in self.methods.items()
+        )
+        return "".join(lines) + "".join(f"\n\n{chunk}" for chunk in self.chunks)
+
+
+def executeCode(code, filename: str) -> Dict[str, object]:
+    """execute compiled generated source, return its namespace"""
+    namespace = {"struct": struct, "__name__": filename}
+    exec(code, namespace)
+    return namespace
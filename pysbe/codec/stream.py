@@ -0,0 +1,141 @@
+"""stream.py - decode messages from a byte stream arriving in chunks
+
+A StreamDecoder frames back to back messages of one schema from chunks of
+any size, e.g. TCP segments or file reads. Chunks are copied into a single
+bytearray reused for the life of the decoder, messages are decoded in
+place from it. A message is complete once the end found from the header
+blockLength and the walk over its groups and data lies inside the bytes
+received so far, incomplete messages stay buffered until more bytes
+arrive.
+
+When the free space at the end of the buffer runs out the unread bytes,
+at most a partial message plus the bytes not decoded yet, are moved to
+the front. The buffer only grows when a single message does not fit, so
+the work per byte stays constant whatever the chunk sizes.
+
+Decoded data values and flyweights refer to the buffer, they are valid
+until the decoder is next fed or read from.
+"""
+import struct
+from typing import Iterator
+
+# initial buffer size, grown when a single message does not fit
+DEFAULT_CAPACITY = 65536
+
+# bytes requested from a stream by each readinto
+DEFAULT_CHUNK_SIZE = 16384
+
+
+def copyData(values: dict) -> dict:
+    """return decoded values with data slices of a buffer copied to bytes"""
+    return {
+        name: bytes(value) if isinstance(value, memoryview) else value
+        for name, value in values.items()
+    }
+
+
+class StreamDecoder:
+    """frame and decode messages from chunks of a byte stream"""
+
+    def __init__(
+        self, schemaCodec, capacity: int = DEFAULT_CAPACITY, flyweights: bool = False
+    ) -> None:
+        """flyweights yields reused flyweight decoders instead of dicts"""
+        if schemaCodec.headerStruct is None:
+            raise ValueError("messageSchema does not define a message header")
+
+        if capacity < schemaCodec.headerLength:
+            raise ValueError("capacity must hold at least a message header")
+
+        self.schemaCodec = schemaCodec
+        self.flyweights = flyweights
+        self.buffer = bytearray(capacity)
+        # unread bytes are buffer[start:end]
+        self.start = 0
+        self.end = 0
+
+    @property
+    def pending(self) -> int:
+        """number of bytes received but not decoded yet"""
+        return self.end - self.start
+
+    def reserve(self, size: int) -> memoryview:
+        """return a view of at least size free bytes after the unread bytes"""
+        if len(self.buffer) - self.end < size:
+            pending = self.end - self.start
+            if pending + size > len(self.buffer):
+                capacity = max(2 * len(self.buffer), pending + size)
+                buffer = bytearray(capacity)
+                buffer[:pending] = memoryview(self.buffer)[self.start : self.end]
+                self.buffer = buffer
+            elif pending:
+                view = memoryview(self.buffer)
+                view[:pending] = view[self.start : self.end]
+
+            self.start, self.end = 0, pending
+
+        return memoryview(self.buffer)[self.end :]
+
+    def feed(self, chunk) -> Iterator:
+        """buffer chunk, return an iterator over the messages now complete
+
+        the chunk is copied before returning, messages not consumed from
+        the iterator are returned again by the next one
+        """
+        size = len(chunk)
+        with self.reserve(size) as view:
+            view[:size] = chunk
+
+        self.end += size
+        return self.messages()
+
+    def messages(self) -> Iterator:
+        """yield complete buffered messages
+
+        each message is a (templateId, values) tuple as returned by
+        SchemaCodec.decode, or its flyweight when flyweights is set
+        """
+        schemaCodec = self.schemaCodec
+        headerLength = schemaCodec.headerLength
+        messageLength = schemaCodec.messageLength
+        decode = schemaCodec.wrap if self.flyweights else schemaCodec.decode
+        while self.end - self.start >= headerLength:
+            start = self.start
+            try:
+                length = messageLength(self.buffer, start)
+            except struct.error:
+                # group or data headers past the end of the buffer
+                break
+
+            # reads past self.end see stale bytes, but then the end found
+            # from them lies past self.end as well
+            if start + length > self.end:
+                break
+
+            self.start = start + length
+            if self.start == self.end:
+                # nothing left to move when the next chunk arrives
+                self.start = self.end = 0
+
+            yield decode(self.buffer, start)
+
+    def readFrom(self, stream, chunkSize: int = DEFAULT_CHUNK_SIZE) -> Iterator:
+        """yield every message read from a binary file object
+
+        bytes are read straight into the buffer with readinto, a socket
+        can be read through socket.makefile("rb")
+        """
+        while True:
+            with self.reserve(chunkSize) as view:
+                count = stream.readinto(view)
+
+            if not count:
+                break
+
+            self.end += count
+            yield from self.messages()
+
+        if self.pending:
+            raise ValueError(
+                f"stream ended inside a message, {self.pending} bytes left over"
+            )
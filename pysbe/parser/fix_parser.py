@@ -2,6 +2,7 @@
     by xsd https://github.com/FIXTradingCommunity/
     fix-simple-binary-encoding/blob/master/v1-0-STANDARD/resources/sbe.xsd
 """
+import functools
 import xml.etree.ElementTree as etree
 
 from pysbe.schema.constants import (
@@ -9,11 +10,13 @@ from pysbe.schema.constants import (
     STRING_ENUM_MAP,
     VALID_TYPE_PRIMITIVE_TYPE,
     TYPE_PRIMITIVE_TYPE_MAP,
+    PRESENCE,
     PRESENCE_MAP,
     QUALIFIED_NAME_RE,
     SYMBOLIC_NAME_RE,
 )
 from pysbe.schema.builder import createMessageSchema
+from pysbe.schema.layout import computeLayout, computeMessageLayout
 from pysbe.schema.types import (
     createType,
     createComposite,
@@ -27,11 +30,17 @@ from pysbe.schema.types import (
     createField,
     FieldCollection,
     createGroup,
+    createData,
 )
 from pysbe.schema.exceptions import UnknownReference
+from pysbe.parser.ir_parser import IrParser
 
 SBE_NS = "http://fixprotocol.io/2016/sbe"
 
+MESSAGE_SCHEMA_TAG = f"{{{SBE_NS}}}messageSchema"
+
+MESSAGE_TAG = f"{{{SBE_NS}}}message"
+
 SEMANTIC_ATTRIBUTES = {
     "semanticType": {"type": str, "use": "optional"},
     "description": {"type": str, "use": "optional"},
@@ -79,6 +88,11 @@ GROUP_ATTRIBUTES = {
     "dimensionType": {"type": str, "pattern": SYMBOLIC_NAME_RE, "use": "optional"},
 }
 
+DATA_ATTRIBUTES = {
+    "data_id": {"type": int, "attribute_name": "id"},
+    "data_type": {"type": str, "pattern": SYMBOLIC_NAME_RE, "attribute_name": "type"},
+}
+
 ALL_ATTRIBUTES_MAP = {
     **SEMANTIC_ATTRIBUTES,
     **VERSION_ATTRIBUTES,
@@ -90,6 +104,7 @@ ALL_ATTRIBUTES_MAP = {
     **MESSAGE_ATTRIBUTES,
     **FIELD_ATTRIBUTES,
     **GROUP_ATTRIBUTES,
+    **DATA_ATTRIBUTES,
 }
 
 TYPE_ATTRIBUTES_LIST = list(SEMANTIC_ATTRIBUTES) + list(VERSION_ATTRIBUTES) + list(
@@ -162,77 +177,180 @@ GROUP_ATTRIBUTES_LIST = (
     "dimensionType",
 )
 
+DATA_ATTRIBUTES_LIST = (
+    "name",
+    "data_id",
+    "data_type",
+    "description",
+    "semanticType",
+    "sinceVersion",
+    "deprecated",
+)
+
 MISSING = object()
 
 
+def missingAttribute(element, attribute_name):
+    return ValueError(
+        f"element {element.tag} missing required attribute {attribute_name}"
+    )
+
+
+def invalidValue(element, value, attribute_name):
+    return ValueError(
+        f"element {element.tag} invalid value "
+        f"{repr(value)} for attribute {attribute_name}"
+    )
+
+
+def belowMinimum(element, value, attribute_name, minimumValue):
+    return ValueError(
+        f"element {element.tag} invalid value {repr(value)}"
+        f" for attribute {attribute_name},"
+        "less than allowed minimum "
+        f"{repr(minimumValue)}"
+    )
+
+
+def patternMismatch(element, value, attribute_name, pattern):
+    return ValueError(
+        f"element {element.tag} invalid value {repr(value)} "
+        f"for attribute {attribute_name},"
+        "does not match expected pattern "
+        f"{repr(pattern)}"
+    )
+
+
+def notInMap(element, value, attribute_name, value_map):
+    return ValueError(
+        f"element {element.tag} invalid value {repr(value)} "
+        f"for attribute {attribute_name}"
+        f", must be one of {repr(value_map.keys())}"
+    )
+
+
+def attributeLines(index: int, attribute: str, namespace: dict) -> list:
+    """return validator source lines for one attribute, value is set"""
+    attrib_info = ALL_ATTRIBUTES_MAP[attribute]
+    attribute_name = attrib_info.get("attribute_name", attribute)
+    lines = []
+    convert = attrib_info.get("type")
+    default_value = attrib_info.get("default", MISSING)
+    # xml attribute values are already strings
+    if convert and not (
+        convert is str
+        and (default_value is MISSING or isinstance(default_value, str))
+    ):
+        namespace[f"convert_{index}"] = convert
+        lines.extend(
+            [
+                "try:",
+                f"    value = convert_{index}(value)",
+                "except ValueError as exc:",
+                f"    raise invalidValue(element, value, {attribute_name!r})"
+                " from exc",
+            ]
+        )
+
+    # a zero minimum is never enforced
+    if attrib_info.get("minimumValue"):
+        minimumValue = attrib_info["minimumValue"]
+        lines.extend(
+            [
+                f"if value < {minimumValue!r}:",
+                "    raise belowMinimum(",
+                f"        element, value, {attribute_name!r}, {minimumValue!r}",
+                "    )",
+            ]
+        )
+
+    if attrib_info.get("pattern"):
+        namespace[f"pattern_{index}"] = attrib_info["pattern"]
+        lines.extend(
+            [
+                f"if not pattern_{index}.match(value):",
+                "    raise patternMismatch(",
+                f"        element, value, {attribute_name!r}, pattern_{index}",
+                "    )",
+            ]
+        )
+
+    if attrib_info.get("map"):
+        namespace[f"map_{index}"] = attrib_info["map"]
+        lines.extend(
+            [
+                "try:",
+                f"    value = map_{index}[value]",
+                "except (KeyError, IndexError) as exc:",
+                "    raise notInMap(",
+                f"        element, value, {attribute_name!r}, map_{index}",
+                "    ) from exc",
+            ]
+        )
+
+    result = attrib_info.get("rename", attribute)
+    lines.append(f"result[{result!r}] = value")
+    return lines
+
+
+@functools.lru_cache(maxsize=None)
+def compileAttributes(attributes: tuple):
+    """compile the ALL_ATTRIBUTES_MAP specs of attributes once
+
+    return a function validating the attributes of an element, only the
+    checks each spec asks for are generated
+    """
+    namespace = {
+        "MISSING": MISSING,
+        "missingAttribute": missingAttribute,
+        "invalidValue": invalidValue,
+        "belowMinimum": belowMinimum,
+        "patternMismatch": patternMismatch,
+        "notInMap": notInMap,
+    }
+    lines = [
+        "def validate(element):",
+        "    attrib = element.attrib",
+        "    result = {}",
+    ]
+    for index, attribute in enumerate(attributes):
+        attrib_info = ALL_ATTRIBUTES_MAP[attribute]
+        attribute_name = attrib_info.get("attribute_name", attribute)
+        body = attributeLines(index, attribute, namespace)
+        default_value = attrib_info.get("default", MISSING)
+        if default_value is MISSING:
+            lines.append(f"    value = attrib.get({attribute_name!r}, MISSING)")
+        else:
+            namespace[f"default_{index}"] = default_value
+            lines.append(
+                f"    value = attrib.get({attribute_name!r}, default_{index})"
+            )
+
+        if attrib_info.get("use") == "optional":
+            lines.append('    if value is not MISSING and value != "":')
+            lines.extend(f"        {line}" for line in body)
+        else:
+            lines.extend(
+                [
+                    '    if value is MISSING or value == "":',
+                    f"        raise missingAttribute(element, {attribute_name!r})",
+                ]
+            )
+            lines.extend(f"    {line}" for line in body)
+
+    lines.append("    return result")
+    source = "\n".join(lines) + "\n"
+    exec(compile(source, f"<pysbe attributes {attributes}>", "exec"), namespace)
+    return namespace["validate"]
+
+
 class BaseParser:
     """contains shared functionality"""
     NS = {"sbe": SBE_NS}
 
     def parse_common_attributes(self, element, attributes):
         """parse and return dict of common attributes"""
-        result_attributes = {}
-        for attribute in attributes:
-            attrib_info = ALL_ATTRIBUTES_MAP[attribute]
-            if attrib_info.get("default", MISSING) is not MISSING:
-                default_value = attrib_info["default"]
-            else:
-                default_value = MISSING
-            attribute_name = attrib_info.get("attribute_name", attribute)
-            value = element.attrib.get(attribute_name, default_value)
-            if value is MISSING or value == "":
-                if attrib_info.get("use") == "optional":
-                    continue
-
-                else:
-                    raise ValueError(
-                        f"element {element.tag} missing required "
-                        f"attribute {attribute_name}"
-                    )
-
-            if attrib_info.get("type"):
-                try:
-                    value = attrib_info["type"](value)
-                except ValueError as exc:
-                    raise ValueError(
-                        f"element {element.tag} invalid value "
-                        f"{repr(value)} for attribute {attribute_name}"
-                    ) from exc
-
-            if attrib_info.get("minimumValue"):
-                if value < attrib_info["minimumValue"]:
-                    raise ValueError(
-                        f"element {element.tag} invalid value {repr(value)}"
-                        f" for attribute {attribute_name},"
-                        "less than allowed minimum "
-                        f"{repr(attrib_info['minimumValue'])}"
-                    )
-
-            if attrib_info.get("pattern"):
-                if not attrib_info["pattern"].match(value):
-                    raise ValueError(
-                        f"element {element.tag} invalid value {repr(value)} "
-                        f"for attribute {attribute_name},"
-                        "does not match expected pattern "
-                        f"{repr(attrib_info['pattern'])}"
-                    )
-
-            if attrib_info.get("map"):
-                try:
-                    value = attrib_info["map"][value]
-                except (KeyError, IndexError) as exc:
-                    raise ValueError(
-                        f"element {element.tag} invalid value {repr(value)} "
-                        f"for attribute {attribute_name}"
-                        f", must be one of {repr(attrib_info['map'].keys())}"
-                    ) from exc
-
-            if attrib_info.get("rename"):
-                attribute = attrib_info["rename"]
-
-            result_attributes[attribute] = value
-
-        return result_attributes
+        return compileAttributes(tuple(attributes))(element)
 
 
 class SBESpecParser(BaseParser):
@@ -241,32 +359,92 @@ class SBESpecParser(BaseParser):
     def __init__(self):
         pass
 
-    def parseFile(self, file_or_object):
-        """parse a file"""
+    def parseFile(
+        self, file_or_object, streaming: bool = False, lazy: bool = False
+    ):
+        """parse a file, streaming discards elements once they are built
+
+        lazy only indexes messages by name and id, see processSchema
+        """
+        if streaming:
+            return self.iterParseFile(file_or_object, lazy=lazy)
+
         root = etree.parse(file_or_object)
-        element_name = "{%s}messageSchema" % SBE_NS
         # for some reason root.find('sbe:messageSchema') returns None
         # work around that
         messageSchema_element = root.getroot()
-        if messageSchema_element.tag != element_name:
+        self.checkRootElement(messageSchema_element)
+        return self.processSchema(messageSchema_element, lazy=lazy)
+
+    def iterParseFile(self, file_or_object, lazy: bool = False):
+        """parse a file incrementally with iterparse
+
+        each type and message is built when its end tag arrives and then
+        removed from the tree, peak memory follows the largest single type
+        or message instead of the whole document. Elements are processed in
+        document order, types must precede the messages using them as the
+        xsd requires.
+        """
+        types_parser = TypesParser()
+        message_parser = MessageParser()
+        messageSchema = None
+        # open elements from the root down to the current element
+        stack = []
+        for event, element in etree.iterparse(
+            file_or_object, events=("start", "end")
+        ):
+            if event == "start":
+                if not stack:
+                    self.checkRootElement(element)
+                    messageSchema = self.createSchema(element)
+
+                stack.append(element)
+                continue
+
+            stack.pop()
+            depth = len(stack)
+            if depth == 2 and stack[1].tag == "types":
+                types_parser.parse_types_child(messageSchema, element)
+            elif depth == 1 and element.tag == MESSAGE_TAG:
+                if lazy:
+                    message_parser.index_message(messageSchema, element)
+                else:
+                    message_parser.parse_message(messageSchema, element)
+            elif depth != 1:
+                # part of an enclosing type or message, built with it
+                continue
+
+            stack[-1].remove(element)
+
+        computeLayout(messageSchema)
+        return messageSchema
+
+    def parseIrFile(self, file_or_object):
+        """parse an sbe-tool intermediate representation (.sbeir) file"""
+        return IrParser().parseFile(file_or_object)
+
+    @staticmethod
+    def checkRootElement(messageSchema_element):
+        """ensure the document element is sbe:messageSchema"""
+        if messageSchema_element.tag != MESSAGE_SCHEMA_TAG:
             raise ValueError(
                 f"root element is not sbe:messageSchema,"
                 " found {repr(messageSchema_element)} instead"
             )
 
-        return self.processSchema(messageSchema_element)
-
-    def processSchema(self, messageSchema_element):
-        """process xml elements beginning with root messageSchema_element"""
+    def createSchema(self, messageSchema_element):
+        """create an empty messageSchema from the root element attributes"""
         attrib = messageSchema_element.attrib
         version = parse_version(attrib.get("version"))
+        schema_id = parse_optionalInt(attrib.get("id"))
         byteOrder = parse_byteOrder(attrib.get("byteOrder") or "littleEndian")
         package = parse_optionalString(attrib.get("package"))
         semanticVersion = parse_optionalString(attrib.get("semanticVersion"))
         description = parse_optionalString(attrib.get("description"))
         headerType = parse_optionalString(attrib.get("headerType") or "messageHeader")
-        messageSchema = createMessageSchema(
+        return createMessageSchema(
             version=version,
+            schema_id=schema_id,
             byteOrder=byteOrder,
             package=package,
             semanticVersion=semanticVersion,
@@ -274,6 +452,15 @@ class SBESpecParser(BaseParser):
             headerType=headerType,
         )
 
+    def processSchema(self, messageSchema_element, lazy: bool = False):
+        """process xml elements beginning with root messageSchema_element
+
+        with lazy, types are parsed but each message is only registered by
+        name and id, its fields are parsed, validated and laid out the first
+        time it is requested from the messageSchema
+        """
+        messageSchema = self.createSchema(messageSchema_element)
+
         types_elements = messageSchema_element.findall("types")
         types_parser = TypesParser()
         for element in types_elements:
@@ -284,8 +471,12 @@ class SBESpecParser(BaseParser):
         )
         message_parser = MessageParser()
         for element in message_elements:
-            message_parser.parse_message(messageSchema, element)
+            if lazy:
+                message_parser.index_message(messageSchema, element)
+            else:
+                message_parser.parse_message(messageSchema, element)
 
+        computeLayout(messageSchema)
         return messageSchema
 
 
@@ -297,24 +488,26 @@ class TypesParser(BaseParser):
     def parse_types(self, messageSchema, element):
         """parse type, can be repeated"""
         for child_element in element:
-            if child_element.tag not in self.VALID_TYPES_ELEMENTS:
-                raise ValueError(
-                    f"invalid types child element {repr(child_element.tag)}"
-                )
+            self.parse_types_child(messageSchema, child_element)
 
-            parser = getattr(self, f"parse_types_{child_element.tag}", None)
-            if not parser:
-                raise RuntimeError(
-                    f"unsupported types parser {repr(child_element.tag)}"
-                )
+    def parse_types_child(self, messageSchema, child_element):
+        """parse a single child element of types"""
+        if child_element.tag not in self.VALID_TYPES_ELEMENTS:
+            raise ValueError(f"invalid types child element {repr(child_element.tag)}")
+
+        parser = getattr(self, f"parse_types_{child_element.tag}", None)
+        if not parser:
+            raise RuntimeError(f"unsupported types parser {repr(child_element.tag)}")
 
-            parser(messageSchema, child_element)
+        parser(messageSchema, child_element)
 
     def parse_types_type(self, parent: TypeCollection, element):
         """parse types/type"""
         attributes = self.parse_common_attributes(
             element, attributes=TYPE_ATTRIBUTES_LIST
         )
+        if attributes.get("presence") == PRESENCE.CONSTANT:
+            attributes["constValue"] = (element.text or "").strip()
 
         sbe_type = createType(**attributes)
         parent.addType(sbe_type)
@@ -429,6 +622,30 @@ class MessageParser(BaseParser):
         messageSchema.addMessage(message)
         self.parse_field_children(messageSchema, message, element)
 
+    def index_message(self, messageSchema, element):
+        """register message by name and id, build it when first requested
+
+        the message element is kept serialized, a streaming parse can then
+        free the element and its subtree
+        """
+        attributes = self.parse_common_attributes(
+            element, attributes=MESSAGE_ATTRIBUTES_LIST
+        )
+        messageSchema.addLazyMessage(
+            attributes["name"],
+            attributes["message_id"],
+            functools.partial(
+                self.load_message, messageSchema, etree.tostring(element), attributes
+            ),
+        )
+
+    def load_message(self, messageSchema, source: bytes, attributes):
+        """parse the fields of an indexed message, return it laid out"""
+        message = createMessage(**attributes)
+        self.parse_field_children(messageSchema, message, etree.fromstring(source))
+        computeMessageLayout(messageSchema, message)
+        return message
+
     def parse_field_children(self, messageSchema, parent: FieldCollection, element):
         """parse child elements that fit in a fieldCollection"""
         for child_element in element:
@@ -471,6 +688,18 @@ class MessageParser(BaseParser):
 
         self.parse_field_children(messageSchema, group, element)
 
+    def parse_message_data(
+        self, messageSchema, parent: FieldCollection, element
+    ) -> None:
+        """parse variable length data"""
+        attributes = self.parse_common_attributes(
+            element, attributes=DATA_ATTRIBUTES_LIST
+        )
+
+        data = createData(**attributes)
+        data.validate(messageSchema)
+        parent.addField(data)
+
 
 def parse_byteOrder(byteOrder):
     """convert byteOrder to enum"""
@@ -501,3 +730,11 @@ def parse_optionalString(value):
         return None
 
     return value
+
+
+def parse_optionalInt(value):
+    """parse an optional integer"""
+    if value is None or value == "":
+        return None
+
+    return int(value)
@@ -0,0 +1,936 @@
+"""ir_parser.py - read and write SBE intermediate representation files
+
+sbe-tool serialises a parsed schema as a frame followed by a flat list of
+tokens, both encoded with the sbe-ir schema (schema id 1, version 0,
+littleEndian). Every field carries its resolved offset and size, so an IR
+file loads without xml parsing and validation. Each frame and token is
+preceded by a standard message header, the header blockLength is honoured
+so files written by newer sbe-ir versions with a longer block still load.
+
+Constant, min, max and null values are stored in their binary primitive
+encoding, littleEndian, everything else as UTF-8 text.
+
+usage:
+
+    messageSchema = IrParser().parseFile("schema.sbeir")
+    writeIrFile(messageSchema, "schema.sbeir")
+"""
+import enum
+import struct
+from typing import List, Optional
+
+from pysbe.schema.builder import createMessageSchema
+from pysbe.schema.constants import (
+    BYTE_ORDER,
+    PRESENCE,
+    PRIMITIVE_TYPE_LIST,
+    PRIMITIVE_TYPE_SIZE_MAP,
+    PRIMITIVE_TYPE_STRUCT_FORMAT_MAP,
+    TYPE_PRIMITIVE_TYPE,
+    TYPE_PRIMITIVE_TYPE_MAP,
+)
+from pysbe.schema.layout import ElementLayout, computeLayout
+from pysbe.schema.types import (
+    Composite,
+    Data,
+    Enum,
+    Group,
+    PrimitiveType,
+    Set,
+    createChoice,
+    createComposite,
+    createData,
+    createEnum,
+    createField,
+    createGroup,
+    createMessage,
+    createRef,
+    createSet,
+    createType,
+    createValidValue,
+)
+
+SIGNAL = enum.Enum(
+    "SIGNAL",
+    {
+        "BEGIN_MESSAGE": 1,
+        "END_MESSAGE": 2,
+        "BEGIN_COMPOSITE": 3,
+        "END_COMPOSITE": 4,
+        "BEGIN_FIELD": 5,
+        "END_FIELD": 6,
+        "BEGIN_GROUP": 7,
+        "END_GROUP": 8,
+        "BEGIN_ENUM": 9,
+        "VALID_VALUE": 10,
+        "END_ENUM": 11,
+        "BEGIN_SET": 12,
+        "CHOICE": 13,
+        "END_SET": 14,
+        "BEGIN_VAR_DATA": 15,
+        "END_VAR_DATA": 16,
+        "ENCODING": 17,
+    },
+)
+SIGNAL_CODE_MAP = {signal.value: signal for signal in SIGNAL}
+
+# sbe-ir PrimitiveTypeCodec, 0 is NONE for tokens without an encoding
+PRIMITIVE_TYPE_CODE_MAP = {
+    TYPE_PRIMITIVE_TYPE_MAP[name]: code
+    for code, name in enumerate(PRIMITIVE_TYPE_LIST, 1)
+}
+CODE_PRIMITIVE_TYPE_MAP = {
+    code: primitiveType for primitiveType, code in PRIMITIVE_TYPE_CODE_MAP.items()
+}
+
+PRESENCE_CODE_MAP = {PRESENCE.REQUIRED: 0, PRESENCE.OPTIONAL: 1, PRESENCE.CONSTANT: 2}
+CODE_PRESENCE_MAP = {code: presence for presence, code in PRESENCE_CODE_MAP.items()}
+
+BYTE_ORDER_CODE_MAP = {BYTE_ORDER.LITTLE_ENDIAN: 0, BYTE_ORDER.BIG_ENDIAN: 1}
+CODE_BYTE_ORDER_MAP = {
+    code: byteOrder for byteOrder, code in BYTE_ORDER_CODE_MAP.items()
+}
+
+IR_SCHEMA_ID = 1
+IR_SCHEMA_VERSION = 0
+IR_VERSION = 0
+FRAME_TEMPLATE_ID = 1
+TOKEN_TEMPLATE_ID = 2
+
+HEADER_STRUCT = struct.Struct("<4H")
+# irId, irVersion, schemaVersion
+FRAME_STRUCT = struct.Struct("<3i")
+# tokenOffset, tokenSize, fieldId, tokenVersion, componentTokenCount, signal,
+# primitiveType, byteOrder, presence, deprecated
+TOKEN_STRUCT = struct.Struct("<5i4Bi")
+# message header and token block read together
+TOKEN_MESSAGE_STRUCT = struct.Struct(f"<4H{TOKEN_STRUCT.format[1:]}")
+VAR_DATA_LENGTH_STRUCT = struct.Struct("<H")
+
+FRAME_DATA_NAMES = ("packageName", "namespaceName", "semanticVersion")
+# variable length data of a token, in wire order
+TOKEN_DATA_NAMES = (
+    "name",
+    "constValue",
+    "minValue",
+    "maxValue",
+    "nullValue",
+    "characterEncoding",
+    "epoch",
+    "timeUnit",
+    "semanticType",
+    "description",
+    "referencedName",
+)
+# token values held in the binary encoding of the token primitiveType
+TOKEN_VALUE_NAMES = ("constValue", "minValue", "maxValue", "nullValue")
+# zero lengths of the data following each token data field
+EMPTY_DATA_LENGTHS = tuple(
+    bytes(VAR_DATA_LENGTH_STRUCT.size * (len(TOKEN_DATA_NAMES) - index - 1))
+    for index in range(len(TOKEN_DATA_NAMES))
+)
+
+
+class Token:
+    """a single IR token, values are held as schema text"""
+
+    def __init__(
+        self,
+        signal: SIGNAL,
+        name: str,
+        offset: int = 0,
+        size: int = 0,
+        token_id: int = -1,
+        version: int = 0,
+        componentTokenCount: int = 1,
+        primitiveType: Optional[TYPE_PRIMITIVE_TYPE] = None,
+        byteOrder: BYTE_ORDER = BYTE_ORDER.LITTLE_ENDIAN,
+        presence: PRESENCE = PRESENCE.REQUIRED,
+        deprecated: Optional[int] = None,
+        constValue: Optional[str] = None,
+        minValue: Optional[str] = None,
+        maxValue: Optional[str] = None,
+        nullValue: Optional[str] = None,
+        characterEncoding: Optional[str] = None,
+        epoch: Optional[str] = None,
+        timeUnit: Optional[str] = None,
+        semanticType: Optional[str] = None,
+        description: Optional[str] = None,
+        referencedName: Optional[str] = None,
+    ) -> None:
+        self.signal = signal
+        self.name = name
+        self.offset = offset
+        self.size = size
+        self.token_id = token_id
+        self.version = version
+        self.componentTokenCount = componentTokenCount
+        self.primitiveType = primitiveType
+        self.byteOrder = byteOrder
+        self.presence = presence
+        self.deprecated = deprecated
+        self.constValue = constValue
+        self.minValue = minValue
+        self.maxValue = maxValue
+        self.nullValue = nullValue
+        self.characterEncoding = characterEncoding
+        self.epoch = epoch
+        self.timeUnit = timeUnit
+        self.semanticType = semanticType
+        self.description = description
+        self.referencedName = referencedName
+
+    def __repr__(self) -> str:
+        return f"<Token {self.signal.name} {self.name!r}>"
+
+
+def encodeValue(text: Optional[str], primitiveType) -> bytes:
+    """return the littleEndian binary encoding of a schema text value"""
+    if text is None or primitiveType is None:
+        return b""
+
+    if primitiveType == TYPE_PRIMITIVE_TYPE.CHAR:
+        return text.encode("latin-1")
+
+    code = PRIMITIVE_TYPE_STRUCT_FORMAT_MAP[primitiveType]
+    if primitiveType in (TYPE_PRIMITIVE_TYPE.FLOAT, TYPE_PRIMITIVE_TYPE.DOUBLE):
+        return struct.pack(f"<{code}", float(text))
+
+    return struct.pack(f"<{code}", int(text))
+
+
+def decodeValue(value: bytes, primitiveType) -> Optional[str]:
+    """return schema text of a binary encoded value"""
+    if not value or primitiveType is None:
+        return None
+
+    if primitiveType == TYPE_PRIMITIVE_TYPE.CHAR:
+        return value.decode("latin-1")
+
+    code = PRIMITIVE_TYPE_STRUCT_FORMAT_MAP[primitiveType]
+    return str(struct.unpack(f"<{code}", value)[0])
+
+
+def checkHeader(offset: int, templateId: int, actualId: int, schemaId: int) -> None:
+    """raise ValueError unless a header is for the expected sbe-ir message"""
+    if actualId != templateId or schemaId != IR_SCHEMA_ID:
+        raise ValueError(
+            f"expected IR templateId {templateId} at offset {offset},"
+            f" found templateId {actualId} schemaId {schemaId}"
+        )
+
+
+def setComponentTokenCounts(tokens: List[Token]) -> None:
+    """set componentTokenCount of each BEGIN token and its matching END"""
+    starts = []
+    for index, token in enumerate(tokens):
+        signalName = token.signal.name
+        if signalName.startswith("BEGIN_"):
+            starts.append(index)
+        elif signalName.startswith("END_"):
+            start = starts.pop()
+            count = index - start + 1
+            tokens[start].componentTokenCount = token.componentTokenCount = count
+        else:
+            token.componentTokenCount = 1
+
+
+class IrEncoder:
+    """encode a frame and token list with the sbe-ir schema"""
+
+    def __init__(self) -> None:
+        self.chunks = []
+
+    def header(self, blockLength: int, templateId: int) -> None:
+        self.chunks.append(
+            HEADER_STRUCT.pack(blockLength, templateId, IR_SCHEMA_ID, IR_SCHEMA_VERSION)
+        )
+
+    def data(self, value: bytes) -> None:
+        """append length prefixed variable length data"""
+        self.chunks.append(VAR_DATA_LENGTH_STRUCT.pack(len(value)))
+        self.chunks.append(value)
+
+    def text(self, value: Optional[str]) -> None:
+        self.data(value.encode("utf-8") if value else b"")
+
+    def encodeFrame(self, messageSchema) -> None:
+        self.header(FRAME_STRUCT.size, FRAME_TEMPLATE_ID)
+        self.chunks.append(
+            FRAME_STRUCT.pack(
+                messageSchema.schema_id or 0, IR_VERSION, messageSchema.version
+            )
+        )
+        self.text(messageSchema.package)
+        # pysbe has no namespace, keep the field for sbe-tool
+        self.text(None)
+        self.text(messageSchema.semanticVersion)
+
+    def encodeToken(self, token: Token) -> None:
+        self.header(TOKEN_STRUCT.size, TOKEN_TEMPLATE_ID)
+        self.chunks.append(
+            TOKEN_STRUCT.pack(
+                token.offset,
+                token.size,
+                token.token_id,
+                token.version,
+                token.componentTokenCount,
+                token.signal.value,
+                PRIMITIVE_TYPE_CODE_MAP.get(token.primitiveType, 0),
+                BYTE_ORDER_CODE_MAP[token.byteOrder],
+                PRESENCE_CODE_MAP[token.presence],
+                token.deprecated or 0,
+            )
+        )
+        for name in TOKEN_DATA_NAMES:
+            value = getattr(token, name)
+            if name in TOKEN_VALUE_NAMES:
+                self.data(encodeValue(value, token.primitiveType))
+            else:
+                self.text(value)
+
+    def encode(self, messageSchema, tokens: List[Token]) -> bytes:
+        """return IR file content for messageSchema and its tokens"""
+        self.chunks = []
+        self.encodeFrame(messageSchema)
+        for token in tokens:
+            self.encodeToken(token)
+
+        return b"".join(self.chunks)
+
+
+class IrDecoder:
+    """decode the frame and token list of IR file content"""
+
+    def __init__(self, buffer) -> None:
+        self.buffer = bytes(buffer)
+        self.offset = 0
+
+    def header(self, templateId: int) -> int:
+        """read a message header, return the blockLength on the wire"""
+        if self.offset + HEADER_STRUCT.size > len(self.buffer):
+            raise ValueError(f"truncated IR at offset {self.offset}")
+
+        blockLength, actualId, schemaId, _ = HEADER_STRUCT.unpack_from(
+            self.buffer, self.offset
+        )
+        checkHeader(self.offset, templateId, actualId, schemaId)
+        self.offset += HEADER_STRUCT.size
+        return blockLength
+
+    def data(self) -> bytes:
+        """read length prefixed variable length data"""
+        (length,) = VAR_DATA_LENGTH_STRUCT.unpack_from(self.buffer, self.offset)
+        start = self.offset + VAR_DATA_LENGTH_STRUCT.size
+        self.offset = start + length
+        return self.buffer[start : self.offset]
+
+    def decodeFrame(self) -> dict:
+        """return frame values"""
+        blockLength = self.header(FRAME_TEMPLATE_ID)
+        irId, irVersion, schemaVersion = FRAME_STRUCT.unpack_from(
+            self.buffer, self.offset
+        )
+        if irVersion != IR_VERSION:
+            raise ValueError(f"unsupported IR version {irVersion}")
+
+        self.offset += blockLength
+        frame = {"irId": irId, "schemaVersion": schemaVersion}
+        for name in FRAME_DATA_NAMES:
+            frame[name] = self.data().decode("utf-8") or None
+
+        return frame
+
+    def decodeTokens(self) -> List[Token]:
+        """return every token following the frame
+
+        this is the hot loop of loading IR, header and block are read with
+        one unpack and once the remaining data lengths are all zero they
+        are skipped together, most tokens only carry a name
+        """
+        buffer = self.buffer
+        offset = self.offset
+        end = len(buffer)
+        unpack_from = TOKEN_MESSAGE_STRUCT.unpack_from
+        startswith = buffer.startswith
+        headerSize = HEADER_STRUCT.size
+        dataRange = range(len(TOKEN_DATA_NAMES))
+        tokens = []
+        append = tokens.append
+        while offset < end:
+            if offset + TOKEN_MESSAGE_STRUCT.size > end:
+                raise ValueError(f"truncated IR at offset {offset}")
+
+            (
+                blockLength,
+                templateId,
+                schemaId,
+                _,
+                tokenOffset,
+                size,
+                token_id,
+                version,
+                componentTokenCount,
+                signal,
+                primitiveType,
+                byteOrder,
+                presence,
+                deprecated,
+            ) = unpack_from(buffer, offset)
+            if templateId != TOKEN_TEMPLATE_ID or schemaId != IR_SCHEMA_ID:
+                checkHeader(offset, TOKEN_TEMPLATE_ID, templateId, schemaId)
+
+            offset += headerSize + blockLength
+            values = [None] * len(dataRange)
+            for index in dataRange:
+                if offset + 2 > end:
+                    raise ValueError("truncated IR variable length data")
+
+                length = buffer[offset] | buffer[offset + 1] << 8
+                offset += 2
+                if length:
+                    values[index] = buffer[offset : offset + length]
+                    offset += length
+                elif startswith(EMPTY_DATA_LENGTHS[index], offset):
+                    offset += len(EMPTY_DATA_LENGTHS[index])
+                    break
+
+            if offset > end:
+                raise ValueError("truncated IR variable length data")
+
+            (
+                name,
+                constValue,
+                minValue,
+                maxValue,
+                nullValue,
+                characterEncoding,
+                epoch,
+                timeUnit,
+                semanticType,
+                description,
+                referencedName,
+            ) = values
+            primitiveType = CODE_PRIMITIVE_TYPE_MAP.get(primitiveType)
+            append(
+                Token(
+                    SIGNAL_CODE_MAP[signal],
+                    name and name.decode("utf-8"),
+                    tokenOffset,
+                    size,
+                    token_id,
+                    version,
+                    componentTokenCount,
+                    primitiveType,
+                    CODE_BYTE_ORDER_MAP[byteOrder],
+                    CODE_PRESENCE_MAP[presence],
+                    deprecated or None,
+                    constValue and decodeValue(constValue, primitiveType),
+                    minValue and decodeValue(minValue, primitiveType),
+                    maxValue and decodeValue(maxValue, primitiveType),
+                    nullValue and decodeValue(nullValue, primitiveType),
+                    characterEncoding and characterEncoding.decode("utf-8"),
+                    epoch and epoch.decode("utf-8"),
+                    timeUnit and timeUnit.decode("utf-8"),
+                    semanticType and semanticType.decode("utf-8"),
+                    description and description.decode("utf-8"),
+                    referencedName and referencedName.decode("utf-8"),
+                )
+            )
+
+        self.offset = offset
+        return tokens
+
+    def decode(self):
+        """return frame values and token list"""
+        frame = self.decodeFrame()
+        return frame, self.decodeTokens()
+
+
+class IrGenerator:
+    """generate the token list of a messageSchema with computed layouts"""
+
+    def __init__(self, messageSchema) -> None:
+        if messageSchema.headerLayout is None:
+            raise ValueError("IR requires a messageSchema headerType")
+
+        self.messageSchema = messageSchema
+        self.byteOrder = messageSchema.byteOrder or BYTE_ORDER.LITTLE_ENDIAN
+        self.tokens: List[Token] = []
+
+    def generate(self) -> List[Token]:
+        """return header tokens followed by the tokens of every message"""
+        self.tokens = []
+        self.messageSchema.loadMessages()
+        header = self.messageSchema.headerLayout
+        self.typeTokens(header, header.sbeType.name, 0)
+        for message in self.messageSchema.message_name_map.values():
+            self.messageTokens(message)
+
+        setComponentTokenCounts(self.tokens)
+        return self.tokens
+
+    def add(self, signal: SIGNAL, name: str, **kw) -> Token:
+        token = Token(signal=signal, name=name, byteOrder=self.byteOrder, **kw)
+        self.tokens.append(token)
+        return token
+
+    def signalTokens(self, signal: SIGNAL, definition, **kw) -> None:
+        """add a BEGIN or END token for a message, field, group or data"""
+        self.add(
+            signal,
+            definition.name,
+            version=definition.sinceVersion or 0,
+            deprecated=definition.deprecated,
+            description=definition.description,
+            semanticType=getattr(definition, "semanticType", None),
+            **kw,
+        )
+
+    def messageTokens(self, message) -> None:
+        layout = message.layout
+        attributes = {"size": layout.blockLength, "token_id": message.message_id}
+        self.signalTokens(SIGNAL.BEGIN_MESSAGE, message, **attributes)
+        self.fieldTokens(message, layout)
+        self.signalTokens(SIGNAL.END_MESSAGE, message, **attributes)
+
+    def fieldTokens(self, parent, block) -> None:
+        """add tokens for the fields, groups and data of a message or group"""
+        for field in parent.fieldsList:
+            if isinstance(field, Group):
+                group = block.group(field.name)
+                attributes = {"size": group.blockLength, "token_id": field.group_id}
+                self.signalTokens(SIGNAL.BEGIN_GROUP, field, **attributes)
+                self.typeTokens(group.dimension, group.dimension.sbeType.name, 0)
+                self.fieldTokens(field, group)
+                self.signalTokens(SIGNAL.END_GROUP, field, **attributes)
+                continue
+
+            if isinstance(field, Data):
+                data = block.data(field.name)
+                attributes = {"token_id": field.data_id}
+                self.signalTokens(SIGNAL.BEGIN_VAR_DATA, field, **attributes)
+                self.typeTokens(data.encoding, data.encoding.sbeType.name, 0)
+                self.signalTokens(SIGNAL.END_VAR_DATA, field, **attributes)
+                continue
+
+            element = block.field(field.name)
+            attributes = {
+                "offset": element.offset,
+                "size": element.size,
+                "token_id": field.field_id,
+                "presence": field.presence,
+            }
+            if field.presence == PRESENCE.CONSTANT and field.valueRef:
+                # sbe-tool stores valueRef as a char constValue
+                attributes["primitiveType"] = TYPE_PRIMITIVE_TYPE.CHAR
+                attributes["constValue"] = field.valueRef
+
+            self.signalTokens(SIGNAL.BEGIN_FIELD, field, **attributes)
+            self.typeTokens(element, element.sbeType.name, element.offset)
+            self.signalTokens(SIGNAL.END_FIELD, field, **attributes)
+
+    def typeTokens(self, element: ElementLayout, name: str, offset: int) -> None:
+        """add tokens encoding the type of element at offset"""
+        sbeType = element.sbeType
+        attributes = {
+            "offset": offset,
+            "size": element.size,
+            "version": sbeType.sinceVersion or 0,
+            "deprecated": sbeType.deprecated,
+            "description": sbeType.description,
+            "semanticType": getattr(sbeType, "semanticType", None),
+        }
+        if name != sbeType.name:
+            attributes["referencedName"] = sbeType.name
+
+        if isinstance(sbeType, Composite):
+            self.add(SIGNAL.BEGIN_COMPOSITE, name, **attributes)
+            for member in element.members:
+                self.typeTokens(member, member.name, member.offset - element.offset)
+
+            self.add(SIGNAL.END_COMPOSITE, name, **attributes)
+            return
+
+        attributes["primitiveType"] = element.primitiveType
+        attributes["presence"] = element.presence
+        if isinstance(sbeType, Enum):
+            # keep presence and nullValue of a non primitive encodingType, a
+            # builtin encodingType takes the element presence like sbe-tool
+            encoding = sbeType.resolvedEncodingType
+            if not isinstance(encoding, PrimitiveType):
+                attributes["presence"] = encoding.presence
+                attributes["nullValue"] = encoding.nullValue
+
+            self.add(SIGNAL.BEGIN_ENUM, name, **attributes)
+            for validValue in sbeType.valid_value_list:
+                self.add(
+                    SIGNAL.VALID_VALUE,
+                    validValue.name,
+                    primitiveType=element.primitiveType,
+                    constValue=validValue.value,
+                    version=validValue.sinceVersion or 0,
+                    deprecated=validValue.deprecated,
+                    description=validValue.description,
+                )
+
+            self.add(SIGNAL.END_ENUM, name, **attributes)
+            return
+
+        if isinstance(sbeType, Set):
+            self.add(SIGNAL.BEGIN_SET, name, **attributes)
+            for choice in sbeType.choice_list:
+                self.add(
+                    SIGNAL.CHOICE,
+                    choice.name,
+                    primitiveType=element.primitiveType,
+                    constValue=str(choice.value),
+                    version=choice.sinceVersion or 0,
+                    deprecated=choice.deprecated,
+                    description=choice.description,
+                )
+
+            self.add(SIGNAL.END_SET, name, **attributes)
+            return
+
+        # the type presence and size, a constant field or composite may hide
+        # the type encoding but the type itself keeps it, the shared builtin
+        # primitives have no presence of their own and take the element one
+        if not isinstance(sbeType, PrimitiveType):
+            attributes["presence"] = sbeType.presence
+
+        constValue = None
+        if attributes["presence"] == PRESENCE.CONSTANT:
+            constValue = element.constValue
+        else:
+            attributes["size"] = (
+                PRIMITIVE_TYPE_SIZE_MAP[sbeType.primitiveType] * sbeType.length
+            )
+
+        self.add(
+            SIGNAL.ENCODING,
+            name,
+            constValue=constValue,
+            minValue=sbeType.minValue,
+            maxValue=sbeType.maxValue,
+            nullValue=sbeType.nullValue,
+            characterEncoding=sbeType.characterEncoding,
+            **attributes,
+        )
+
+
+class IrSchemaBuilder:
+    """build a MessageSchema from IR frame values and tokens"""
+
+    def __init__(self, frame: dict, tokens: List[Token]) -> None:
+        self.frame = frame
+        self.tokens = tokens
+        self.messageSchema = None
+
+    def build(self):
+        """return messageSchema with computed layouts"""
+        tokens = self.tokens
+        if not tokens or tokens[0].signal != SIGNAL.BEGIN_COMPOSITE:
+            raise ValueError("IR does not start with a messageHeader composite")
+
+        headerType = tokens[0].name
+        end = self.matchingEnd(0)
+        byteOrder = next(
+            (token.byteOrder for token in tokens[:end] if token.primitiveType),
+            BYTE_ORDER.LITTLE_ENDIAN,
+        )
+        self.messageSchema = createMessageSchema(
+            version=self.frame["schemaVersion"],
+            package=self.frame["packageName"],
+            schema_id=self.frame["irId"],
+            semanticVersion=self.frame["semanticVersion"],
+            byteOrder=byteOrder,
+            headerType=headerType,
+        )
+        index = self.registerType(0)
+        while index < len(tokens):
+            index = self.buildMessage(index)
+
+        computeLayout(self.messageSchema)
+        return self.messageSchema
+
+    def matchingEnd(self, index: int) -> int:
+        """return index after the END token matching the BEGIN at index"""
+        token = self.tokens[index]
+        end = index + token.componentTokenCount
+        if (
+            end > len(self.tokens)
+            or index + 1 >= end
+            or not self.tokens[end - 1].signal.name.startswith("END_")
+        ):
+            raise ValueError(f"IR token {token!r} has an invalid componentTokenCount")
+
+        return end
+
+    def expect(self, index: int, signal: SIGNAL) -> Token:
+        if index >= len(self.tokens) or self.tokens[index].signal != signal:
+            found = self.tokens[index] if index < len(self.tokens) else "end of IR"
+            raise ValueError(f"expected IR {signal.name} token, found {found!r}")
+
+        return self.tokens[index]
+
+    def buildMessage(self, index: int) -> int:
+        token = self.expect(index, SIGNAL.BEGIN_MESSAGE)
+        message = createMessage(
+            name=token.name,
+            message_id=token.token_id,
+            blockLength=token.size,
+            description=token.description,
+            semanticType=token.semanticType,
+            sinceVersion=token.version,
+            deprecated=token.deprecated,
+        )
+        index = self.buildFields(message, index + 1)
+        self.expect(index, SIGNAL.END_MESSAGE)
+        self.messageSchema.addMessage(message)
+        return index + 1
+
+    def buildFields(self, parent, index: int) -> int:
+        """add fields, groups and data to parent until its END token"""
+        tokens = self.tokens
+        while index < len(tokens):
+            token = tokens[index]
+            if token.signal == SIGNAL.BEGIN_FIELD:
+                index = self.buildField(parent, index)
+            elif token.signal == SIGNAL.BEGIN_GROUP:
+                group = createGroup(
+                    name=token.name,
+                    group_id=token.token_id,
+                    blockLength=token.size,
+                    description=token.description,
+                    semanticType=token.semanticType,
+                    sinceVersion=token.version,
+                    deprecated=token.deprecated,
+                    dimensionType=tokens[index + 1].name,
+                )
+                index = self.buildFields(group, self.registerType(index + 1))
+                self.expect(index, SIGNAL.END_GROUP)
+                parent.addField(group)
+                index += 1
+            elif token.signal == SIGNAL.BEGIN_VAR_DATA:
+                data = createData(
+                    name=token.name,
+                    data_id=token.token_id,
+                    data_type=tokens[index + 1].name,
+                    description=token.description,
+                    semanticType=token.semanticType,
+                    sinceVersion=token.version,
+                    deprecated=token.deprecated,
+                )
+                index = self.registerType(index + 1)
+                self.expect(index, SIGNAL.END_VAR_DATA)
+                parent.addField(data)
+                index += 1
+            else:
+                return index
+
+        return index
+
+    def buildField(self, parent, index: int) -> int:
+        token = self.tokens[index]
+        valueRef = None
+        if (
+            token.presence == PRESENCE.CONSTANT
+            and token.primitiveType == TYPE_PRIMITIVE_TYPE.CHAR
+        ):
+            valueRef = token.constValue
+
+        field = createField(
+            name=token.name,
+            field_id=token.token_id,
+            field_type=self.tokens[index + 1].name,
+            description=token.description,
+            offset=token.offset,
+            presence=token.presence,
+            sinceVersion=token.version,
+            deprecated=token.deprecated,
+            valueRef=valueRef,
+        )
+        index = self.registerType(index + 1)
+        self.expect(index, SIGNAL.END_FIELD)
+        parent.addField(field)
+        return index + 1
+
+    def registerType(self, index: int) -> int:
+        """add the type starting at index to the schema once, return next index"""
+        token = self.tokens[index]
+        if token.name in self.messageSchema.typesNameMap:
+            # types are repeated for every field using them
+            if token.signal == SIGNAL.ENCODING:
+                return index + 1
+
+            return self.matchingEnd(index)
+
+        sbeType, end = self.buildType(index, token.name)
+        self.messageSchema.addType(sbeType)
+        return end
+
+    def buildType(self, index: int, name: str, offset: Optional[int] = None):
+        """return type named name built from the tokens at index, next index"""
+        token = self.tokens[index]
+        signal = token.signal
+        common = {
+            "description": token.description,
+            "sinceVersion": token.version,
+            "deprecated": token.deprecated,
+        }
+        if signal == SIGNAL.ENCODING:
+            primitiveType = token.primitiveType
+            # constants are not encoded, their declared length is not kept
+            length = 1
+            if token.presence != PRESENCE.CONSTANT:
+                length = token.size // PRIMITIVE_TYPE_SIZE_MAP[primitiveType]
+
+            sbeType = createType(
+                name=name,
+                primitiveType=primitiveType,
+                presence=token.presence,
+                nullValue=token.nullValue,
+                minValue=token.minValue,
+                maxValue=token.maxValue,
+                length=length,
+                offset=offset,
+                semanticType=token.semanticType,
+                characterEncoding=token.characterEncoding,
+                constValue=token.constValue,
+                **common,
+            )
+            return sbeType, index + 1
+
+        end = self.matchingEnd(index)
+        encodingType = None
+        if token.primitiveType is not None:
+            encodingType = token.primitiveType.name.lower()
+
+        if signal == SIGNAL.BEGIN_ENUM:
+            sbeType = createEnum(
+                name=name,
+                encodingType=encodingType,
+                offset=offset,
+                semanticType=token.semanticType,
+                **common,
+            )
+            outer = self.tokens[index - 1]
+            presence = PRESENCE.REQUIRED
+            if outer.signal == SIGNAL.BEGIN_FIELD:
+                presence = outer.presence
+
+            if token.presence != presence or token.nullValue:
+                # encoded by a schema type rather than a builtin primitive,
+                # the enum scope shadows the builtin of the same name
+                sbeType.addType(
+                    createType(
+                        name=encodingType,
+                        primitiveType=token.primitiveType,
+                        presence=token.presence,
+                        nullValue=token.nullValue,
+                    )
+                )
+
+            for validValue in self.tokens[index + 1 : end - 1]:
+                sbeType.addValidValue(
+                    createValidValue(
+                        name=validValue.name,
+                        value=validValue.constValue,
+                        description=validValue.description,
+                        sinceVersion=validValue.version,
+                        deprecated=validValue.deprecated,
+                    )
+                )
+
+            return sbeType, end
+
+        if signal == SIGNAL.BEGIN_SET:
+            sbeType = createSet(
+                name=name, encodingType=encodingType, offset=offset, **common
+            )
+            for choice in self.tokens[index + 1 : end - 1]:
+                sbeType.addChoice(
+                    createChoice(
+                        name=choice.name,
+                        value=int(choice.constValue),
+                        description=choice.description,
+                        sinceVersion=choice.version,
+                        deprecated=choice.deprecated,
+                    )
+                )
+
+            return sbeType, end
+
+        if signal != SIGNAL.BEGIN_COMPOSITE:
+            raise ValueError(f"unexpected IR token {token!r}, expected a type")
+
+        sbeType = createComposite(
+            name=name, offset=offset, semanticType=token.semanticType, **common
+        )
+        position = 0
+        member = index + 1
+        while member < end - 1:
+            memberToken = self.tokens[member]
+            # only keep offsets that leave a gap, like a hand written schema
+            memberOffset = None
+            if memberToken.offset != position:
+                memberOffset = memberToken.offset
+
+            position = memberToken.offset + memberToken.size
+            if memberToken.referencedName:
+                referenced, member = self.buildType(
+                    member, memberToken.referencedName
+                )
+                if memberToken.referencedName not in self.messageSchema.typesNameMap:
+                    self.messageSchema.addType(referenced)
+
+                sbeType.addType(
+                    createRef(
+                        name=memberToken.name,
+                        type=memberToken.referencedName,
+                        offset=memberOffset,
+                        sinceVersion=memberToken.version,
+                        deprecated=memberToken.deprecated,
+                    )
+                )
+                continue
+
+            memberType, member = self.buildType(member, memberToken.name, memberOffset)
+            sbeType.addType(memberType)
+
+        return sbeType, end
+
+
+class IrParser:
+    """parse SBE IR files as written by sbe-tool or writeIr"""
+
+    def parseFile(self, file_or_object):
+        """parse an IR file, given a filename or binary file object"""
+        if hasattr(file_or_object, "read"):
+            return self.parseBytes(file_or_object.read())
+
+        with open(file_or_object, "rb") as source:
+            return self.parseBytes(source.read())
+
+    def parseBytes(self, content):
+        """parse IR file content"""
+        frame, tokens = IrDecoder(content).decode()
+        return IrSchemaBuilder(frame, tokens).build()
+
+
+def encodeIr(messageSchema) -> bytes:
+    """return IR file content for messageSchema"""
+    tokens = IrGenerator(messageSchema).generate()
+    return IrEncoder().encode(messageSchema, tokens)
+
+
+def writeIrFile(messageSchema, file_or_object) -> None:
+    """write messageSchema as IR to a filename or binary file object"""
+    content = encodeIr(messageSchema)
+    if hasattr(file_or_object, "write"):
+        file_or_object.write(content)
+        return
+
+    with open(file_or_object, "wb") as output:
+        output.write(content)
@@ -1,3 +1,123 @@
 # -*- coding: utf-8 -*-
 
-"""Main module."""
+"""Main module.
+
+Ahead of time code generator, turns an SBE xml schema into a standalone
+python module of specialised decoders and encoders. The generated module
+only imports struct, offsets and struct formats are inlined as literals.
+It defines its own UnknownTemplateId, a ValueError like the one raised by
+pysbe.schema.exceptions for compiled codecs, rather than importing pysbe.
+
+usage: python -m pysbe.pysbe schema.xml output.py
+
+schema may also be an sbe-tool intermediate representation file, named
+with the .sbeir extension
+"""
+import argparse
+import sys
+
+from pysbe.codec.compiler import decoderSource, dispatchSource
+from pysbe.codec.encoder import encoderSource
+from pysbe.codec.flyweight import flyweightSource
+from pysbe.codec.length import skipSource
+from pysbe.codec.source import SourceBuilder
+from pysbe.parser.fix_parser import SBESpecParser
+
+IR_EXTENSION = ".sbeir"
+
+MODULE_HEADER = """# -*- coding: utf-8 -*-
+{docstring}
+import struct
+
+SCHEMA_ID = {schemaId!r}
+SCHEMA_VERSION = {version!r}
+BYTE_ORDER = {byteOrder!r}
+
+
+class UnknownTemplateId(ValueError):
+    \"\"\"templateId does not match any message in the schema\"\"\"
+
+"""
+
+
+def registrySource(name: str, entries) -> str:
+    """return source of a templateId keyed dict"""
+    items = "".join(f"    {key!r}: {value},\n" for key, value in entries)
+    return f"{name} = {{\n{items}}}\n"
+
+
+def generateSource(messageSchema, sourceName: str = "schema") -> str:
+    """return python module source for every message in messageSchema"""
+    builder = SourceBuilder(messageSchema.byteOrder)
+    decoders = []
+    flyweights = []
+    encoders = []
+    encoderClasses = []
+    skippers = []
+    messageSchema.loadMessages()
+    for message in messageSchema.message_name_map.values():
+        layout = message.layout
+        templateId = layout.message_id
+        decoders.append((templateId, decoderSource(builder, layout)))
+        flyweights.append((templateId, flyweightSource(builder, layout)[0]))
+        encodeName, encoderName = encoderSource(builder, messageSchema, layout)
+        encoders.append((templateId, encodeName))
+        encoderClasses.append((templateId, encoderName))
+        skippers.append((templateId, skipSource(builder, layout)))
+
+    builder.add(
+        "\n".join(
+            [
+                registrySource("DECODERS", decoders),
+                registrySource("FLYWEIGHT_DECODERS", flyweights),
+                registrySource("ENCODERS", encoders),
+                registrySource("FLYWEIGHT_ENCODERS", encoderClasses),
+                registrySource("SKIPPERS", skippers),
+            ]
+        )
+    )
+    if messageSchema.headerLayout is not None:
+        dispatchSource(builder, messageSchema, "DECODERS", "SKIPPERS")
+
+    byteOrder = messageSchema.byteOrder
+    description = messageSchema.description or messageSchema.package or "codecs"
+    # a repr literal, the description and path may hold quotes or backslashes
+    docstring = repr(
+        f"{description}\n\ngenerated by pysbe from {sourceName}, do not edit\n"
+    )
+    header = MODULE_HEADER.format(
+        docstring=docstring,
+        schemaId=messageSchema.schema_id,
+        version=messageSchema.version,
+        byteOrder=byteOrder.value if byteOrder else None,
+    )
+    return f"{header}\n{builder.source()}"
+
+
+def generateFile(schemaFilename: str, outputFilename: str) -> None:
+    """parse schemaFilename and write generated codecs to outputFilename"""
+    parser = SBESpecParser()
+    if schemaFilename.endswith(IR_EXTENSION):
+        messageSchema = parser.parseIrFile(schemaFilename)
+    else:
+        messageSchema = parser.parseFile(schemaFilename)
+
+    source = generateSource(messageSchema, sourceName=schemaFilename)
+    with open(outputFilename, "w", encoding="utf-8") as output:
+        output.write(source)
+
+
+def main(argv=None) -> int:
+    """command line entry point"""
+    parser = argparse.ArgumentParser(
+        description="generate python SBE codecs from an xml schema"
+    )
+    parser.add_argument("schema", help="SBE xml schema or .sbeir file")
+    parser.add_argument("output", help="python module to write")
+    args = parser.parse_args(argv)
+    generateFile(args.schema, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
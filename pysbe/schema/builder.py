@@ -1,12 +1,12 @@
 """builder.py - construct schema object"""
-from typing import Optional, Union
+from typing import Callable, Optional, Union
 
-from .constants import VALID_BYTE_ORDER, PRIMITIVE_TYPE_LIST, PRESENCE
+from .constants import VALID_BYTE_ORDER
 
 from .types import (
-    createType, Type, Composite, Enum, TypeCollection, AsDictType, Message, Field
+    PRIMITIVE_TYPES, Type, Composite, Enum, TypeCollection, AsDictType, Message, Field
 )
-from .exceptions import DuplicateName
+from .exceptions import DuplicateName, DuplicateId, UnknownTemplateId
 
 
 class MessageSchema(TypeCollection, AsDictType):
@@ -24,6 +24,11 @@ class MessageSchema(TypeCollection, AsDictType):
     ) -> None:
         super().__init__()
         self.message_name_map = {}
+        self.message_id_map = {}
+        # messages registered by addLazyMessage and not built yet,
+        # name -> (message_id, loader) and message_id -> name
+        self.lazy_message_map = {}
+        self.lazy_message_id_map = {}
         if not isinstance(version, int) or version < 0:
             raise ValueError("version must be a positive integer")
 
@@ -55,24 +60,101 @@ class MessageSchema(TypeCollection, AsDictType):
         self.description = description
         self.byteOrder = byteOrder
         self.headerType = headerType
+        # set by layout.computeLayout
+        self.headerLayout = None
+        # set by linker.linkSchema
+        self.resolvedHeaderType = None
+        self.qualifiedNameMap = {}
+        self.qualifiedMessageNameMap = {}
 
         self.addPrimitiveTypes()
 
     def addPrimitiveTypes(self) -> None:
-        """add default list of primitive types"""
-        for typeName in PRIMITIVE_TYPE_LIST:
-            newType = createType(
-                name=typeName, primitiveType=typeName, presence=PRESENCE.OPTIONAL
+        """add default list of primitive types, shared by every schema"""
+        for primitiveType in PRIMITIVE_TYPES.values():
+            self.addType(primitiveType)
+
+    def checkMessage(self, name: str, message_id: int) -> None:
+        """ensure message name and id are not already used"""
+        if name in self.message_name_map or name in self.lazy_message_map:
+            raise ValueError(f"message name '{name}' already defined'")
+
+        if message_id in self.message_id_map:
+            other = self.message_id_map[message_id].name
+        else:
+            other = self.lazy_message_id_map.get(message_id)
+
+        if other is not None:
+            raise DuplicateId(
+                f"message '{name}' id {message_id} already used by message '{other}'"
             )
 
-            self.addType(newType)
-
     def addMessage(self, message: Message) -> None:
         """add message definition to schema"""
-        if message.name in self.message_name_map:
-            raise ValueError(f"message name '{message.name}' already defined'")
-
+        self.checkMessage(message.name, message.message_id)
         self.message_name_map[message.name] = message
+        self.message_id_map[message.message_id] = message
+
+    def addLazyMessage(
+        self, name: str, message_id: int, loader: Callable[[], Message]
+    ) -> None:
+        """register a message by name and id, loader builds it when requested
+
+        loader returns the complete message, linked and laid out
+        """
+        self.checkMessage(name, message_id)
+        self.lazy_message_map[name] = (message_id, loader)
+        self.lazy_message_id_map[message_id] = name
+
+    def loadMessage(self, name: str) -> Message:
+        """build a message registered by addLazyMessage"""
+        message_id, loader = self.lazy_message_map[name]
+        message = loader()
+        del self.lazy_message_map[name]
+        del self.lazy_message_id_map[message_id]
+        self.addMessage(message)
+        return message
+
+    def loadMessages(self) -> None:
+        """build every message not built yet"""
+        for name in list(self.lazy_message_map):
+            self.loadMessage(name)
+
+    def getMessage(self, name: str) -> Message:
+        """return message by name, building it if needed"""
+        message = self.message_name_map.get(name)
+        if message is not None:
+            return message
+
+        if name not in self.lazy_message_map:
+            raise KeyError(f"message {name!r} is not defined in schema")
+
+        return self.loadMessage(name)
+
+    def getMessageById(self, message_id: int) -> Message:
+        """return message for a templateId, building it if needed"""
+        try:
+            return self.message_id_map[message_id]
+        except KeyError:
+            pass
+
+        try:
+            name = self.lazy_message_id_map[message_id]
+        except KeyError:
+            raise UnknownTemplateId(
+                f"templateId {message_id!r} is not defined in schema"
+            ) from None
+
+        return self.loadMessage(name)
+
+    def messageIds(self) -> list:
+        """return templateId of every message, built or not"""
+        return list(self.message_id_map) + list(self.lazy_message_id_map)
+
+    def __getstate__(self):
+        # loaders hold parser state, pickle the built messages instead
+        self.loadMessages()
+        return super().__getstate__()
 
 
 def createMessageSchema(
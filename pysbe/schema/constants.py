@@ -58,3 +58,61 @@ PRESENCE, PRESENCE_MAP = make_enum_and_map(
 )
 
 VALID_PRESENCE = PRESENCE_MAP.keys()
+
+# encoded size in bytes of each primitive type
+PRIMITIVE_TYPE_SIZE_MAP = {
+    TYPE_PRIMITIVE_TYPE_MAP[name]: size
+    for name, size in (
+        ("char", 1),
+        ("int8", 1),
+        ("int16", 2),
+        ("int32", 4),
+        ("int64", 8),
+        ("uint8", 1),
+        ("uint16", 2),
+        ("uint32", 4),
+        ("uint64", 8),
+        ("float", 4),
+        ("double", 8),
+    )
+}
+
+# struct module format character for each primitive type
+PRIMITIVE_TYPE_STRUCT_FORMAT_MAP = {
+    TYPE_PRIMITIVE_TYPE_MAP[name]: code
+    for name, code in (
+        ("char", "c"),
+        ("int8", "b"),
+        ("int16", "h"),
+        ("int32", "i"),
+        ("int64", "q"),
+        ("uint8", "B"),
+        ("uint16", "H"),
+        ("uint32", "I"),
+        ("uint64", "Q"),
+        ("float", "f"),
+        ("double", "d"),
+    )
+}
+
+BYTE_ORDER_STRUCT_PREFIX_MAP = {
+    BYTE_ORDER.LITTLE_ENDIAN: "<", BYTE_ORDER.BIG_ENDIAN: ">"
+}
+
+# value representing null for optional fields of each primitive type
+PRIMITIVE_TYPE_NULL_VALUE_MAP = {
+    TYPE_PRIMITIVE_TYPE_MAP[name]: value
+    for name, value in (
+        ("char", b"\x00"),
+        ("int8", -(2 ** 7)),
+        ("int16", -(2 ** 15)),
+        ("int32", -(2 ** 31)),
+        ("int64", -(2 ** 63)),
+        ("uint8", 2 ** 8 - 1),
+        ("uint16", 2 ** 16 - 1),
+        ("uint32", 2 ** 32 - 1),
+        ("uint64", 2 ** 64 - 1),
+        ("float", float("nan")),
+        ("double", float("nan")),
+    )
+}
@@ -14,3 +14,28 @@ class DuplicateChoiceValue(ValueError):
 class UnknownReference(ValueError):
     """unknown reference"""
     pass
+
+
+class InvalidLayout(ValueError):
+    """declared offset or blockLength conflicts with computed layout"""
+    pass
+
+
+class DuplicateId(ValueError):
+    """duplicate id"""
+    pass
+
+
+class UnknownTemplateId(ValueError):
+    """templateId does not match any message in the schema"""
+    pass
+
+
+class CircularReference(InvalidLayout):
+    """composite contains itself through refs"""
+    pass
+
+
+class UnknownSchema(ValueError):
+    """schemaId and version do not match any registered schema"""
+    pass
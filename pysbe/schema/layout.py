@@ -0,0 +1,483 @@
+"""layout.py - compute wire offsets and sizes of messages, groups and composites"""
+from typing import List, Optional
+
+from .constants import PRESENCE, PRIMITIVE_TYPE_SIZE_MAP
+from .exceptions import InvalidLayout, UnknownReference
+from .linker import linkMessage, linkSchema
+from .types import (
+    AsDictType,
+    Composite,
+    Data,
+    Enum,
+    FieldCollection,
+    Group,
+    Message,
+    PrimitiveType,
+    Ref,
+    Set,
+    Type,
+    ValidValue,
+)
+
+HEADER_FIELD_NAMES = ("blockLength", "templateId", "schemaId", "version")
+
+DIMENSION_FIELD_NAMES = ("blockLength", "numInGroup")
+
+VAR_DATA_FIELD_NAMES = ("length", "varData")
+
+# a constant on either level wins, then optional, a field is only required
+# when neither it nor its user defined type allow the value to be absent
+PRESENCE_RANK = {PRESENCE.REQUIRED: 0, PRESENCE.OPTIONAL: 1, PRESENCE.CONSTANT: 2}
+
+
+class ElementLayout(AsDictType):
+    """resolved offset and encoded size of a field or composite member"""
+
+    __slots__ = (
+        "name",
+        "sbeType",
+        "offset",
+        "size",
+        "primitiveType",
+        "length",
+        "presence",
+        "sinceVersion",
+        "members",
+        "constValue",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        sbeType: [object],
+        offset: int,
+        size: int,
+        primitiveType: Optional[object] = None,
+        length: int = 1,
+        presence: PRESENCE = PRESENCE.REQUIRED,
+        sinceVersion: int = 0,
+        members: Optional[List["ElementLayout"]] = None,
+        constValue: Optional[str] = None,
+    ) -> None:
+        """offset is relative to the start of the enclosing block"""
+        self.name = name
+        self.sbeType = sbeType
+        self.offset = offset
+        self.size = size
+        self.primitiveType = primitiveType
+        self.length = length
+        self.presence = presence
+        self.sinceVersion = sinceVersion
+        self.members = members or []
+        self.constValue = constValue
+
+    @property
+    def isComposite(self) -> bool:
+        return isinstance(self.sbeType, Composite)
+
+    @property
+    def isConstant(self) -> bool:
+        return self.presence == PRESENCE.CONSTANT
+
+    def leaves(self):
+        """yield the primitive encoded elements in wire order"""
+        if not self.isComposite:
+            yield self
+            return
+
+        for member in self.members:
+            yield from member.leaves()
+
+    def member(self, name: str) -> Optional["ElementLayout"]:
+        """return composite member layout by name"""
+        for member in self.members:
+            if member.name == name:
+                return member
+
+        return None
+
+
+class BlockLayout(AsDictType):
+    """resolved layout of a message root block or a group entry"""
+
+    __slots__ = ("name", "blockLength", "fields", "groups", "sinceVersion", "varData")
+
+    def __init__(
+        self,
+        name: str,
+        blockLength: int,
+        fields: List[ElementLayout],
+        groups: List["GroupLayout"],
+        sinceVersion: int = 0,
+        varData: Optional[List["VarDataLayout"]] = None,
+    ) -> None:
+        self.name = name
+        self.blockLength = blockLength
+        self.fields = fields
+        self.groups = groups
+        self.sinceVersion = sinceVersion
+        # variable length data follows the groups on the wire
+        self.varData = varData or []
+
+    def field(self, name: str) -> Optional[ElementLayout]:
+        """return field layout by name"""
+        for field in self.fields:
+            if field.name == name:
+                return field
+
+        return None
+
+    def group(self, name: str) -> Optional["GroupLayout"]:
+        """return group layout by name"""
+        for group in self.groups:
+            if group.name == name:
+                return group
+
+        return None
+
+    def data(self, name: str) -> Optional["VarDataLayout"]:
+        """return variable length data layout by name"""
+        for data in self.varData:
+            if data.name == name:
+                return data
+
+        return None
+
+
+class VarDataLayout(AsDictType):
+    """layout of a variable length data field
+
+    encoding is the layout of the length prefixed encoding composite, the
+    data itself starts headerLength bytes after the length
+    """
+
+    __slots__ = (
+        "name",
+        "data_id",
+        "encoding",
+        "length",
+        "headerLength",
+        "characterEncoding",
+        "sinceVersion",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        data_id: int,
+        encoding: ElementLayout,
+        characterEncoding: Optional[str] = None,
+        sinceVersion: int = 0,
+    ) -> None:
+        self.name = name
+        self.data_id = data_id
+        self.encoding = encoding
+        self.length = encoding.member("length")
+        self.headerLength = encoding.member("varData").offset
+        self.characterEncoding = characterEncoding
+        self.sinceVersion = sinceVersion
+
+
+class MessageLayout(BlockLayout):
+    """layout of a message root block and its repeating groups"""
+
+    __slots__ = ("message_id",)
+
+    def __init__(self, message_id: int, **kw) -> None:
+        super().__init__(**kw)
+        self.message_id = message_id
+
+
+class GroupLayout(BlockLayout):
+    """layout of a single repeating group entry and its dimension header"""
+
+    __slots__ = ("group_id", "dimension")
+
+    def __init__(self, group_id: int, dimension: ElementLayout, **kw) -> None:
+        super().__init__(**kw)
+        self.group_id = group_id
+        self.dimension = dimension
+
+
+def mergePresence(outer: PRESENCE, inner: PRESENCE) -> PRESENCE:
+    """return the presence of a field of a type declaring inner presence
+
+    the higher PRESENCE_RANK wins, a required field of an optional type may
+    hold the null value, a field of a constant type is constant
+    """
+    if PRESENCE_RANK.get(inner, 0) > PRESENCE_RANK.get(outer, 0):
+        return inner
+
+    return outer
+
+
+class LayoutBuilder:
+    """compute layouts for every message in a messageSchema"""
+
+    def __init__(self, messageSchema) -> None:
+        self.messageSchema = messageSchema
+
+    def layoutSchema(self) -> None:
+        """attach computed layouts to the messageSchema and its messages"""
+        linkSchema(self.messageSchema)
+        self.messageSchema.headerLayout = self.layoutHeader()
+        for message in self.messageSchema.message_name_map.values():
+            message.layout = self.layoutMessage(message)
+
+    def layoutHeader(self) -> Optional[ElementLayout]:
+        """layout the messageHeader composite named by headerType"""
+        header = self.messageSchema.resolvedHeaderType
+        if header is None:
+            return None
+
+        layout = self.layoutType(header, header.name, 0)
+        self.checkMembers(layout, HEADER_FIELD_NAMES, "messageHeader")
+        return layout
+
+    def layoutMessage(self, message: Message) -> MessageLayout:
+        """layout a message root block and its groups"""
+        fields, groups, varData, blockLength = self.layoutBlock(
+            message, message.blockLength
+        )
+        return MessageLayout(
+            message_id=message.message_id,
+            name=message.name,
+            blockLength=blockLength,
+            fields=fields,
+            groups=groups,
+            sinceVersion=message.sinceVersion,
+            varData=varData,
+        )
+
+    def layoutGroup(self, group: Group) -> GroupLayout:
+        """layout a group entry and its dimension header"""
+        composite = group.resolvedDimensionType
+        dimension = self.layoutType(composite, composite.name, 0)
+        self.checkMembers(dimension, DIMENSION_FIELD_NAMES, f"group '{group.name}'")
+
+        fields, groups, varData, blockLength = self.layoutBlock(
+            group, group.blockLength
+        )
+        return GroupLayout(
+            group_id=group.group_id,
+            dimension=dimension,
+            name=group.name,
+            blockLength=blockLength,
+            fields=fields,
+            groups=groups,
+            sinceVersion=group.sinceVersion,
+            varData=varData,
+        )
+
+    def layoutData(self, data: Data) -> VarDataLayout:
+        """layout the length prefix of variable length data"""
+        encoding = self.layoutType(data.resolvedType, data.name, 0)
+        self.checkMembers(encoding, VAR_DATA_FIELD_NAMES, f"data '{data.name}'")
+        varData = encoding.member("varData")
+        return VarDataLayout(
+            name=data.name,
+            data_id=data.data_id,
+            encoding=encoding,
+            characterEncoding=getattr(varData.sbeType, "characterEncoding", None),
+            sinceVersion=data.sinceVersion,
+        )
+
+    def layoutBlock(self, parent: FieldCollection, declaredBlockLength):
+        """return field, group and data layouts and effective blockLength"""
+        position = 0
+        fields = []
+        groups = []
+        varData = []
+        for field in parent.fieldsList:
+            if isinstance(field, Data):
+                varData.append(self.layoutData(field))
+                continue
+
+            if varData:
+                raise InvalidLayout(
+                    f"'{field.name}' in '{parent.name}' must precede"
+                    " variable length data"
+                )
+
+            if isinstance(field, Group):
+                groups.append(self.layoutGroup(field))
+                continue
+
+            if groups:
+                raise InvalidLayout(
+                    f"field '{field.name}' in '{parent.name}' must precede"
+                    " repeating groups"
+                )
+
+            offset = position
+            if field.offset is not None:
+                if field.offset < position:
+                    raise InvalidLayout(
+                        f"field '{field.name}' in '{parent.name}' declared offset"
+                        f" {field.offset} overlaps preceding field ending at"
+                        f" offset {position}"
+                    )
+
+                offset = field.offset
+
+            element = self.layoutType(
+                field.resolvedType,
+                field.name,
+                offset,
+                presence=field.presence,
+                sinceVersion=field.sinceVersion,
+            )
+            if field.valueRef and element.isConstant:
+                element.constValue = self.resolveValueRef(
+                    field.valueRef, f"field '{field.name}'"
+                )
+
+            position = element.offset + element.size
+            fields.append(element)
+
+        if declaredBlockLength is None:
+            return fields, groups, varData, position
+
+        if declaredBlockLength < position:
+            raise InvalidLayout(
+                f"'{parent.name}' declared blockLength {declaredBlockLength}"
+                f" is less than computed blockLength {position}"
+            )
+
+        return fields, groups, varData, declaredBlockLength
+
+    def layoutType(
+        self,
+        sbeType,
+        name: str,
+        offset: int,
+        presence: PRESENCE = PRESENCE.REQUIRED,
+        sinceVersion: int = 0,
+    ) -> ElementLayout:
+        """layout sbeType starting at offset"""
+        sinceVersion = max(sinceVersion or 0, sbeType.sinceVersion or 0)
+        if isinstance(sbeType, Ref):
+            return self.layoutType(
+                sbeType.resolvedType, name, offset, presence, sinceVersion
+            )
+
+        if isinstance(sbeType, Composite):
+            return self.layoutComposite(sbeType, name, offset, presence, sinceVersion)
+
+        if isinstance(sbeType, (Enum, Set)):
+            encoding = sbeType.resolvedEncodingType
+            presence = self.typePresence(presence, encoding)
+            primitiveType = encoding.primitiveType
+            length = 1
+        elif isinstance(sbeType, Type):
+            presence = self.typePresence(presence, sbeType)
+            primitiveType = sbeType.primitiveType
+            length = sbeType.length
+        else:
+            raise InvalidLayout(f"'{name}' has unsupported type {sbeType!r}")
+
+        constValue = None
+        if presence == PRESENCE.CONSTANT:
+            size = 0
+            if getattr(sbeType, "valueRef", None):
+                constValue = self.resolveValueRef(sbeType.valueRef, f"'{name}'")
+            else:
+                constValue = getattr(sbeType, "constValue", None)
+        else:
+            size = PRIMITIVE_TYPE_SIZE_MAP[primitiveType] * length
+
+        return ElementLayout(
+            name=name,
+            sbeType=sbeType,
+            offset=offset,
+            size=size,
+            primitiveType=primitiveType,
+            length=length,
+            presence=presence,
+            sinceVersion=sinceVersion,
+            constValue=constValue,
+        )
+
+    @staticmethod
+    def typePresence(presence: PRESENCE, sbeType: Type) -> PRESENCE:
+        """return presence of an element declared with presence of sbeType
+
+        the shared builtin primitive types are declared optional, only a
+        presence declared on a user defined type overrides the element
+        """
+        if isinstance(sbeType, PrimitiveType):
+            return presence
+
+        return mergePresence(presence, sbeType.presence)
+
+    def layoutComposite(
+        self,
+        composite: Composite,
+        name: str,
+        offset: int,
+        presence: PRESENCE,
+        sinceVersion: int,
+    ) -> ElementLayout:
+        """layout composite members relative to offset"""
+        position = offset
+        members = []
+        for member in composite.typesList:
+            if member.offset is not None:
+                if offset + member.offset < position:
+                    raise InvalidLayout(
+                        f"composite '{composite.name}' member '{member.name}'"
+                        f" declared offset {member.offset} overlaps preceding"
+                        f" member ending at offset {position - offset}"
+                    )
+
+                position = offset + member.offset
+
+            element = self.layoutType(
+                member,
+                member.name,
+                position,
+                presence=PRESENCE.CONSTANT
+                if presence == PRESENCE.CONSTANT
+                else PRESENCE.REQUIRED,
+                sinceVersion=sinceVersion,
+            )
+            position += element.size
+            members.append(element)
+
+        return ElementLayout(
+            name=name,
+            sbeType=composite,
+            offset=offset,
+            size=position - offset,
+            presence=presence,
+            sinceVersion=sinceVersion,
+            members=members,
+        )
+
+    def resolveValueRef(self, valueRef: str, context: str) -> str:
+        """return the encoded value of an enumName.validValueName reference"""
+        validValue = self.messageSchema.qualifiedNameMap.get(valueRef)
+        if not isinstance(validValue, ValidValue):
+            raise UnknownReference(
+                f"{context} valueRef '{valueRef}' does not resolve to an enum value"
+            )
+
+        return validValue.value
+
+    @staticmethod
+    def checkMembers(layout: ElementLayout, names, context: str) -> None:
+        """ensure composite layout has all required members"""
+        for name in names:
+            if layout.member(name) is None:
+                raise InvalidLayout(f"{context} composite is missing member '{name}'")
+
+
+def computeLayout(messageSchema) -> None:
+    """compute and attach wire layouts for every message in messageSchema"""
+    LayoutBuilder(messageSchema).layoutSchema()
+
+
+def computeMessageLayout(messageSchema, message) -> None:
+    """link and layout a message built after computeLayout ran"""
+    linkMessage(messageSchema, message)
+    message.layout = LayoutBuilder(messageSchema).layoutMessage(message)
@@ -0,0 +1,208 @@
+"""linker.py - resolve the type references of a parsed schema once
+
+Fields, groups, data, refs, enums and sets name the types they use. The
+linker replaces each of those lookups through the parent chain with a
+direct reference, held in the resolved* attribute next to the name, and
+flattens every named element into an index keyed by dotted path. Types,
+their members and enum values go into messageSchema.qualifiedNameMap, e.g.
+"Engine.capacity" or "Model.C", messages and their fields, groups and data
+into messageSchema.qualifiedMessageNameMap, e.g. "Car.fuelFigures.mpg".
+Types and messages are separate namespaces, a message may share the name
+of a type.
+
+Dangling references raise UnknownReference, composites that contain
+themselves through refs raise CircularReference.
+"""
+from collections import ChainMap
+
+from .exceptions import CircularReference, DuplicateName, UnknownReference
+from .types import (
+    Composite,
+    Data,
+    Enum,
+    Group,
+    Ref,
+    Set,
+    Type,
+    TypeCollection,
+    ValidValue,
+)
+
+DEFAULT_DIMENSION_TYPE = "groupSizeEncoding"
+
+
+class SchemaLinker:
+    """resolve references and index qualified names of a messageSchema"""
+
+    def __init__(self, messageSchema) -> None:
+        self.messageSchema = messageSchema
+        self.qualifiedNameMap = {}
+        self.qualifiedMessageNameMap = {}
+
+    def link(self) -> None:
+        """resolve every reference, attach the qualified name index"""
+        messageSchema = self.messageSchema
+        for sbeType in messageSchema.typesList:
+            self.linkType(sbeType, messageSchema, sbeType.name)
+
+        for sbeType in messageSchema.typesList:
+            if isinstance(sbeType, Composite):
+                self.checkCycles(sbeType, ())
+
+        messageSchema.resolvedHeaderType = None
+        if messageSchema.headerType:
+            messageSchema.resolvedHeaderType = self.resolveComposite(
+                messageSchema.headerType,
+                f"messageSchema headerType '{messageSchema.headerType}'",
+            )
+
+        for message in messageSchema.message_name_map.values():
+            self.index(self.qualifiedMessageNameMap, message.name, message)
+            self.linkFields(message, message.name)
+
+        messageSchema.qualifiedNameMap = self.qualifiedNameMap
+        messageSchema.qualifiedMessageNameMap = self.qualifiedMessageNameMap
+        self.linkValueRefs(self.qualifiedNameMap)
+        self.linkValueRefs(self.qualifiedMessageNameMap)
+
+    def linkMessage(self, message) -> None:
+        """resolve a message added after the schema was linked
+
+        names are only added to the schema index once the whole message
+        links, lookups see the names already indexed
+        """
+        messageSchema = self.messageSchema
+        added = {}
+        self.qualifiedNameMap = messageSchema.qualifiedNameMap
+        self.qualifiedMessageNameMap = ChainMap(
+            added, messageSchema.qualifiedMessageNameMap
+        )
+        self.index(self.qualifiedMessageNameMap, message.name, message)
+        self.linkFields(message, message.name)
+        self.linkValueRefs(added)
+        messageSchema.qualifiedMessageNameMap.update(added)
+
+    @staticmethod
+    def index(names, qualifiedName: str, element) -> None:
+        """add element to the names index, each name is used once"""
+        if qualifiedName in names:
+            raise DuplicateName(
+                f"qualified name '{qualifiedName}' is used by more than one element"
+            )
+
+        names[qualifiedName] = element
+
+    def linkType(self, sbeType, scope: TypeCollection, qualifiedName: str) -> None:
+        """resolve the references of sbeType, declared in scope"""
+        self.index(self.qualifiedNameMap, qualifiedName, sbeType)
+        if isinstance(sbeType, Ref):
+            target = scope.lookupName(sbeType.type)
+            if target is None:
+                raise UnknownReference(
+                    f"ref '{sbeType.name}' references unknown type '{sbeType.type}'"
+                )
+
+            sbeType.resolvedType = target
+        elif isinstance(sbeType, Composite):
+            for member in sbeType.typesList:
+                self.linkType(member, sbeType, f"{qualifiedName}.{member.name}")
+        elif isinstance(sbeType, (Enum, Set)):
+            # enum encodingType may name a type nested in the enum itself
+            encodingScope = sbeType if isinstance(sbeType, Enum) else scope
+            encoding = encodingScope.lookupName(sbeType.encodingType)
+            if not isinstance(encoding, Type):
+                raise UnknownReference(
+                    f"'{sbeType.name}' encodingType '{sbeType.encodingType}'"
+                    " does not resolve to a primitive type"
+                )
+
+            sbeType.resolvedEncodingType = encoding
+            if isinstance(sbeType, Enum):
+                values = sbeType.valid_value_list
+            else:
+                values = sbeType.choice_list
+
+            for value in values:
+                valueName = f"{qualifiedName}.{value.name}"
+                self.index(self.qualifiedNameMap, valueName, value)
+
+    def checkCycles(self, composite: Composite, active: tuple) -> None:
+        """raise CircularReference when composite contains itself"""
+        if composite in active:
+            path = " -> ".join(element.name for element in active + (composite,))
+            raise CircularReference(
+                f"composite '{composite.name}' contains itself, {path}"
+            )
+
+        active = active + (composite,)
+        for member in composite.typesList:
+            if isinstance(member, Ref):
+                member = member.resolvedType
+
+            if isinstance(member, Composite):
+                self.checkCycles(member, active)
+
+    def linkFields(self, parent, qualifiedName: str) -> None:
+        """resolve the types of the fields, groups and data of parent"""
+        messageSchema = self.messageSchema
+        for field in parent.fieldsList:
+            fieldName = f"{qualifiedName}.{field.name}"
+            self.index(self.qualifiedMessageNameMap, fieldName, field)
+            if isinstance(field, Group):
+                dimensionType = field.dimensionType or DEFAULT_DIMENSION_TYPE
+                field.resolvedDimensionType = self.resolveComposite(
+                    dimensionType,
+                    f"group '{field.name}' dimensionType '{dimensionType}'",
+                )
+                self.linkFields(field, fieldName)
+            elif isinstance(field, Data):
+                field.resolvedType = self.resolveComposite(
+                    field.data_type, f"data '{field.name}' type '{field.data_type}'"
+                )
+            else:
+                sbeType = messageSchema.lookupName(field.field_type)
+                if sbeType is None:
+                    raise UnknownReference(
+                        f"field '{field.name}' type '{field.field_type}'"
+                        " could not be resolved, undefined type"
+                    )
+
+                field.resolvedType = sbeType
+
+    def linkValueRefs(self, elements) -> None:
+        """ensure every valueRef in elements names an enum value"""
+        for qualifiedName, element in elements.items():
+            valueRef = getattr(element, "valueRef", None)
+            if valueRef:
+                self.resolveValueRef(valueRef, f"'{qualifiedName}'")
+
+    def resolveComposite(self, name: str, context: str) -> Composite:
+        """lookup name and ensure it is a composite"""
+        composite = self.messageSchema.lookupName(name)
+        if not isinstance(composite, Composite):
+            raise UnknownReference(f"{context} does not resolve to a composite")
+
+        return composite
+
+    def resolveValueRef(self, valueRef: str, context: str) -> ValidValue:
+        """return the enum value named by an enumName.validValueName reference"""
+        validValue = self.qualifiedNameMap.get(valueRef)
+        enumName = valueRef.partition(".")[0]
+        if not isinstance(validValue, ValidValue) or not isinstance(
+            self.qualifiedNameMap.get(enumName), Enum
+        ):
+            raise UnknownReference(
+                f"{context} valueRef '{valueRef}' does not resolve to an enum value"
+            )
+
+        return validValue
+
+
+def linkSchema(messageSchema) -> None:
+    """resolve the type references of messageSchema and index its names"""
+    SchemaLinker(messageSchema).link()
+
+
+def linkMessage(messageSchema, message) -> None:
+    """resolve the references of a message added to a linked messageSchema"""
+    SchemaLinker(messageSchema).linkMessage(message)
@@ -1,13 +1,80 @@
-"""types.py - schema for types type, composite, enum, etc"""
+"""types.py - schema for types type, composite, enum, etc
+
+Schema nodes are slotted and their names interned, many versions of a
+schema may be held in memory at once. The builtin primitive types are
+created once and shared, immutable, by every schema.
+"""
+import functools
+import sys
 import weakref
-from typing import Optional, Union
-from .constants import PRESENCE, TYPE_PRIMITIVE_TYPE
+from typing import TYPE_CHECKING, Optional, Union
+from .constants import (
+    PRESENCE,
+    PRIMITIVE_TYPE_LIST,
+    TYPE_PRIMITIVE_TYPE,
+    TYPE_PRIMITIVE_TYPE_MAP,
+)
 from .exceptions import DuplicateName, DuplicateChoiceValue
 
+if TYPE_CHECKING:
+    # builder imports this module, only type checkers follow the cycle
+    from .builder import MessageSchema
+
+# attributes held by the TypeCollection and FieldCollection mixins, listed
+# in the __slots__ of the classes using them
+TYPE_COLLECTION_SLOTS = ("typesNameMap", "typesList", "parentCollectionRef")
+FIELD_COLLECTION_SLOTS = ("fieldsNameMap", "fieldsList")
+
+# attributes naming a schema element or referencing one by name
+INTERNED_ATTRIBUTES = frozenset(
+    (
+        "name",
+        "encodingType",
+        "type",
+        "field_type",
+        "dimensionType",
+        "data_type",
+    )
+)
+
+# derived by linker.linkSchema, left out of as_dict
+LINKED_ATTRIBUTES = frozenset(
+    (
+        "resolvedType",
+        "resolvedEncodingType",
+        "resolvedDimensionType",
+        "resolvedHeaderType",
+        "qualifiedNameMap",
+        "qualifiedMessageNameMap",
+    )
+)
+
+
+def intern(name: Optional[str]) -> Optional[str]:
+    """return the interned copy of a name, names are shared across schemas"""
+    if name.__class__ is str:
+        return sys.intern(name)
+
+    return name
+
+
+@functools.lru_cache(maxsize=None)
+def slotNames(cls) -> tuple:
+    """return every slot declared by cls and its bases"""
+    names = []
+    for klass in reversed(cls.__mro__):
+        for name in klass.__dict__.get("__slots__", ()):
+            if name != "__weakref__" and name not in names:
+                names.append(name)
+
+    return tuple(names)
+
 
 class TypeCollection:
     """Holds map of types"""
 
+    __slots__ = ()
+
     def __init__(self, *args, **kw):
         self.typesNameMap = {}
         self.typesList = []
@@ -50,11 +117,13 @@ class TypeCollection:
 class FieldCollection:
     """Holds list of fields"""
 
+    __slots__ = ()
+
     def __init__(self, *args, **kw):
         self.fieldsNameMap = {}
         self.fieldsList = []
 
-    def addField(self, field: Union["Field", "Group"]) -> None:
+    def addField(self, field: Union["Field", "Group", "Data"]) -> None:
         """add a new type"""
         if field.name in self.fieldsNameMap:
             raise DuplicateName(
@@ -67,9 +136,42 @@ class FieldCollection:
 
 class AsDictType:
 
+    __slots__ = ()
+
+    def attributes(self) -> dict:
+        """return attribute values, whether held in slots or __dict__"""
+        values = {
+            name: getattr(self, name)
+            for name in slotNames(self.__class__)
+            if hasattr(self, name)
+        }
+        values.update(getattr(self, "__dict__", ()))
+        return values
+
+    def __getstate__(self):
+        """weak references can not be pickled, store the parent itself"""
+        state = self.attributes()
+        if state.get("parentCollectionRef") is not None:
+            state["parentCollectionRef"] = state["parentCollectionRef"]()
+
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            if name == "parentCollectionRef" and value is not None:
+                value = weakref.ref(value)
+            elif name in INTERNED_ATTRIBUTES:
+                value = intern(value)
+
+            object.__setattr__(self, name, value)
+
     def as_dict(self):
         """for debugging, return dict represenation"""
-        d = self.__dict__.copy()
+        d = {
+            key: value
+            for key, value in self.attributes().items()
+            if key not in LINKED_ATTRIBUTES
+        }
         d["__class__"] = self.__class__.__name__
         if "typesNameMap" in d:
             d["typesNameMap"] = {
@@ -93,12 +195,31 @@ class AsDictType:
 
 
 class BaseType(AsDictType):
-    pass
+    __slots__ = ()
 
 
 class Type(BaseType):
     """A primitive Type"""
 
+    __slots__ = (
+        "name",
+        "description",
+        "presence",
+        "nullValue",
+        "minValue",
+        "maxValue",
+        "length",
+        "offset",
+        "semanticType",
+        "primitiveType",
+        "sinceVersion",
+        "deprecated",
+        "characterEncoding",
+        "valueRef",
+        "constValue",
+        "is_scalar",
+    )
+
     def __init__(
         self,
         name: [str],
@@ -115,9 +236,10 @@ class Type(BaseType):
         deprecated: Optional[int] = None,
         characterEncoding: Optional[str] = None,
         valueRef: Optional[str] = None,
+        constValue: Optional[str] = None,
     ) -> None:
         """initialize primitive type"""
-        self.name = name
+        self.name = intern(name)
         self.description = description
         self.presence = presence
         self.nullValue = nullValue
@@ -131,6 +253,7 @@ class Type(BaseType):
         self.deprecated = deprecated
         self.characterEncoding = characterEncoding
         self.valueRef = valueRef
+        self.constValue = constValue
 
         self.is_scalar = self.length == 1
 
@@ -150,6 +273,7 @@ def createType(
     deprecated: Optional[int] = None,
     characterEncoding: Optional[str] = None,
     valueRef: Optional[str] = None,
+    constValue: Optional[str] = None,
 ) -> Type:
     """create a new Type"""
     sbeType = Type(
@@ -167,14 +291,60 @@ def createType(
         deprecated=deprecated,
         characterEncoding=characterEncoding,
         valueRef=valueRef,
+        constValue=constValue,
     )
 
     return sbeType
 
 
+class PrimitiveType(Type):
+    """builtin primitive type, one immutable instance is shared by all schemas"""
+
+    __slots__ = ()
+
+    def __init__(self, name: str) -> None:
+        super().__init__(
+            name=name,
+            primitiveType=TYPE_PRIMITIVE_TYPE_MAP[name],
+            presence=PRESENCE.OPTIONAL,
+        )
+
+    def __setattr__(self, name, value):
+        # every attribute is assigned exactly once, by Type.__init__
+        if hasattr(self, name):
+            raise AttributeError(f"primitive type '{self.name}' is immutable")
+
+        super().__setattr__(name, value)
+
+    def __delattr__(self, name):
+        raise AttributeError(f"primitive type '{self.name}' is immutable")
+
+    def __reduce__(self):
+        """unpickle as the shared instance"""
+        return getPrimitiveType, (self.name,)
+
+
+PRIMITIVE_TYPES = {name: PrimitiveType(name) for name in PRIMITIVE_TYPE_LIST}
+
+
+def getPrimitiveType(name: str) -> PrimitiveType:
+    """return the shared builtin primitive type"""
+    return PRIMITIVE_TYPES[name]
+
+
 class Composite(BaseType, TypeCollection):
     """A composite type"""
 
+    __slots__ = (
+        "name",
+        "description",
+        "offset",
+        "semanticType",
+        "sinceVersion",
+        "deprecated",
+        "__weakref__",
+    ) + TYPE_COLLECTION_SLOTS
+
     def __init__(
         self,
         name: [str],
@@ -186,7 +356,7 @@ class Composite(BaseType, TypeCollection):
     ) -> None:
         """initialize composite type"""
         super().__init__()
-        self.name = name
+        self.name = intern(name)
         self.description = description
         self.offset = offset
         self.semanticType = semanticType
@@ -218,6 +388,8 @@ def createComposite(
 class Ref(BaseType):
     """A Ref Type"""
 
+    __slots__ = ("name", "offset", "sinceVersion", "deprecated", "type", "resolvedType")
+
     def __init__(
         self,
         name: [str],
@@ -227,11 +399,13 @@ class Ref(BaseType):
         deprecated: Optional[int] = None,
     ) -> None:
         """initialize Ref type"""
-        self.name = name
+        self.name = intern(name)
         self.offset = offset
         self.sinceVersion = sinceVersion
         self.deprecated = deprecated
-        self.type = type
+        self.type = intern(type)
+        # set by linker.linkSchema
+        self.resolvedType = None
 
 
 def createRef(
@@ -256,6 +430,19 @@ def createRef(
 class Set(BaseType):
     """A Set Type"""
 
+    __slots__ = (
+        "name",
+        "offset",
+        "sinceVersion",
+        "deprecated",
+        "description",
+        "encodingType",
+        "resolvedEncodingType",
+        "choice_name_map",
+        "choice_list",
+        "choice_values",
+    )
+
     def __init__(
         self,
         name: [str],
@@ -266,12 +453,14 @@ class Set(BaseType):
         deprecated: Optional[int] = None,
     ) -> None:
         """initialize Set type"""
-        self.name = name
+        self.name = intern(name)
         self.offset = offset
         self.sinceVersion = sinceVersion
         self.deprecated = deprecated
         self.description = description
-        self.encodingType = encodingType
+        self.encodingType = intern(encodingType)
+        # set by linker.linkSchema
+        self.resolvedEncodingType = None
 
         self.choice_name_map = {}
         self.choice_list = []
@@ -320,6 +509,8 @@ def createSet(
 class Choice(BaseType):
     """A Choice for a Set"""
 
+    __slots__ = ("name", "description", "sinceVersion", "deprecated", "value", "bitmap")
+
     def __init__(
         self,
         name: [str],
@@ -329,7 +520,7 @@ class Choice(BaseType):
         deprecated: Optional[int] = None,
     ) -> None:
         """initialize Choice type"""
-        self.name = name
+        self.name = intern(name)
         self.description = description
         self.sinceVersion = sinceVersion
         self.deprecated = deprecated
@@ -359,6 +550,20 @@ def createChoice(
 class Enum(BaseType, TypeCollection):
     """An Enum"""
 
+    __slots__ = (
+        "name",
+        "description",
+        "offset",
+        "semanticType",
+        "encodingType",
+        "resolvedEncodingType",
+        "sinceVersion",
+        "deprecated",
+        "valid_value_name_map",
+        "valid_value_list",
+        "__weakref__",
+    ) + TYPE_COLLECTION_SLOTS
+
     def __init__(
         self,
         name: [str],
@@ -371,11 +576,13 @@ class Enum(BaseType, TypeCollection):
     ) -> None:
         """initialize primitive type"""
         super().__init__()
-        self.name = name
+        self.name = intern(name)
         self.description = description
         self.offset = offset
         self.semanticType = semanticType
-        self.encodingType = encodingType
+        self.encodingType = intern(encodingType)
+        # set by linker.linkSchema
+        self.resolvedEncodingType = None
         self.sinceVersion = sinceVersion
         self.deprecated = deprecated
 
@@ -420,6 +627,8 @@ def createEnum(
 class ValidValue(BaseType):
     """An ValidValue for an Enum"""
 
+    __slots__ = ("name", "description", "sinceVersion", "deprecated", "value")
+
     def __init__(
         self,
         name: [str],
@@ -429,7 +638,7 @@ class ValidValue(BaseType):
         deprecated: Optional[int] = None,
     ) -> None:
         """initialize validValue type"""
-        self.name = name
+        self.name = intern(name)
         self.description = description
         self.sinceVersion = sinceVersion
         self.deprecated = deprecated
@@ -458,6 +667,17 @@ def createValidValue(
 class Message(AsDictType, FieldCollection):
     """A message"""
 
+    __slots__ = (
+        "name",
+        "message_id",
+        "blockLength",
+        "description",
+        "semanticType",
+        "sinceVersion",
+        "deprecated",
+        "layout",
+    ) + FIELD_COLLECTION_SLOTS
+
     def __init__(
         self,
         name: [str],
@@ -470,13 +690,15 @@ class Message(AsDictType, FieldCollection):
     ) -> None:
         """create a new Message"""
         super().__init__()
-        self.name = name
+        self.name = intern(name)
         self.message_id = message_id
         self.blockLength = blockLength
         self.description = description
         self.semanticType = semanticType
         self.sinceVersion = sinceVersion
         self.deprecated = deprecated
+        # set by layout.computeLayout
+        self.layout = None
 
 
 def createMessage(
@@ -504,6 +726,19 @@ def createMessage(
 class Field(AsDictType):
     """field specification"""
 
+    __slots__ = (
+        "name",
+        "field_id",
+        "field_type",
+        "resolvedType",
+        "description",
+        "offset",
+        "presence",
+        "sinceVersion",
+        "deprecated",
+        "valueRef",
+    )
+
     def __init__(
         self,
         name: [str],
@@ -517,15 +752,17 @@ class Field(AsDictType):
         valueRef: Optional[str] = None,
     ) -> None:
         """create a field"""
-        self.name = name
+        self.name = intern(name)
         self.field_id = field_id
-        self.field_type = field_type
+        self.field_type = intern(field_type)
         self.description = description
         self.offset = offset
         self.presence = presence
         self.sinceVersion = sinceVersion
         self.deprecated = deprecated
         self.valueRef = valueRef
+        # set by linker.linkSchema
+        self.resolvedType = None
 
     def validate(self, messageSchema: "MessageSchema") -> None:
         """validate field attributes"""
@@ -569,6 +806,18 @@ def createField(
 class Group(FieldCollection, AsDictType):
     """collection of fields in a group"""
 
+    __slots__ = (
+        "name",
+        "group_id",
+        "blockLength",
+        "description",
+        "semanticType",
+        "sinceVersion",
+        "deprecated",
+        "dimensionType",
+        "resolvedDimensionType",
+    ) + FIELD_COLLECTION_SLOTS
+
     def __init__(
         self,
         name: [str],
@@ -582,14 +831,16 @@ class Group(FieldCollection, AsDictType):
     ) -> None:
         """create a new Message"""
         super().__init__()
-        self.name = name
+        self.name = intern(name)
         self.group_id = group_id
         self.blockLength = blockLength
         self.description = description
         self.semanticType = semanticType
         self.sinceVersion = sinceVersion
         self.deprecated = deprecated
-        self.dimensionType = dimensionType
+        self.dimensionType = intern(dimensionType)
+        # set by linker.linkSchema
+        self.resolvedDimensionType = None
 
     def validate(self, messageSchema: "MessageSchema") -> None:
         """validate group attributes"""
@@ -626,3 +877,80 @@ def createGroup(
         dimensionType=dimensionType,
     )
     return group
+
+
+class Data(AsDictType):
+    """variable length data field"""
+
+    __slots__ = (
+        "name",
+        "data_id",
+        "data_type",
+        "resolvedType",
+        "description",
+        "semanticType",
+        "sinceVersion",
+        "deprecated",
+    )
+
+    def __init__(
+        self,
+        name: [str],
+        data_id: int,
+        data_type: [str],
+        description: Optional[str] = None,
+        semanticType: Optional[str] = None,
+        sinceVersion: Optional[int] = 0,
+        deprecated: Optional[int] = None,
+    ) -> None:
+        """create a data field"""
+        self.name = intern(name)
+        self.data_id = data_id
+        self.data_type = intern(data_type)
+        self.description = description
+        self.semanticType = semanticType
+        self.sinceVersion = sinceVersion
+        self.deprecated = deprecated
+        # set by linker.linkSchema
+        self.resolvedType = None
+
+    def validate(self, messageSchema: "MessageSchema") -> None:
+        """validate data attributes"""
+        # type must be an encoding composite with length and varData members
+        resolved_type = messageSchema.lookupName(self.data_type)
+        if not isinstance(resolved_type, Composite):
+            raise ValueError(
+                f"data '{self.name}' type '{self.data_type}' could not be resolved"
+                " to a composite"
+            )
+
+        for member in ("length", "varData"):
+            if member not in resolved_type.typesNameMap:
+                raise ValueError(
+                    f"data '{self.name}' type '{self.data_type}' is missing"
+                    f" member '{member}'"
+                )
+
+        return
+
+
+def createData(
+    name: [str],
+    data_id: int,
+    data_type: [str],
+    description: Optional[str] = None,
+    semanticType: Optional[str] = None,
+    sinceVersion: Optional[int] = 0,
+    deprecated: Optional[int] = None,
+) -> Data:
+    """create a new data field"""
+    data = Data(
+        name=name,
+        data_id=data_id,
+        data_type=data_type,
+        description=description,
+        semanticType=semanticType,
+        sinceVersion=sinceVersion,
+        deprecated=deprecated,
+    )
+    return data
@@ -28,13 +28,15 @@ setup(
         "Programming Language :: Python :: 3.6",
     ],
     description="Python implementation of Simple Binary Encoding",
+    entry_points={"console_scripts": ["pysbe-codegen=pysbe.pysbe:main"]},
+    extras_require={"numpy": ["numpy"]},
     install_requires=requirements,
     license="Apache Software License 2.0",
     long_description=readme + "\n\n" + history,
     include_package_data=True,
     keywords="pysbe",
     name="pysbe",
-    packages=find_packages(include=["pysbe"]),
+    packages=find_packages(include=["pysbe", "pysbe.*"]),
     setup_requires=setup_requirements,
     test_suite="tests",
     tests_require=test_requirements,
@@ -1,7 +1,25 @@
+import copy
 import os
 
 import pytest
 
+from pysbe.codec.compiler import compileSchema
+from pysbe.parser.fix_parser import SBESpecParser
+
+CAR_VALUES = {
+    "serialNumber": 1234,
+    "modelYear": 2013,
+    "available": 1,
+    "code": b"A",
+    "someNumbers": (1, 2, 3, 4, 5),
+    "vehicleCode": b"abcdef",
+    "extras": 0,
+    "engine": {"capacity": 2000, "numCylinders": 4, "manufacturerCode": b"123"},
+    "fuelFigures": [{"speed": 30, "mpg": 35.9}, {"speed": 55, "mpg": 49.0}],
+    "model": b"Civic",
+}
+
+
 @pytest.fixture
 def test_data_dir():
     """return path to test data directory"""
@@ -11,3 +29,40 @@ def test_data_dir():
         ),
         'data',
     )
+
+
+@pytest.fixture
+def schemaCodec(test_data_dir):
+    """codecs of car.xml, modules testing another schema override this"""
+    messageSchema = SBESpecParser().parseFile(os.path.join(test_data_dir, "car.xml"))
+    return compileSchema(messageSchema)
+
+
+@pytest.fixture
+def car_values():
+    """values of a car.xml Car message"""
+    return copy.deepcopy(CAR_VALUES)
+
+
+@pytest.fixture
+def encode_cars(schemaCodec, car_values):
+    """return a function encoding count car messages back to back
+
+    serial numbers run from 0 to count - 1, model maps a serial number to
+    its model, Civic when None
+    """
+
+    def encode(count, model=None):
+        codec = schemaCodec["Car"]
+        stream = bytearray()
+        for serialNumber in range(count):
+            values = dict(car_values, serialNumber=serialNumber)
+            if model is not None:
+                values["model"] = model(serialNumber)
+
+            buffer = bytearray(512)
+            stream += buffer[: codec.encode(buffer, 0, values)]
+
+        return bytes(stream)
+
+    return encode
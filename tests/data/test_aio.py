@@ -0,0 +1,145 @@
+"""test_aio.py - test codec.aio over loopback sockets"""
+import asyncio
+
+import pytest
+
+from pysbe.codec.aio import SBEProtocol, readMessages
+
+
+async def send(port, data, chunkSize=13):
+    """write data to the loopback port in small pieces, then close"""
+    _, writer = await asyncio.open_connection("127.0.0.1", port)
+    for position in range(0, len(data), chunkSize):
+        writer.write(data[position : position + chunkSize])
+        await writer.drain()
+
+    writer.close()
+    await writer.wait_closed()
+
+
+async def serve(protocolFactory, data, **kwargs):
+    """send data to a loopback server, return the protocol once it closed"""
+    protocols = []
+
+    def factory():
+        protocols.append(protocolFactory())
+        return protocols[-1]
+
+    loop = asyncio.get_running_loop()
+    server = await loop.create_server(factory, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        await send(port, data, **kwargs)
+        while not protocols:
+            await asyncio.sleep(0)
+
+        await protocols[0].wait_closed()
+
+    return protocols[0]
+
+
+class TestProtocol:
+
+    def test_sync_and_async_handlers(self, schemaCodec, encode_cars):
+        received = []
+
+        def sync(templateId, values):
+            received.append(("sync", values["serialNumber"], bytes(values["model"])))
+
+        async def slow(templateId, values):
+            await asyncio.sleep(0)
+            received.append(("async", values["serialNumber"], values["model"]))
+
+        handlers = [sync, slow]
+
+        def factory():
+            protocol = SBEProtocol(schemaCodec, default=sync)
+            protocol.addHandler("Car", handlers.pop())
+            return protocol
+
+        data = encode_cars(30)
+        asyncio.run(serve(factory, data))
+        assert received == [("async", number, b"Civic") for number in range(30)]
+
+        asyncio.run(serve(factory, data))
+        assert received[30:] == [("sync", number, b"Civic") for number in range(30)]
+
+    def test_flow_control(self, schemaCodec, encode_cars):
+        """reading pauses while async handlers lag and resumes once cleared"""
+        received = []
+        paused = []
+
+        async def handler(templateId, values):
+            paused.append(protocol.paused)
+            await asyncio.sleep(0.001)
+            received.append(values["serialNumber"])
+
+        protocol = SBEProtocol(schemaCodec, {1: handler}, maxQueued=4)
+        data = encode_cars(200)
+        asyncio.run(serve(lambda: protocol, data, chunkSize=4096))
+        assert received == list(range(200))
+        assert True in paused
+        assert not protocol.paused
+
+    def test_order_behind_active_handler(self, schemaCodec, encode_cars):
+        """a plain handler waits for the async handler the worker is running"""
+        received = []
+        data = encode_cars(2)
+        length = len(data) // 2
+
+        async def slow(templateId, values):
+            await asyncio.sleep(0.01)
+            received.append(values["serialNumber"])
+
+        def sync(templateId, values):
+            received.append(values["serialNumber"])
+
+        async def main():
+            protocol = SBEProtocol(schemaCodec, {1: slow})
+            protocol.connection_made(None)
+            protocol.data_received(data[:length])
+            # the worker takes the message off the queue and awaits slow
+            await asyncio.sleep(0)
+            assert protocol.queue.qsize() == 0
+            protocol.addHandler(1, sync)
+            protocol.data_received(data[length:])
+            protocol.connection_lost(None)
+            await protocol.wait_closed()
+
+        asyncio.run(main())
+        assert received == [0, 1]
+
+    def test_handler_error(self, schemaCodec, encode_cars):
+        async def handler(templateId, values):
+            raise RuntimeError("handler failed")
+
+        with pytest.raises(RuntimeError, match="handler failed"):
+            asyncio.run(
+                serve(
+                    lambda: SBEProtocol(schemaCodec, {1: handler}),
+                    encode_cars(5),
+                )
+            )
+
+    def test_read_messages(self, schemaCodec, encode_cars):
+        data = encode_cars(25)
+
+        async def main():
+            async def write(reader, writer):
+                writer.write(data)
+                await writer.drain()
+                writer.close()
+
+            server = await asyncio.start_server(write, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                numbers = [
+                    values["serialNumber"]
+                    async for _, values in readMessages(reader, schemaCodec, 100)
+                ]
+                writer.close()
+
+            return numbers
+
+        assert asyncio.run(main()) == list(range(25))
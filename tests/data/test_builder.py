@@ -1,8 +1,13 @@
 """test_builder.py - test schema.builder"""
+import os
+import pickle
+
 import pytest
 
+from pysbe.parser.fix_parser import SBESpecParser
 from pysbe.schema.builder import createMessageSchema
 from pysbe.schema.constants import BYTE_ORDER
+from pysbe.schema.types import PRIMITIVE_TYPES
 
 
 class TestBuilder:
@@ -44,3 +49,84 @@ class TestBuilder:
     def test_valid_byteOrder(self):
         """test valid byte order"""
         createMessageSchema(version=0, byteOrder=BYTE_ORDER.BIG_ENDIAN)
+
+
+class TestCompactSchema:
+
+    def test_shared_primitive_types(self):
+        first = createMessageSchema(version=0)
+        second = createMessageSchema(version=1)
+        assert first.lookupName("uint32") is second.lookupName("uint32")
+        assert first.lookupName("uint32") is PRIMITIVE_TYPES["uint32"]
+
+    def test_primitive_types_immutable(self):
+        uint8 = PRIMITIVE_TYPES["uint8"]
+        with pytest.raises(AttributeError):
+            uint8.nullValue = "0"
+        with pytest.raises(AttributeError):
+            del uint8.presence
+
+        assert uint8.nullValue is None
+
+    def test_slots(self, test_data_dir):
+        """schema nodes and layouts hold no per instance __dict__"""
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, "car.xml")
+        )
+        message = messageSchema.message_name_map["Car"]
+        engine = messageSchema.lookupName("Engine")
+        nodes = [
+            message,
+            message.fieldsNameMap["engine"],
+            message.fieldsNameMap["fuelFigures"],
+            message.fieldsNameMap["model"],
+            engine,
+            engine.typesNameMap["fuel"],
+            messageSchema.lookupName("Model"),
+            messageSchema.lookupName("OptionalExtras"),
+            message.layout,
+            message.layout.field("engine"),
+            message.layout.group("fuelFigures"),
+            message.layout.data("model"),
+        ]
+        for node in nodes:
+            assert not hasattr(node, "__dict__"), node
+
+        # weak references still link nested type collections to the schema
+        assert engine.lookupName("uint16") is PRIMITIVE_TYPES["uint16"]
+
+    def test_interned_names(self, test_data_dir):
+        filename = os.path.join(test_data_dir, "car.xml")
+        first = SBESpecParser().parseFile(filename)
+        second = SBESpecParser().parseFile(filename)
+        firstField = first.message_name_map["Car"].fieldsNameMap["engine"]
+        secondField = second.message_name_map["Car"].fieldsNameMap["engine"]
+        assert firstField is not secondField
+        assert firstField.name is secondField.name
+        assert firstField.field_type is secondField.field_type
+
+    def test_pickle(self, test_data_dir):
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, "car.xml")
+        )
+        loaded = pickle.loads(pickle.dumps(messageSchema))
+        assert loaded.lookupName("char") is PRIMITIVE_TYPES["char"]
+        engine = loaded.lookupName("Engine")
+        assert engine.lookupName("Car") is None
+        assert engine.lookupName("Model") is loaded.lookupName("Model")
+        assert loaded.message_name_map["Car"].layout.blockLength == 41
+        name = loaded.message_name_map["Car"].name
+        assert name is messageSchema.message_name_map["Car"].name
+
+    def test_as_dict(self, test_data_dir):
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, "car.xml")
+        )
+        engine = messageSchema.lookupName("Engine").as_dict()
+        assert engine["__class__"] == "Composite"
+        assert engine["name"] == "Engine"
+        assert engine["typesNameMap"]["fuel"]["constValue"] == "Petrol"
+        field = messageSchema.message_name_map["Car"].fieldsList[0].as_dict()
+        assert field["__class__"] == "Field"
+        assert field["field_type"] == "uint32"
+        assert "layout" in messageSchema.message_name_map["Car"].as_dict()
@@ -0,0 +1,91 @@
+"""test_cache.py - test the on-disk schema cache"""
+import os
+import shutil
+
+import pytest
+
+from pysbe import cache
+from pysbe.cache import SchemaCache
+
+
+@pytest.fixture
+def schema_file(test_data_dir, tmpdir, filename="car.xml"):
+    """copy of car.xml that tests may edit"""
+    path = str(tmpdir.join(filename))
+    shutil.copy(os.path.join(test_data_dir, filename), path)
+    return path
+
+
+class TestSchemaCache:
+
+    def test_load_schema(self, schema_file, tmpdir, monkeypatch):
+        """a cached schema is loaded without parsing xml"""
+        schemaCache = SchemaCache(str(tmpdir.join("cache")))
+        messageSchema = schemaCache.loadSchema(schema_file)
+        assert len(os.listdir(schemaCache.directory)) == 1
+
+        def fail(*args, **kw):
+            raise AssertionError("schema parsed again")
+
+        monkeypatch.setattr(cache.SBESpecParser, "parseFile", fail)
+        loaded = schemaCache.loadSchema(schema_file)
+        assert loaded is not messageSchema
+        layout = loaded.message_name_map["Car"].layout
+        assert layout.blockLength == 41
+        assert loaded.lookupName("Engine").lookupName("uint16") is not None
+
+    def test_load_codec(self, schema_file, tmpdir, monkeypatch):
+        """cached codecs are rebuilt from byte code, not generated again"""
+        schemaCache = SchemaCache(str(tmpdir.join("cache")))
+        first = schemaCache.loadCodec(schema_file)
+
+        def fail(*args, **kw):
+            raise AssertionError("codec generated again")
+
+        monkeypatch.setattr("pysbe.codec.compiler.generateMessage", fail)
+        second = schemaCache.loadCodec(schema_file)
+
+        values = {
+            "serialNumber": 1234,
+            "modelYear": 2013,
+            "available": 1,
+            "code": b"A",
+            "someNumbers": (1, 2, 3, 4, 5),
+            "vehicleCode": b"abcdef",
+            "extras": 0,
+            "engine": {"capacity": 1, "numCylinders": 4, "manufacturerCode": b"1"},
+            "model": b"Civic",
+        }
+        buffer = bytearray(128)
+        length = first["Car"].encode(buffer, 0, values)
+        assert second.messageLength(buffer) == length
+        assert second.wrap(buffer).modelText == "Civic"
+
+    def test_content_hash(self, schema_file, tmpdir):
+        """an edited schema gets a new entry"""
+        schemaCache = SchemaCache(str(tmpdir.join("cache")))
+        schemaCache.loadSchema(schema_file)
+        with open(schema_file, "a") as schema:
+            schema.write("\n<!-- edited -->\n")
+
+        schemaCache.loadSchema(schema_file)
+        assert len(os.listdir(schemaCache.directory)) == 2
+
+    def test_corrupt_entry(self, schema_file, tmpdir):
+        """an unreadable entry is rebuilt"""
+        schemaCache = SchemaCache(str(tmpdir.join("cache")))
+        schemaCache.loadSchema(schema_file)
+        (entry,) = os.listdir(schemaCache.directory)
+        with open(os.path.join(schemaCache.directory, entry), "wb") as cacheFile:
+            cacheFile.write(b"truncated")
+
+        messageSchema = schemaCache.loadSchema(schema_file)
+        assert "Car" in messageSchema.message_name_map
+
+    def test_pysbe_changed(self, schema_file, tmpdir, monkeypatch):
+        """entries written by other pysbe sources are not loaded"""
+        schemaCache = SchemaCache(str(tmpdir.join("cache")))
+        schemaCache.loadSchema(schema_file)
+        monkeypatch.setattr(cache, "sourceDigest", lambda: "edited")
+        schemaCache.loadSchema(schema_file)
+        assert len(os.listdir(schemaCache.directory)) == 2
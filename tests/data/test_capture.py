@@ -0,0 +1,148 @@
+"""test_capture.py - test codec.capture"""
+import io
+import os
+import pickle
+import struct
+
+import pytest
+
+from pysbe.codec import capture
+from pysbe.codec.capture import CaptureReader
+from pysbe.codec.compiler import compileSchema
+from pysbe.parser.fix_parser import SBESpecParser
+
+CAPTURE_SCHEMA = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sbe:messageSchema xmlns:sbe="http://fixprotocol.io/2016/sbe" id="7" version="0">
+    <types>
+        <composite name="messageHeader">
+            <type name="blockLength" primitiveType="uint16"/>
+            <type name="templateId" primitiveType="uint16"/>
+            <type name="schemaId" primitiveType="uint16"/>
+            <type name="version" primitiveType="uint16"/>
+        </composite>
+        <composite name="groupSizeEncoding">
+            <type name="blockLength" primitiveType="uint16"/>
+            <type name="numInGroup" primitiveType="uint16"/>
+        </composite>
+        <composite name="varDataEncoding">
+            <type name="length" primitiveType="uint16"/>
+            <type name="varData" primitiveType="uint8" length="0"/>
+        </composite>
+    </types>
+    <sbe:message name="Tick" id="1">
+        <field name="price" id="1" type="int64"/>
+    </sbe:message>
+    <sbe:message name="Trade" id="3">
+        <field name="tradeId" id="1" type="uint32"/>
+        <group name="fills" id="2">
+            <field name="qty" id="3" type="uint32"/>
+        </group>
+        <data name="venue" id="4" type="varDataEncoding"/>
+    </sbe:message>
+</sbe:messageSchema>
+"""
+
+
+@pytest.fixture
+def schemaCodec():
+    return compileSchema(SBESpecParser().parseFile(io.BytesIO(CAPTURE_SCHEMA)))
+
+
+def write_capture(schemaCodec, filename, count=30, lengthPrefix=None):
+    """every third message is a Trade with tradeId its position"""
+    with open(filename, "wb") as captureFile:
+        for number in range(count):
+            buffer = bytearray(128)
+            if number % 3 == 2:
+                values = {
+                    "tradeId": number,
+                    "fills": [{"qty": qty} for qty in range(number % 4)],
+                    "venue": b"XLON",
+                }
+                length = schemaCodec["Trade"].encode(buffer, 0, values)
+            else:
+                length = schemaCodec["Tick"].encode(buffer, 0, {"price": number})
+
+            if lengthPrefix:
+                captureFile.write(struct.pack(lengthPrefix, length))
+
+            captureFile.write(buffer[:length])
+
+
+class TestCapture:
+
+    @pytest.mark.parametrize("lengthPrefix", [None, "<I"])
+    def test_random_access(self, schemaCodec, tmp_path, lengthPrefix):
+        filename = str(tmp_path / "capture.sbe")
+        write_capture(schemaCodec, filename, lengthPrefix=lengthPrefix)
+        with CaptureReader(filename, schemaCodec, lengthPrefix) as reader:
+            assert len(reader) == 30
+            assert reader.counts == {1: 20, 3: 10}
+            assert reader[4].price == 4
+            first = reader[0]
+            assert reader[1] is not first and first.price == 0
+            assert reader[29].tradeId == 29
+            assert reader.decode(8)[1]["venue"] == b"XLON"
+            assert reader.positions(3) == list(range(2, 30, 3))
+            assert [trade.tradeId for trade in reader.messages(3)] == list(
+                range(2, 30, 3)
+            )
+            assert len(list(reader)) == 30
+
+        assert os.path.exists(filename + ".sbeidx")
+
+    def test_persisted_index(self, schemaCodec, tmp_path, monkeypatch):
+        filename = str(tmp_path / "capture.sbe")
+        write_capture(schemaCodec, filename)
+        CaptureReader(filename, schemaCodec).close()
+
+        def fail(self, key):
+            raise AssertionError("index rebuilt")
+
+        with monkeypatch.context() as patch:
+            patch.setattr(CaptureReader, "buildIndex", fail)
+            with CaptureReader(filename, schemaCodec) as reader:
+                assert len(reader) == 30
+
+        # a capture that changed is indexed again
+        write_capture(schemaCodec, filename, count=31)
+        with CaptureReader(filename, schemaCodec) as reader:
+            assert len(reader) == 31
+            assert capture.readIndex(filename + ".sbeidx", reader.index.key)
+
+        with open(filename + ".sbeidx", "rb") as indexFile:
+            assert indexFile.read(8) == b"PYSBEIDX"
+
+    def test_invalid_index(self, schemaCodec, tmp_path):
+        """an index of the wrong shape is rebuilt, never loaded"""
+        filename = str(tmp_path / "capture.sbe")
+        write_capture(schemaCodec, filename)
+        with CaptureReader(filename, schemaCodec) as reader:
+            key = reader.index.key
+
+        indexFilename = filename + ".sbeidx"
+        with open(indexFilename, "rb") as indexFile:
+            content = indexFile.read()
+
+        for invalid in (content[:-1], content + b"\0", pickle.dumps(key)):
+            with open(indexFilename, "wb") as indexFile:
+                indexFile.write(invalid)
+
+            assert capture.readIndex(indexFilename, key) is None
+
+        with CaptureReader(filename, schemaCodec) as reader:
+            assert len(reader) == 30
+
+    def test_partial_message(self, schemaCodec, tmp_path):
+        """a capture still being written ends with part of a message"""
+        filename = str(tmp_path / "capture.sbe")
+        write_capture(schemaCodec, filename, count=3)
+        with open(filename, "r+b") as captureFile:
+            captureFile.truncate(os.path.getsize(filename) - 2)
+
+        with CaptureReader(filename, schemaCodec) as reader:
+            assert reader.counts == {1: 2}
+
+        open(filename, "wb").close()
+        with CaptureReader(filename, schemaCodec) as reader:
+            assert len(reader) == 0
@@ -0,0 +1,195 @@
+"""test_columns.py - test columnar batch decoding"""
+import array
+import io
+import os
+import struct
+
+import pytest
+
+from pysbe.codec.columns import decodeColumns
+from pysbe.codec.compiler import compileSchema
+from pysbe.parser.fix_parser import SBESpecParser
+
+VERSIONED_SCHEMA = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sbe:messageSchema xmlns:sbe="http://fixprotocol.io/2016/sbe" id="1" version="2">
+    <types>
+        <composite name="messageHeader">
+            <type name="blockLength" primitiveType="uint16"/>
+            <type name="templateId" primitiveType="uint16"/>
+            <type name="schemaId" primitiveType="uint16"/>
+            <type name="version" primitiveType="uint16"/>
+        </composite>
+    </types>
+    <sbe:message name="Trade" id="1">
+        <field name="tradeId" id="1" type="uint32"/>
+        <field name="price" id="2" type="int64" presence="optional"
+            sinceVersion="1"/>
+        <field name="qty" id="3" type="uint16" presence="optional"
+            sinceVersion="2"/>
+    </sbe:message>
+</sbe:messageSchema>
+"""
+
+
+def new_order(index):
+    """NewOrderSingle values for message number index"""
+    return {
+        "ClOrdID": b"ORD%05d" % index,
+        "Account": b"ACCT0000",
+        "Symbol": b"GEM40000",
+        "Side": b"1",
+        "TransactTime": 1000 + index,
+        "OrderQty": {"mantissa": index},
+        "OrdType": b"2",
+        "Price": {"mantissa": 99250 + index},
+        "StopPx": {},
+    }
+
+
+@pytest.fixture
+def schemaCodec(test_data_dir, filename="basic_sample1.xml"):
+    """compiled codecs for basic_sample1.xml"""
+    sbe = SBESpecParser()
+    messageSchema = sbe.parseFile(os.path.join(test_data_dir, filename))
+    return compileSchema(messageSchema)
+
+
+@pytest.fixture
+def buffer(schemaCodec):
+    """five consecutive NewOrderSingle messages"""
+    codec = schemaCodec["NewOrderSingle"]
+    buffer = bytearray(62 * 5)
+    for index in range(5):
+        codec.encode(buffer, 62 * index, new_order(index))
+
+    return buffer
+
+
+class TestColumns:
+
+    def test_fixed_size_run(self, schemaCodec, buffer):
+        """selected fields of consecutive messages become arrays"""
+        columns = decodeColumns(
+            schemaCodec,
+            99,
+            buffer,
+            fields=["TransactTime", "Price", "ClOrdID"],
+            asNumpy=False,
+        )
+        assert list(columns) == ["TransactTime", "Price.mantissa", "ClOrdID"]
+        assert columns["TransactTime"] == array.array("Q", range(1000, 1005))
+        assert columns["Price.mantissa"] == array.array("q", range(99250, 99255))
+        assert columns["ClOrdID"][4] == b"ORD00004"
+
+    def test_walk_other_lengths(self, schemaCodec, buffer):
+        """a run broken by a message of another length is walked"""
+        # a message from a newer version with a longer root block
+        longer = bytearray(8 + 60)
+        schemaCodec["NewOrderSingle"].encode(longer, 0, new_order(7))
+        struct.pack_into("<H", longer, 0, 60)
+
+        source = bytes(buffer[:124]) + bytes(longer) + bytes(buffer[124:])
+        columns = decodeColumns(
+            schemaCodec, "NewOrderSingle", source, ["TransactTime"], asNumpy=False
+        )
+        assert list(columns["TransactTime"]) == [1000, 1001, 1007, 1002, 1003, 1004]
+
+    def test_iterable_source(self, schemaCodec, buffer):
+        """an iterable of framed messages is accepted"""
+        messages = list(buffer_messages(memoryview(buffer)))
+        columns = decodeColumns(
+            schemaCodec, 99, messages, ["OrderQty.mantissa"], asNumpy=False
+        )
+        assert list(columns["OrderQty.mantissa"]) == [0, 1, 2, 3, 4]
+
+    def test_older_versions(self):
+        """fields an older message version does not carry are null"""
+        schemaCodec = compileSchema(
+            SBESpecParser().parseFile(io.BytesIO(VERSIONED_SCHEMA))
+        )
+        messages = [
+            struct.pack("<4HIqH", 14, 1, 1, 2, 1, 10, 5),
+            # version 0 ends after tradeId
+            struct.pack("<4HI", 4, 1, 1, 0, 2),
+            # version 1 padded to the current blockLength
+            struct.pack("<4HIqH", 14, 1, 1, 1, 3, 30, 7),
+            struct.pack("<4HIqH", 14, 1, 1, 2, 4, 40, 8),
+        ]
+        expected = {
+            "tradeId": [1, 2, 3, 4],
+            "price": [10, -(2**63), 30, 40],
+            "qty": [5, 0xFFFF, 0xFFFF, 8],
+        }
+        for source in (b"".join(messages), messages):
+            columns = decodeColumns(schemaCodec, "Trade", source, asNumpy=False)
+            assert {name: list(values) for name, values in columns.items()} == (
+                expected
+            )
+
+        # a run of equal length messages still checks their version
+        columns = decodeColumns(
+            schemaCodec, "Trade", b"".join(messages[2:]), ["qty"], asNumpy=False
+        )
+        assert list(columns["qty"]) == [0xFFFF, 8]
+
+    def test_unknown_field(self, schemaCodec, buffer):
+        """selecting a missing field raises KeyError"""
+        with pytest.raises(KeyError):
+            decodeColumns(schemaCodec, 99, buffer, ["Missing"], asNumpy=False)
+
+    def test_variable_length(self, test_data_dir, filename="car.xml"):
+        """messages with groups and data are measured, not decoded"""
+        sbe = SBESpecParser()
+        messageSchema = sbe.parseFile(os.path.join(test_data_dir, filename))
+        schemaCodec = compileSchema(messageSchema)
+        codec = schemaCodec["Car"]
+        buffer = bytearray(1024)
+        offset = 0
+        for year in (2010, 2011, 2012):
+            offset += codec.encode(
+                buffer,
+                offset,
+                {
+                    "serialNumber": 1234,
+                    "modelYear": year,
+                    "available": 1,
+                    "code": b"A",
+                    "someNumbers": (1, 2, 3, 4, 5),
+                    "vehicleCode": b"abcdef",
+                    "extras": 0,
+                    "engine": {
+                        "capacity": 2000,
+                        "numCylinders": 4,
+                        "manufacturerCode": b"123",
+                    },
+                    "fuelFigures": [{"speed": 30, "mpg": 35.5}] * (year - 2009),
+                    "model": b"x" * (year - 2000),
+                },
+            )
+
+        columns = decodeColumns(
+            schemaCodec,
+            "Car",
+            memoryview(buffer)[:offset],
+            ["modelYear", "someNumbers"],
+            asNumpy=False,
+        )
+        assert list(columns["modelYear"]) == [2010, 2011, 2012]
+        assert columns["someNumbers"] == [(1, 2, 3, 4, 5)] * 3
+
+    def test_numpy(self, schemaCodec, buffer):
+        """columns are numpy arrays when numpy is installed"""
+        np = pytest.importorskip("numpy")
+        columns = decodeColumns(schemaCodec, 99, buffer, ["TransactTime", "Symbol"])
+        assert isinstance(columns["TransactTime"], np.ndarray)
+        assert columns["TransactTime"].sum() == 5010
+        assert columns["Symbol"].dtype == np.dtype("S8")
+
+        walked = decodeColumns(schemaCodec, 99, buffer_messages(buffer))
+        assert list(walked["Price.mantissa"]) == list(range(99250, 99255))
+
+
+def buffer_messages(buffer, length=62):
+    """split buffer into single message buffers"""
+    for offset in range(0, len(buffer), length):
+        yield buffer[offset:offset + length]
@@ -0,0 +1,172 @@
+"""test_compiler.py - test codec.compiler"""
+import io
+import os
+import struct
+
+from pysbe.codec.compiler import compileSchema
+from pysbe.parser.fix_parser import SBESpecParser
+
+BIG_ENDIAN_SCHEMA = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sbe:messageSchema xmlns:sbe="http://fixprotocol.io/2016/sbe" version="0"
+    byteOrder="bigEndian">
+    <types>
+        <composite name="messageHeader">
+            <type name="blockLength" primitiveType="uint16"/>
+            <type name="templateId" primitiveType="uint16"/>
+            <type name="schemaId" primitiveType="uint16"/>
+            <type name="version" primitiveType="uint16"/>
+        </composite>
+        <type name="Prices" primitiveType="int32" length="3"/>
+    </types>
+    <sbe:message name="Quote" id="1">
+        <field name="quoteId" id="1" type="uint32"/>
+        <field name="prices" id="2" type="Prices"/>
+        <field name="size" id="3" type="double" offset="20"/>
+    </sbe:message>
+</sbe:messageSchema>
+"""
+
+VERSIONED_SCHEMA = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sbe:messageSchema xmlns:sbe="http://fixprotocol.io/2016/sbe" id="1" version="2">
+    <types>
+        <composite name="messageHeader">
+            <type name="blockLength" primitiveType="uint16"/>
+            <type name="templateId" primitiveType="uint16"/>
+            <type name="schemaId" primitiveType="uint16"/>
+            <type name="version" primitiveType="uint16"/>
+        </composite>
+        <composite name="groupSizeEncoding">
+            <type name="blockLength" primitiveType="uint16"/>
+            <type name="numInGroup" primitiveType="uint16"/>
+        </composite>
+        <composite name="varDataEncoding">
+            <type name="length" primitiveType="uint16"/>
+            <type name="varData" primitiveType="uint8" length="0"/>
+        </composite>
+    </types>
+    <sbe:message name="Trade" id="1">
+        <field name="tradeId" id="1" type="uint32"/>
+        <field name="price" id="2" type="int64" presence="optional"
+            sinceVersion="1"/>
+        <field name="qty" id="3" type="uint16" presence="optional"
+            sinceVersion="2"/>
+        <group name="fills" id="4" sinceVersion="2">
+            <field name="px" id="5" type="uint32"/>
+        </group>
+        <data name="note" id="6" type="varDataEncoding" sinceVersion="1"/>
+    </sbe:message>
+</sbe:messageSchema>
+"""
+
+
+class TestCompiler:
+
+    def test_decode_root_block(self, test_data_dir, filename="basic_sample1.xml"):
+        """decode NewOrderSingle with a single unpack"""
+        sbe = SBESpecParser()
+        messageSchema = sbe.parseFile(os.path.join(test_data_dir, filename))
+        codec = compileSchema(messageSchema)["NewOrderSingle"]
+
+        assert codec.blockStruct.size == 54
+        buffer = bytearray(60)
+        struct.pack_into(
+            "<8s8s8scQicqq",
+            buffer,
+            3,
+            b"ORD00001",
+            b"ACCT",
+            b"GEM4",
+            b"1",
+            1234567890,
+            7,
+            b"2",
+            99250,
+            -1,
+        )
+        assert codec.decode(buffer, 3) == {
+            "ClOrdID": b"ORD00001",
+            "Account": b"ACCT\x00\x00\x00\x00",
+            "Symbol": b"GEM4\x00\x00\x00\x00",
+            "Side": b"1",
+            "TransactTime": 1234567890,
+            "OrderQty": {"mantissa": 7, "exponent": 0},
+            "OrdType": b"2",
+            "Price": {"mantissa": 99250, "exponent": -3},
+            "StopPx": {"mantissa": -1, "exponent": -3},
+        }
+
+    def test_constant_value_ref(
+        self, test_data_dir, filename="fix-message-samples.xml"
+    ):
+        """field level constant resolves through valueRef"""
+        sbe = SBESpecParser()
+        messageSchema = sbe.parseFile(os.path.join(test_data_dir, filename))
+        codec = compileSchema(messageSchema)["MarketDataIncrementalRefreshTrades"]
+        group = codec.layout.group("MdIncGrp")
+
+        assert group.field("MdEntryType").constValue == "2"
+
+    def test_big_endian(self):
+        """byteOrder selects struct prefix, arrays and padding decode"""
+        messageSchema = SBESpecParser().parseFile(io.BytesIO(BIG_ENDIAN_SCHEMA))
+        codec = compileSchema(messageSchema)["Quote"]
+
+        assert codec.blockStruct.format == ">I3i4xd"
+        buffer = struct.pack(">I3i4xd", 42, 1, -2, 3, 2.5)
+        assert codec.decode(buffer) == {
+            "quoteId": 42,
+            "prices": (1, -2, 3),
+            "size": 2.5,
+        }
+
+    def test_older_version(self):
+        """fields added after the header version decode as null"""
+        schemaCodec = compileSchema(
+            SBESpecParser().parseFile(io.BytesIO(VERSIONED_SCHEMA))
+        )
+        # version 0 ends after tradeId, reading further would fail
+        buffer = struct.pack("<4HI", 4, 1, 1, 0, 7)
+        assert schemaCodec.decode(buffer) == (
+            1,
+            {"tradeId": 7, "price": -(2**63), "qty": 0xFFFF, "note": b""},
+        )
+        assert schemaCodec.messageLength(buffer) == len(buffer)
+
+        buffer = struct.pack("<4HIqH2s", 12, 1, 1, 1, 7, -5, 2, b"hi")
+        templateId, values = schemaCodec.decode(buffer)
+        assert (values["price"], values["qty"], values["note"]) == (-5, 0xFFFF, b"hi")
+        assert schemaCodec.messageLength(buffer) == len(buffer)
+        assert schemaCodec.versionCodec(1, 1) is schemaCodec.versionCodec(1, 1)
+        assert schemaCodec.versionCodec(1, 2)[0] is schemaCodec["Trade"].decode
+
+    def test_newer_version(self):
+        """a longer root block of a newer version is skipped"""
+        schemaCodec = compileSchema(
+            SBESpecParser().parseFile(io.BytesIO(VERSIONED_SCHEMA))
+        )
+        buffer = struct.pack(
+            "<4HIqH6x2HIH2s", 20, 1, 1, 3, 7, -5, 3, 4, 1, 99, 2, b"hi"
+        )
+        templateId, values = schemaCodec.decode(buffer)
+        assert values == {"tradeId": 7, "price": -5, "qty": 3, "note": b"hi"}
+        assert schemaCodec.messageLength(buffer) == len(buffer)
+
+    def test_version_flyweights(self):
+        """flyweights follow the header version and blockLength"""
+        schemaCodec = compileSchema(
+            SBESpecParser().parseFile(io.BytesIO(VERSIONED_SCHEMA))
+        )
+        trade = schemaCodec.wrap(struct.pack("<4HI", 4, 1, 1, 0, 7))
+        assert (trade.tradeId, trade.price, trade.qty) == (7, -(2**63), 0xFFFF)
+        assert (len(trade.fills), trade.note) == (0, b"")
+
+        trade = schemaCodec.wrap(struct.pack("<4HIqH2s", 12, 1, 1, 1, 7, -5, 2, b"hi"))
+        assert (trade.price, trade.qty, bytes(trade.note)) == (-5, 0xFFFF, b"hi")
+        assert list(trade.fills) == []
+
+        buffer = struct.pack(
+            "<4HIqH6x2HIH2s", 20, 1, 1, 3, 7, -5, 3, 4, 1, 99, 2, b"hi"
+        )
+        trade = schemaCodec.wrap(buffer)
+        assert [fill.px for fill in trade.fills] == [99]
+        assert (trade.qty, bytes(trade.note)) == (3, b"hi")
@@ -0,0 +1,94 @@
+"""test_cursor.py - test lazy repeating group cursors"""
+import struct
+
+import pytest
+
+CAR = {
+    "serialNumber": 1234,
+    "modelYear": 2013,
+    "available": 1,
+    "code": b"A",
+    "someNumbers": (0, 1, 2, 3, 4),
+    "vehicleCode": b"abcdef",
+    "extras": 0,
+    "engine": {"capacity": 2000, "numCylinders": 4, "manufacturerCode": b"123"},
+    "fuelFigures": [
+        {"speed": 30, "mpg": 35.5},
+        {"speed": 55, "mpg": 49.0},
+        {"speed": 75, "mpg": 40.0},
+    ],
+    "performanceFigures": [
+        {
+            "octaneRating": 95,
+            "acceleration": [{"mph": 30, "seconds": 4.0}, {"mph": 60, "seconds": 7.5}],
+        },
+        {"octaneRating": 99, "acceleration": []},
+        {"octaneRating": 97, "acceleration": [{"mph": 100, "seconds": 12.0}]},
+    ],
+    "manufacturer": "Honda",
+    "model": "Civic VTi",
+}
+
+
+@pytest.fixture
+def car(schemaCodec):
+    """flyweight decoder wrapping an encoded Car"""
+    buffer = bytearray(256)
+    schemaCodec["Car"].encode(buffer, 0, CAR)
+    return schemaCodec.wrap(buffer)
+
+
+class TestCursor:
+
+    def test_iterate(self, car):
+        """entries are read through the cursor"""
+        fuelFigures = car.fuelFigures
+        assert len(fuelFigures) == fuelFigures.count == 3
+        assert [(entry.speed, entry.mpg) for entry in fuelFigures] == [
+            (30, 35.5),
+            (55, 49.0),
+            (75, 40.0),
+        ]
+
+    def test_cursor_reused(self, car):
+        """the cursor is the entry flyweight, nothing is allocated per entry"""
+        fuelFigures = car.fuelFigures
+        assert all(entry is fuelFigures for entry in fuelFigures)
+        assert car.fuelFigures is fuelFigures
+
+    def test_nested(self, car):
+        """nested groups are walked from their parent entry"""
+        figures = [
+            (entry.octaneRating, [(a.mph, a.seconds) for a in entry.acceleration])
+            for entry in car.performanceFigures
+        ]
+        assert figures == [
+            (95, [(30, 4.0), (60, 7.5)]),
+            (99, []),
+            (97, [(100, 12.0)]),
+        ]
+
+    def test_skip_nested(self, car):
+        """entries are found without reading nested groups"""
+        assert [entry.octaneRating for entry in car.performanceFigures] == [
+            95,
+            99,
+            97,
+        ]
+        assert car.modelText == "Civic VTi"
+
+    def test_wire_block_length(self, schemaCodec):
+        """the entry stride is the blockLength in the dimension header"""
+        codec = schemaCodec["Car"]
+        buffer = bytearray(8 + codec.blockLength)
+        struct.pack_into("<HHHH", buffer, 0, codec.blockLength, 1, 1, 1)
+        # two fuelFigures entries padded to 10 bytes by a newer schema
+        buffer += struct.pack("<HH", 10, 2)
+        buffer += struct.pack("<Hf4x", 30, 35.5) + struct.pack("<Hf4x", 55, 49.0)
+        buffer += struct.pack("<HH", 1, 0)
+        buffer += struct.pack("<I", 5) + b"Honda" + struct.pack("<I", 0)
+
+        car = schemaCodec.wrap(buffer)
+        assert [entry.speed for entry in car.fuelFigures] == [30, 55]
+        assert car.manufacturerText == "Honda"
+        assert schemaCodec.messageLength(buffer) == len(buffer)
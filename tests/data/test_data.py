@@ -0,0 +1,114 @@
+"""test_data.py - test variable length data"""
+import io
+import os
+
+import pytest
+
+from pysbe.codec.compiler import compileSchema
+from pysbe.parser.fix_parser import SBESpecParser
+from pysbe.schema.exceptions import InvalidLayout
+from pysbe.schema.types import Data
+
+CAR = {
+    "serialNumber": 1234,
+    "modelYear": 2013,
+    "available": 1,
+    "code": b"A",
+    "someNumbers": (0, 1, 2, 3, 4),
+    "vehicleCode": b"abcdef",
+    "extras": 6,
+    "engine": {"capacity": 2000, "numCylinders": 4, "manufacturerCode": b"123"},
+    "fuelFigures": [{"speed": 30, "mpg": 35.5}, {"speed": 55, "mpg": 49.0}],
+    "performanceFigures": [
+        {"octaneRating": 95, "acceleration": [{"mph": 30, "seconds": 4.0}]},
+        {"octaneRating": 99, "acceleration": []},
+    ],
+    "manufacturer": "Honda",
+    "model": b"Civic VTi",
+}
+
+FIELD_AFTER_DATA = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sbe:messageSchema xmlns:sbe="http://fixprotocol.io/2016/sbe" version="0">
+    <types>
+        <composite name="messageHeader">
+            <type name="blockLength" primitiveType="uint16"/>
+            <type name="templateId" primitiveType="uint16"/>
+            <type name="schemaId" primitiveType="uint16"/>
+            <type name="version" primitiveType="uint16"/>
+        </composite>
+        <composite name="varDataEncoding">
+            <type name="length" primitiveType="uint8"/>
+            <type name="varData" primitiveType="uint8" length="0"/>
+        </composite>
+    </types>
+    <sbe:message name="Broken" id="1">
+        <data name="blob" id="1" type="varDataEncoding"/>
+        <field name="a" id="2" type="uint32"/>
+    </sbe:message>
+</sbe:messageSchema>
+"""
+
+
+class TestData:
+
+    def test_parse_data(self, schemaCodec):
+        """data elements are parsed and laid out after the groups"""
+        message = schemaCodec.messageSchema.message_name_map["Car"]
+        assert isinstance(message.fieldsNameMap["manufacturer"], Data)
+
+        layout = message.layout
+        assert [data.name for data in layout.varData] == ["manufacturer", "model"]
+        manufacturer = layout.data("manufacturer")
+        assert manufacturer.headerLength == 4
+        assert manufacturer.characterEncoding == "ISO-8859-1"
+
+    def test_field_after_data(self):
+        """fields may not follow variable length data"""
+        with pytest.raises(InvalidLayout, match="'a' in 'Broken'"):
+            SBESpecParser().parseFile(io.BytesIO(FIELD_AFTER_DATA))
+
+    def test_round_trip(self, schemaCodec):
+        """data is decoded as memoryview slices after the groups"""
+        codec = schemaCodec["Car"]
+        buffer = bytearray(256)
+        written = codec.encode(buffer, 0, CAR)
+        assert schemaCodec.messageLength(buffer) == written
+
+        values = codec.decode(buffer, 8)
+        assert isinstance(values["manufacturer"], memoryview)
+        assert values["manufacturer"] == b"Honda"
+        assert values["model"] == b"Civic VTi"
+        assert values["serialNumber"] == 1234
+        assert buffer[written - 9:written] == b"Civic VTi"
+
+    def test_flyweight(self, schemaCodec):
+        """flyweight data is zero copy, text is decoded on demand"""
+        codec = schemaCodec["Car"]
+        buffer = bytearray(256)
+        codec.encode(buffer, 0, CAR)
+
+        decoder = schemaCodec.wrap(memoryview(buffer))
+        model = decoder.model
+        assert isinstance(model, memoryview)
+        assert model.obj is buffer
+        assert model == b"Civic VTi"
+        assert decoder.manufacturerText == "Honda"
+        assert decoder.modelText == "Civic VTi"
+
+    def test_examples_text(self, test_data_dir, filename="Examples.xml"):
+        """data without a characterEncoding has no text property"""
+        sbe = SBESpecParser()
+        messageSchema = sbe.parseFile(os.path.join(test_data_dir, filename))
+        codec = compileSchema(messageSchema)["BusinessMessageReject"]
+        assert not hasattr(codec.Decoder, "TextText")
+
+        buffer = bytearray(64)
+        values = {
+            "BusinesRejectRefId": b"REF00001",
+            "BusinessRejectReason": 2,
+            "Text": b"unknown security",
+        }
+        written = codec.encode(buffer, 0, values)
+        decoder = codec.Decoder(buffer, 8)
+        assert written == 8 + codec.blockLength + 2 + 16
+        assert decoder.Text == b"unknown security"
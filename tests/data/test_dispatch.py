@@ -0,0 +1,150 @@
+"""test_dispatch.py - test templateId dispatch"""
+import io
+import os
+import threading
+import time
+
+import pytest
+
+from pysbe.codec.compiler import compileSchema, dispatchTable
+from pysbe.parser.fix_parser import SBESpecParser
+from pysbe.schema.exceptions import DuplicateId, UnknownTemplateId
+
+DUPLICATE_ID_SCHEMA = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sbe:messageSchema xmlns:sbe="http://fixprotocol.io/2016/sbe" version="0">
+    <types>
+        <composite name="messageHeader">
+            <type name="blockLength" primitiveType="uint16"/>
+            <type name="templateId" primitiveType="uint16"/>
+            <type name="schemaId" primitiveType="uint16"/>
+            <type name="version" primitiveType="uint16"/>
+        </composite>
+    </types>
+    <sbe:message name="First" id="1">
+        <field name="a" id="1" type="uint32"/>
+    </sbe:message>
+    <sbe:message name="Second" id="1">
+        <field name="b" id="1" type="uint32"/>
+    </sbe:message>
+</sbe:messageSchema>
+"""
+
+
+@pytest.fixture
+def schemaCodec(test_data_dir, filename="fix-message-samples.xml"):
+    """compiled codecs for a schema with several messages"""
+    sbe = SBESpecParser()
+    messageSchema = sbe.parseFile(os.path.join(test_data_dir, filename))
+    return compileSchema(messageSchema)
+
+
+class TestDispatch:
+
+    def test_message_id_map(self, schemaCodec):
+        """messages are indexed by templateId"""
+        messageSchema = schemaCodec.messageSchema
+        assert sorted(messageSchema.message_id_map) == [2, 68, 70, 71, 88, 105]
+        assert messageSchema.getMessageById(70).name == "OrderCancelRequest"
+        with pytest.raises(UnknownTemplateId):
+            messageSchema.getMessageById(69)
+
+    def test_duplicate_id(self):
+        """two messages may not share an id"""
+        with pytest.raises(DuplicateId, match="'Second' id 1"):
+            SBESpecParser().parseFile(io.BytesIO(DUPLICATE_ID_SCHEMA))
+
+    def test_decode(self, schemaCodec):
+        """decode dispatches on the templateId in the header"""
+        buffer = bytearray(512)
+        for codec in schemaCodec.messages.values():
+            codec.Encoder().wrapAndApplyHeader(buffer, 10)
+            templateId, values = schemaCodec.decode(buffer, 10)
+            assert templateId == codec.templateId
+            assert values == codec.decode(buffer, 18)
+            decoder = schemaCodec.wrap(buffer, 10)
+            assert isinstance(decoder, codec.Decoder)
+            assert schemaCodec.getMessageById(templateId) is codec
+
+    def test_unknown_template_id(self, schemaCodec):
+        """unknown templateId raises a clear error"""
+        buffer = bytearray(schemaCodec.headerLength)
+        schemaCodec.headerStruct.pack_into(buffer, 0, 0, 999, 0, 0)
+        with pytest.raises(UnknownTemplateId, match="999"):
+            schemaCodec.decode(buffer)
+
+        with pytest.raises(UnknownTemplateId):
+            schemaCodec.wrap(buffer)
+
+    def test_dispatch_table(self):
+        """compact ids use a list, sparse ids a dict"""
+        assert dispatchTable({1: "a", 3: "b"}) == [None, "a", None, "b"]
+        assert dispatchTable({1: "a", 60000: "b"}) == {1: "a", 60000: "b"}
+
+    def test_lazy_schema(self, test_data_dir, schemaCodec):
+        """messages of a lazy schema are built and compiled on first use"""
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, "fix-message-samples.xml"), lazy=True
+        )
+        lazyCodec = compileSchema(messageSchema)
+        assert lazyCodec.messages == {}
+        assert messageSchema.message_name_map == {}
+        assert sorted(messageSchema.messageIds()) == [2, 68, 70, 71, 88, 105]
+
+        buffer = bytearray(512)
+        codec = schemaCodec.getMessageById(70)
+        codec.Encoder().wrapAndApplyHeader(buffer, 0)
+        assert lazyCodec.decode(buffer) == schemaCodec.decode(buffer)
+        assert list(lazyCodec.messages) == ["OrderCancelRequest"]
+        assert list(messageSchema.message_name_map) == ["OrderCancelRequest"]
+        assert lazyCodec["OrderCancelRequest"].source == codec.source
+
+        assert lazyCodec["MassQuote"].blockLength == (
+            schemaCodec["MassQuote"].blockLength
+        )
+        with pytest.raises(UnknownTemplateId, match="999"):
+            lazyCodec.getMessageById(999)
+
+    def test_lazy_threads(self, test_data_dir):
+        """threads sharing a lazy schema build and compile each message once"""
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, "fix-message-samples.xml"), lazy=True
+        )
+        lazyCodec = compileSchema(messageSchema)
+        templateIds = sorted(messageSchema.messageIds())
+        compiled = []
+        addCodec = lazyCodec.addCodec
+
+        def slowAddCodec(message):
+            compiled.append(message.name)
+            # widen the window for a second thread to compile it again
+            time.sleep(0.01)
+            return addCodec(message)
+
+        lazyCodec.addCodec = slowAddCodec
+        barrier = threading.Barrier(4)
+        errors = []
+
+        def load():
+            barrier.wait()
+            try:
+                for templateId in templateIds:
+                    lazyCodec.getMessageById(templateId)
+                    lazyCodec["MassQuote"]
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=load) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert len(compiled) == len(set(compiled)) == len(templateIds)
+        assert messageSchema.lazy_message_map == {}
+
+    def test_lazy_duplicate_id(self):
+        """duplicate ids are found when messages are indexed"""
+        with pytest.raises(DuplicateId, match="'Second' id 1"):
+            SBESpecParser().parseFile(io.BytesIO(DUPLICATE_ID_SCHEMA), lazy=True)
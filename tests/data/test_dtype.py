@@ -0,0 +1,89 @@
+"""test_dtype.py - test numpy structured dtype export"""
+import os
+import struct
+
+import pytest
+
+from pysbe.codec.compiler import compileSchema
+from pysbe.codec.dtype import blockDtype, groupArray, messageDtype
+from pysbe.parser.fix_parser import SBESpecParser
+
+np = pytest.importorskip("numpy")
+
+
+class TestDtype:
+
+    def test_block_dtype(self, schemaCodec):
+        """root block dtype matches the computed layout"""
+        layout = schemaCodec["Car"].layout
+        dtype = blockDtype(layout, schemaCodec.byteOrder)
+        assert dtype.itemsize == layout.blockLength
+        assert dtype.fields["modelYear"] == (np.dtype("<u2"), 4)
+        assert dtype.fields["someNumbers"][0].shape == (5,)
+        assert dtype.fields["vehicleCode"][0] == np.dtype("S6")
+        engine = dtype.fields["engine"][0]
+        assert engine.names == ("capacity", "numCylinders", "manufacturerCode")
+        assert engine.itemsize == 6
+
+    def test_message_dtype(self, test_data_dir, filename="basic_sample1.xml"):
+        """a file of fixed size messages is viewed as one array"""
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, filename)
+        )
+        codec = compileSchema(messageSchema)["NewOrderSingle"]
+        buffer = bytearray(62 * 3)
+        for index in range(3):
+            codec.encode(
+                buffer,
+                62 * index,
+                {
+                    "ClOrdID": b"ORD%05d" % index,
+                    "Account": b"ACCT",
+                    "Symbol": b"GEM4",
+                    "Side": b"1",
+                    "TransactTime": index,
+                    "OrderQty": {"mantissa": index},
+                    "OrdType": b"2",
+                    "Price": {"mantissa": 1000 + index},
+                    "StopPx": {},
+                },
+            )
+
+        records = np.frombuffer(buffer, messageDtype(messageSchema, codec.layout))
+        assert list(records["header"]["templateId"]) == [99, 99, 99]
+        assert list(records["TransactTime"]) == [0, 1, 2]
+        assert list(records["Price"]["mantissa"]) == [1000, 1001, 1002]
+
+    def test_group_array(self, schemaCodec):
+        """a repeating group is viewed without copying"""
+        codec = schemaCodec["Car"]
+        buffer = bytearray(256)
+        figures = [{"speed": speed, "mpg": speed / 2} for speed in range(10)]
+        codec.encode(
+            buffer,
+            0,
+            {
+                "serialNumber": 1234,
+                "modelYear": 2013,
+                "available": 1,
+                "code": b"A",
+                "someNumbers": (0, 1, 2, 3, 4),
+                "vehicleCode": b"abcdef",
+                "extras": 0,
+                "engine": {"capacity": 1, "numCylinders": 4, "manufacturerCode": b"1"},
+                "fuelFigures": figures,
+            },
+        )
+        car = schemaCodec.wrap(buffer)
+        entries = groupArray(car.fuelFigures, codec.layout.group("fuelFigures"))
+        assert len(entries) == 10
+        assert entries["mpg"].mean() == pytest.approx(2.25)
+
+        entries["speed"][0] = 99
+        assert struct.unpack_from("<H", buffer, 8 + 41 + 4)[0] == 99
+
+    def test_nested_group_array(self, schemaCodec):
+        """groups containing groups are not fixed size"""
+        layout = schemaCodec["Car"].layout.group("performanceFigures")
+        with pytest.raises(ValueError):
+            groupArray(None, layout)
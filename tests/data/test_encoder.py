@@ -0,0 +1,100 @@
+"""test_encoder.py - test codec.encoder"""
+import os
+import struct
+
+import pytest
+
+from pysbe.codec.compiler import compileSchema
+from pysbe.parser.fix_parser import SBESpecParser
+
+NEW_ORDER_SINGLE = {
+    "ClOrdID": b"ORD00001",
+    "Account": b"ACCT\x00\x00\x00\x00",
+    "Symbol": b"GEM4\x00\x00\x00\x00",
+    "Side": b"1",
+    "TransactTime": 1234567890,
+    "OrderQty": {"mantissa": 7, "exponent": 0},
+    "OrdType": b"2",
+    "Price": {"mantissa": 99250, "exponent": -3},
+    "StopPx": {"mantissa": -1, "exponent": -3},
+}
+
+
+@pytest.fixture
+def codec(test_data_dir, filename="basic_sample1.xml"):
+    """compiled NewOrderSingle codec"""
+    sbe = SBESpecParser()
+    messageSchema = sbe.parseFile(os.path.join(test_data_dir, filename))
+    return compileSchema(messageSchema)["NewOrderSingle"]
+
+
+class TestEncoder:
+
+    def test_encode_round_trip(self, codec):
+        """encode header and root block, decode it again"""
+        buffer = bytearray(100)
+        written = codec.encode(buffer, 5, NEW_ORDER_SINGLE)
+
+        assert written == 62
+        assert struct.unpack_from("<HHHH", buffer, 5) == (54, 99, 100, 0)
+        assert codec.decode(buffer, 5 + 8) == NEW_ORDER_SINGLE
+        assert buffer[5 + written:] == bytes(100 - 5 - written)
+
+    def test_optional_null(self, codec):
+        """missing optional values encode as null"""
+        values = dict(NEW_ORDER_SINGLE, StopPx={})
+        buffer = bytearray(62)
+        codec.encode(memoryview(buffer), 0, values)
+
+        decoded = codec.decode(buffer, 8)
+        assert decoded["StopPx"] == {"mantissa": -(2 ** 63), "exponent": -3}
+
+    def test_encoder_flyweight(self, codec):
+        """flyweight setters write in place after the header"""
+        buffer = bytearray(62)
+        encoder = codec.Encoder().wrapAndApplyHeader(buffer, 0)
+        encoder.ClOrdID = b"ORD00001"
+        encoder.Account = b"ACCT"
+        encoder.Symbol = b"GEM4"
+        encoder.Side = b"1"
+        encoder.TransactTime = 1234567890
+        encoder.OrderQty.mantissa = 7
+        encoder.OrdType = b"2"
+        encoder.Price.mantissa = 99250
+        encoder.StopPx.mantissa = -1
+
+        expected = bytearray(62)
+        codec.encode(expected, 0, NEW_ORDER_SINGLE)
+        assert buffer == expected
+
+    def test_data_overrun(self, test_data_dir, filename="car.xml"):
+        """data past the end of the buffer raises, the buffer never grows"""
+        messageSchema = SBESpecParser().parseFile(os.path.join(test_data_dir, filename))
+        codec = compileSchema(messageSchema)["Car"]
+        values = {
+            "serialNumber": 1234,
+            "modelYear": 2013,
+            "available": 1,
+            "code": b"A",
+            "someNumbers": (1, 2, 3, 4, 5),
+            "vehicleCode": b"abcdef",
+            "extras": 0,
+            "engine": {"capacity": 1, "numCylinders": 4, "manufacturerCode": b"1"},
+            "manufacturer": b"Honda",
+            "model": b"Civic",
+        }
+        length = codec.encode(bytearray(256), 0, values)
+
+        buffer = bytearray(length - 1)
+        with pytest.raises(ValueError, match="model of 5 bytes"):
+            codec.encode(buffer, 0, values)
+
+        assert len(buffer) == length - 1
+        with pytest.raises(ValueError, match="model"):
+            codec.encode(memoryview(buffer), 0, values)
+
+    def test_required_missing(self, schemaCodec, car_values):
+        """a required field left out raises instead of encoding null"""
+        del car_values["serialNumber"]
+        with pytest.raises(KeyError, match="serialNumber"):
+            schemaCodec["Car"].encode(bytearray(256), 0, car_values)
@@ -1,12 +1,22 @@
 """test_fix_parser.py - test fix_parser"""
 import os
+import xml.etree.ElementTree as etree
+
 import pytest
 
 from pysbe.parser.fix_parser import (
-    SBESpecParser, parse_byteOrder, parse_version, parse_optionalString
+    FIELD_ATTRIBUTES_LIST,
+    TYPE_ATTRIBUTES_LIST,
+    BaseParser,
+    SBESpecParser,
+    parse_byteOrder,
+    parse_optionalString,
+    parse_version,
 )
 
-from pysbe.schema.constants import BYTE_ORDER
+from pysbe.parser.ir_parser import encodeIr
+
+from pysbe.schema.constants import BYTE_ORDER, PRESENCE, SYMBOLIC_NAME_RE
 
 from pysbe.schema.builder import MessageSchema
 
@@ -85,3 +95,101 @@ class TestFixParser:
         import pprint
 
         pprint.pprint(messageSchema.as_dict())
+
+    @pytest.mark.parametrize(
+        "filename", ["car.xml", "Examples.xml", "fix-message-samples.xml"]
+    )
+    def test_parse_streaming(self, test_data_dir, filename):
+        """streaming parse builds the same schema"""
+        path = os.path.join(test_data_dir, filename)
+        messageSchema = SBESpecParser().parseFile(path)
+        streamed = SBESpecParser().parseFile(path, streaming=True)
+
+        assert list(streamed.message_name_map) == list(messageSchema.message_name_map)
+        assert list(streamed.qualifiedNameMap) == list(messageSchema.qualifiedNameMap)
+        assert list(streamed.qualifiedMessageNameMap) == list(
+            messageSchema.qualifiedMessageNameMap
+        )
+        # the IR covers every message layout
+        assert encodeIr(streamed) == encodeIr(messageSchema)
+
+    @pytest.mark.parametrize(
+        "filename",
+        [
+            "invalid_sample1.xml",
+            "invalid_types_sample1.xml",
+            "invalid_types_sample2.xml",
+        ],
+    )
+    def test_parse_streaming_invalid(self, test_data_dir, filename):
+        sbe = SBESpecParser()
+        with pytest.raises(ValueError):
+            sbe.parseFile(os.path.join(test_data_dir, filename), streaming=True)
+
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_parse_lazy(self, test_data_dir, streaming):
+        """lazy messages are built on request, the same as eager ones"""
+        path = os.path.join(test_data_dir, "car.xml")
+        messageSchema = SBESpecParser().parseFile(path)
+        lazySchema = SBESpecParser().parseFile(path, streaming=streaming, lazy=True)
+        assert lazySchema.message_name_map == {}
+        assert "Car.fuelFigures" not in lazySchema.qualifiedMessageNameMap
+        # only the serialized message is kept, not the parsed element
+        _, loader = lazySchema.lazy_message_map["Car"]
+        assert isinstance(loader.args[1], bytes)
+
+        car = lazySchema.getMessage("Car")
+        assert lazySchema.getMessageById(1) is car
+        assert "Car.fuelFigures" in lazySchema.qualifiedMessageNameMap
+        assert encodeIr(lazySchema) == encodeIr(messageSchema)
+        with pytest.raises(KeyError):
+            lazySchema.getMessage("Truck")
+
+    def test_parse_attributes(self):
+        """compiled validators convert, default and map attribute values"""
+        element = etree.fromstring('<field name="a" id="7" type="uint8"/>')
+        attributes = BaseParser().parse_common_attributes(
+            element, FIELD_ATTRIBUTES_LIST
+        )
+        assert attributes == {
+            "name": "a",
+            "field_id": 7,
+            "field_type": "uint8",
+            "presence": PRESENCE.REQUIRED,
+            "sinceVersion": 0,
+        }
+
+    @pytest.mark.parametrize(
+        "xml, attributes, message",
+        [
+            (
+                '<field name="a" type="uint8"/>',
+                FIELD_ATTRIBUTES_LIST,
+                "element field missing required attribute id",
+            ),
+            (
+                '<field name="a" id="x" type="uint8"/>',
+                FIELD_ATTRIBUTES_LIST,
+                "element field invalid value 'x' for attribute id",
+            ),
+            (
+                '<type name="1a" primitiveType="char"/>',
+                TYPE_ATTRIBUTES_LIST,
+                "element type invalid value '1a' for attribute name,"
+                f"does not match expected pattern {SYMBOLIC_NAME_RE!r}",
+            ),
+            (
+                '<type name="a" primitiveType="char" presence="often"/>',
+                TYPE_ATTRIBUTES_LIST,
+                "element type invalid value 'often' for attribute presence,"
+                " must be one of dict_keys(['required', 'optional', 'constant'])",
+            ),
+        ],
+    )
+    def test_parse_attributes_invalid(self, xml, attributes, message):
+        """error messages name the element, value and attribute"""
+        element = etree.fromstring(xml)
+        with pytest.raises(ValueError) as excinfo:
+            BaseParser().parse_common_attributes(element, attributes)
+
+        assert str(excinfo.value) == message
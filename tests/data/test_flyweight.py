@@ -0,0 +1,69 @@
+"""test_flyweight.py - test codec.flyweight"""
+import os
+import struct
+
+from pysbe.codec.compiler import compileSchema
+from pysbe.parser.fix_parser import SBESpecParser
+
+
+class TestFlyweight:
+
+    def test_lazy_properties(self, test_data_dir, filename="basic_sample1.xml"):
+        """properties decode from the wrapped buffer"""
+        sbe = SBESpecParser()
+        messageSchema = sbe.parseFile(os.path.join(test_data_dir, filename))
+        codec = compileSchema(messageSchema)["NewOrderSingle"]
+
+        buffer = bytearray(codec.blockLength * 2)
+        for index, clOrdID in enumerate((b"ORD00001", b"ORD00002")):
+            struct.pack_into(
+                "<8s8s8scQicqq",
+                buffer,
+                index * codec.blockLength,
+                clOrdID,
+                b"ACCT",
+                b"GEM4",
+                b"1",
+                1234567890 + index,
+                7,
+                b"2",
+                99250,
+                -1,
+            )
+
+        view = memoryview(buffer)
+        decoder = codec.Decoder(view)
+        assert decoder.sbeTemplateId == 99
+        assert decoder.sbeBlockLength == 54
+        assert decoder.TransactTime == 1234567890
+        assert decoder.Side == b"1"
+        assert decoder.Price.mantissa == 99250
+        assert decoder.Price.exponent == -3
+        assert decoder.OrderQty.exponent == 0
+
+        clOrdID = decoder.ClOrdID
+        assert isinstance(clOrdID, memoryview)
+        assert clOrdID.obj is buffer
+        assert clOrdID == b"ORD00001"
+
+        price = decoder.Price
+        assert decoder.wrap(view, codec.blockLength) is decoder
+        assert decoder.ClOrdID == b"ORD00002"
+        assert decoder.TransactTime == 1234567891
+        assert decoder.Price is price
+
+    def test_group_entry(self, test_data_dir, filename="fix-message-samples.xml"):
+        """group entry flyweights wrap a single entry"""
+        sbe = SBESpecParser()
+        messageSchema = sbe.parseFile(os.path.join(test_data_dir, filename))
+        codec = compileSchema(messageSchema)["MarketDataIncrementalRefreshTrades"]
+        GroupDecoder = codec.groupDecoders["MdIncGrp"]
+
+        buffer = bytearray(GroupDecoder.sbeBlockLength)
+        struct.pack_into("<QQqiHBBc", buffer, 0, 1, 2, 3, 4, 5, 1, 6, b"1")
+        entry = GroupDecoder(memoryview(buffer))
+        assert entry.TradeId == 1
+        assert entry.MdEntryPx.mantissa == 3
+        assert entry.MdEntryPx.exponent == 7
+        assert entry.AggressorSide == b"1"
+        assert entry.MdEntryType == b"2"
@@ -0,0 +1,188 @@
+"""test_ir.py - test reading and writing SBE intermediate representation"""
+import os
+
+import pytest
+
+from pysbe.codec.compiler import compileSchema
+from pysbe.parser.fix_parser import SBESpecParser
+from pysbe.parser.ir_parser import (
+    HEADER_STRUCT,
+    IR_SCHEMA_ID,
+    SIGNAL,
+    TOKEN_STRUCT,
+    TOKEN_TEMPLATE_ID,
+    IrDecoder,
+    IrEncoder,
+    IrGenerator,
+    IrParser,
+    encodeIr,
+    writeIrFile,
+)
+from pysbe.schema.constants import PRESENCE
+
+
+def elementShape(element):
+    """comparable summary of an element layout"""
+    return (
+        element.name,
+        element.offset,
+        element.size,
+        element.primitiveType,
+        element.length,
+        element.presence,
+        element.constValue,
+        [elementShape(member) for member in element.members],
+    )
+
+
+def blockShape(block):
+    """comparable summary of a message or group layout"""
+    return (
+        block.name,
+        block.blockLength,
+        [elementShape(field) for field in block.fields],
+        [
+            (blockShape(group), group.group_id, elementShape(group.dimension))
+            for group in block.groups
+        ],
+        [
+            (data.name, data.data_id, elementShape(data.encoding))
+            for data in block.varData
+        ],
+    )
+
+
+def schemaShape(messageSchema):
+    return (
+        messageSchema.schema_id,
+        messageSchema.version,
+        messageSchema.byteOrder,
+        messageSchema.package,
+        elementShape(messageSchema.headerLayout),
+        [
+            blockShape(message.layout)
+            for message in messageSchema.message_name_map.values()
+        ],
+    )
+
+
+class LongerBlockEncoder(IrEncoder):
+    """writes tokens as a later sbe-ir version with a longer block would"""
+
+    def encodeToken(self, token):
+        start = len(self.chunks)
+        super().encodeToken(token)
+        self.chunks[start] = HEADER_STRUCT.pack(
+            TOKEN_STRUCT.size + 4, TOKEN_TEMPLATE_ID, IR_SCHEMA_ID, 1
+        )
+        self.chunks[start + 1] += bytes(4)
+
+
+class TestIr:
+
+    @pytest.mark.parametrize(
+        "filename",
+        ["car.xml", "Examples.xml", "fix-message-samples.xml", "nested_sample1.xml"],
+    )
+    def test_round_trip(self, test_data_dir, filename):
+        """schema loaded from IR has the same layouts as the xml schema"""
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, filename)
+        )
+        content = encodeIr(messageSchema)
+        loaded = IrParser().parseBytes(content)
+        assert schemaShape(loaded) == schemaShape(messageSchema)
+        assert encodeIr(loaded) == content
+
+    def test_tokens(self, test_data_dir):
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, "car.xml")
+        )
+        tokens = IrGenerator(messageSchema).generate()
+        assert tokens[0].signal == SIGNAL.BEGIN_COMPOSITE
+        assert tokens[0].name == "messageHeader"
+        assert tokens[0].componentTokenCount == 6
+
+        begin = next(t for t in tokens if t.signal == SIGNAL.BEGIN_MESSAGE)
+        assert (begin.name, begin.token_id, begin.size) == ("Car", 1, 41)
+        end = tokens.index(begin) + begin.componentTokenCount - 1
+        assert tokens[end].signal == SIGNAL.END_MESSAGE
+
+        # constant char array keeps its value
+        fuel = next(t for t in tokens if t.name == "fuel")
+        assert fuel.constValue == "Petrol"
+        # enum values and set choices are carried by their own tokens
+        names = [t.name for t in tokens if t.signal == SIGNAL.VALID_VALUE]
+        assert names[:2] == ["F", "T"]
+        choices = [t.constValue for t in tokens if t.signal == SIGNAL.CHOICE]
+        assert choices[:3] == ["0", "1", "2"]
+
+    def test_field_presence(self, test_data_dir):
+        """builtin primitive and encodingType tokens carry the field presence
+        as sbe-tool emits them"""
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, "car.xml")
+        )
+        tokens = IrGenerator(messageSchema).generate()
+        for name, signal in (
+            ("serialNumber", SIGNAL.ENCODING),
+            ("available", SIGNAL.BEGIN_ENUM),
+        ):
+            index = next(
+                index
+                for index, token in enumerate(tokens)
+                if token.signal == SIGNAL.BEGIN_FIELD and token.name == name
+            )
+            assert tokens[index].presence == PRESENCE.REQUIRED
+            assert tokens[index + 1].signal == signal
+            assert tokens[index + 1].presence == PRESENCE.REQUIRED
+
+    def test_parse_ir_file(self, test_data_dir, tmpdir):
+        """codecs compiled from IR decode messages encoded from xml"""
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, "car.xml")
+        )
+        path = str(tmpdir.join("car.sbeir"))
+        writeIrFile(messageSchema, path)
+        loaded = SBESpecParser().parseIrFile(path)
+
+        values = {
+            "serialNumber": 1234,
+            "modelYear": 2013,
+            "available": 1,
+            "code": b"A",
+            "someNumbers": (1, 2, 3, 4, 5),
+            "vehicleCode": b"abcdef",
+            "extras": 0,
+            "engine": {"capacity": 2000, "numCylinders": 4, "manufacturerCode": b"123"},
+            "fuelFigures": [{"speed": 30, "mpg": 35.9}],
+            "model": b"Civic",
+        }
+        buffer = bytearray(256)
+        compileSchema(messageSchema)["Car"].encode(buffer, 0, values)
+        car = compileSchema(loaded).wrap(buffer)
+        assert car.serialNumber == 1234
+        assert car.engine.capacity == 2000
+        assert [entry.speed for entry in car.fuelFigures] == [30]
+        assert car.modelText == "Civic"
+
+    def test_longer_token_block(self, test_data_dir):
+        """tokens are read with the blockLength from their header"""
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, "car.xml")
+        )
+        tokens = IrGenerator(messageSchema).generate()
+        content = LongerBlockEncoder().encode(messageSchema, tokens)
+        loaded = IrParser().parseBytes(content)
+        assert schemaShape(loaded) == schemaShape(messageSchema)
+
+    def test_invalid(self, test_data_dir):
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, "car.xml")
+        )
+        content = encodeIr(messageSchema)
+        with pytest.raises(ValueError, match="expected IR templateId 1"):
+            IrDecoder(content[8:]).decode()
+
+        with pytest.raises(ValueError, match="truncated"):
+            IrParser().parseBytes(content[:-40])
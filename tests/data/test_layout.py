@@ -0,0 +1,155 @@
+"""test_layout.py - test schema.layout"""
+import io
+import os
+import pytest
+
+from pysbe.parser.fix_parser import SBESpecParser
+from pysbe.schema.constants import PRESENCE
+from pysbe.schema.exceptions import InvalidLayout
+
+SCHEMA_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<sbe:messageSchema xmlns:sbe="http://fixprotocol.io/2016/sbe" version="0">
+    <types>
+        <composite name="messageHeader">
+            <type name="blockLength" primitiveType="uint16"/>
+            <type name="templateId" primitiveType="uint16"/>
+            <type name="schemaId" primitiveType="uint16"/>
+            <type name="version" primitiveType="uint16"/>
+        </composite>
+        <composite name="groupSizeEncoding">
+            <type name="blockLength" primitiveType="uint16"/>
+            <type name="numInGroup" primitiveType="uint16"/>
+        </composite>
+    </types>
+    {message}
+</sbe:messageSchema>
+"""
+
+
+def parse_message(message):
+    """parse a schema containing a single message"""
+    xml = SCHEMA_TEMPLATE.format(message=message)
+    return SBESpecParser().parseFile(io.BytesIO(xml.encode("utf-8")))
+
+
+class TestLayout:
+
+    def test_declared_offsets(self, test_data_dir, filename="basic_sample1.xml"):
+        """computed offsets agree with declared offsets"""
+        sbe = SBESpecParser()
+        messageSchema = sbe.parseFile(os.path.join(test_data_dir, filename))
+
+        assert messageSchema.headerLayout.size == 8
+        layout = messageSchema.message_name_map["NewOrderSingle"].layout
+        assert layout.blockLength == 54
+        assert [(field.name, field.offset, field.size) for field in layout.fields] == [
+            ("ClOrdID", 0, 8),
+            ("Account", 8, 8),
+            ("Symbol", 16, 8),
+            ("Side", 24, 1),
+            ("TransactTime", 25, 8),
+            ("OrderQty", 33, 4),
+            ("OrdType", 37, 1),
+            ("Price", 38, 8),
+            ("StopPx", 46, 8),
+        ]
+
+        price = layout.field("Price")
+        assert [(x.name, x.offset, x.size) for x in price.leaves()] == [
+            ("mantissa", 38, 8),
+            ("exponent", 46, 0),
+        ]
+
+    def test_computed_block_length(
+        self, test_data_dir, filename="fix-message-samples.xml"
+    ):
+        """blockLength computed for messages and nested groups"""
+        sbe = SBESpecParser()
+        messageSchema = sbe.parseFile(os.path.join(test_data_dir, filename))
+
+        layout = messageSchema.message_name_map["MassQuote"].layout
+        assert layout.blockLength == 62
+        quoteSets = layout.group("QuoteSets")
+        assert quoteSets.dimension.size == 4
+        assert quoteSets.blockLength == 24
+        assert quoteSets.group("QuoteEntries").blockLength == 90
+
+        trades = messageSchema.message_name_map["MarketDataIncrementalRefreshTrades"]
+        entryType = trades.layout.group("MdIncGrp").field("MdEntryType")
+        assert entryType.isConstant
+        assert entryType.size == 0
+
+    def test_padding(self):
+        """declared offsets and blockLength add padding"""
+        messageSchema = parse_message(
+            """<sbe:message name="Padded" id="1" blockLength="16">
+                <field name="a" id="1" type="uint8"/>
+                <field name="b" id="2" type="uint32" offset="4"/>
+            </sbe:message>"""
+        )
+        layout = messageSchema.message_name_map["Padded"].layout
+        assert layout.field("b").offset == 4
+        assert layout.blockLength == 16
+
+    def test_overlapping_offset(self):
+        """declared offset overlapping previous field"""
+        with pytest.raises(InvalidLayout):
+            parse_message(
+                """<sbe:message name="Overlap" id="1">
+                    <field name="a" id="1" type="uint32"/>
+                    <field name="b" id="2" type="uint32" offset="2"/>
+                </sbe:message>"""
+            )
+
+    def test_short_block_length(self):
+        """declared blockLength smaller than fields"""
+        with pytest.raises(InvalidLayout):
+            parse_message(
+                """<sbe:message name="Short" id="1" blockLength="2">
+                    <field name="a" id="1" type="uint32"/>
+                </sbe:message>"""
+            )
+
+    def test_field_after_group(self):
+        """fields must precede groups"""
+        with pytest.raises(InvalidLayout):
+            parse_message(
+                """<sbe:message name="Order" id="1">
+                    <group name="g" id="2">
+                        <field name="a" id="3" type="uint32"/>
+                    </group>
+                    <field name="b" id="4" type="uint32"/>
+                </sbe:message>"""
+            )
+
+    def test_presence(self, test_data_dir):
+        """the field presence holds unless a user defined type overrides it"""
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, "car.xml")
+        )
+        layout = messageSchema.message_name_map["Car"].layout
+        for name in ("serialNumber", "available", "code", "extras"):
+            assert layout.field(name).presence == PRESENCE.REQUIRED
+
+        engine = layout.field("engine")
+        presences = {member.name: member.presence for member in engine.members}
+        assert presences["capacity"] == PRESENCE.REQUIRED
+        assert presences["maxRpm"] == PRESENCE.CONSTANT
+
+        messageSchema = parse_message(
+            """
+            <sbe:message name="M" id="1">
+                <field name="a" id="1" type="uint32" presence="optional"/>
+            </sbe:message>
+            """
+        )
+        layout = messageSchema.message_name_map["M"].layout
+        assert layout.field("a").presence == PRESENCE.OPTIONAL
+
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, "basic_sample1.xml")
+        )
+        layout = messageSchema.message_name_map["NewOrderSingle"].layout
+        stopPx = {member.name: member for member in layout.field("StopPx").members}
+        assert stopPx["mantissa"].presence == PRESENCE.OPTIONAL
+        assert layout.field("TransactTime").presence == PRESENCE.REQUIRED
@@ -0,0 +1,67 @@
+"""test_length.py - test header peek and message length"""
+import os
+import struct
+
+import pytest
+
+from pysbe.codec.compiler import MessageHeader, compileSchema
+from pysbe.parser.fix_parser import SBESpecParser
+from pysbe.pysbe import generateSource
+
+
+@pytest.fixture
+def schemaCodec(test_data_dir, filename="fix-message-samples.xml"):
+    """compiled codecs for a schema with nested groups"""
+    sbe = SBESpecParser()
+    messageSchema = sbe.parseFile(os.path.join(test_data_dir, filename))
+    return compileSchema(messageSchema)
+
+
+def mass_quote(quoteSets=(2, 0, 3), blockLength=62):
+    """encode a MassQuote, quoteSets lists the entries of each set
+
+    the root block is longer than the schema blockLength when blockLength
+    is larger, as sent by a newer schema version
+    """
+    buffer = bytearray(struct.pack("<HHHH", blockLength, 105, 1, 0))
+    buffer += bytes(blockLength)
+    buffer += struct.pack("<HH", 24, len(quoteSets))
+    for entries in quoteSets:
+        buffer += bytes(24)
+        buffer += struct.pack("<HH", 90, entries)
+        buffer += bytes(90 * entries)
+
+    return buffer
+
+
+class TestLength:
+
+    def test_peek_header(self, schemaCodec):
+        """header fields are returned without decoding the message"""
+        buffer = mass_quote()
+        assert schemaCodec.peekHeader(buffer) == MessageHeader(62, 105, 1, 0)
+
+    def test_message_length(self, schemaCodec):
+        """length includes nested group dimensions and entries"""
+        buffer = mass_quote()
+        header, length = schemaCodec.peek(buffer)
+        assert header.templateId == 105
+        assert length == len(buffer) == 8 + 62 + 4 + 3 * (24 + 4) + 5 * 90
+
+        stream = bytes(7) + buffer + mass_quote(()) + bytes(3)
+        assert schemaCodec.messageLength(stream, 7) == len(buffer)
+        assert schemaCodec.messageLength(stream, 7 + len(buffer)) == 8 + 62 + 4
+
+    def test_wire_block_length(self, schemaCodec):
+        """the root block length is taken from the header"""
+        buffer = mass_quote(blockLength=70)
+        assert schemaCodec.messageLength(buffer) == len(buffer)
+
+    def test_generated_message_length(self, schemaCodec):
+        """generated modules measure messages the same way"""
+        namespace = {}
+        exec(generateSource(schemaCodec.messageSchema), namespace)
+        buffer = mass_quote()
+        assert namespace["messageLength"](buffer) == len(buffer)
+        with pytest.raises(ValueError, match="unknown templateId 999"):
+            namespace["messageLength"](struct.pack("<HHHH", 0, 999, 0, 0))
@@ -0,0 +1,142 @@
+"""test_linker.py - test schema.linker"""
+import io
+import os
+import pytest
+
+from pysbe.parser.fix_parser import SBESpecParser
+from pysbe.schema.exceptions import CircularReference, UnknownReference
+from pysbe.schema.linker import linkSchema
+from pysbe.schema.types import createRef
+
+SCHEMA_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<sbe:messageSchema xmlns:sbe="http://fixprotocol.io/2016/sbe" version="0">
+    <types>
+        <composite name="messageHeader">
+            <type name="blockLength" primitiveType="uint16"/>
+            <type name="templateId" primitiveType="uint16"/>
+            <type name="schemaId" primitiveType="uint16"/>
+            <type name="version" primitiveType="uint16"/>
+        </composite>
+        <enum name="Side" encodingType="char">
+            <validValue name="Buy">1</validValue>
+            <validValue name="Sell">2</validValue>
+        </enum>
+        {types}
+    </types>
+    <sbe:message name="Order" id="1">
+        {fields}
+    </sbe:message>
+</sbe:messageSchema>
+"""
+
+
+def parse_schema(types="", fields='<field name="side" id="1" type="Side"/>'):
+    """parse a schema with extra types and the fields of a single message"""
+    xml = SCHEMA_TEMPLATE.format(types=types, fields=fields)
+    return SBESpecParser().parseFile(io.BytesIO(xml.encode("utf-8")))
+
+
+class TestLinker:
+
+    def test_resolved_references(self, test_data_dir):
+        """references point at the declared types"""
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, "car.xml")
+        )
+        car = messageSchema.message_name_map["Car"]
+        assert car.fieldsNameMap["engine"].resolvedType is messageSchema.lookupName(
+            "Engine"
+        )
+        fuelFigures = car.fieldsNameMap["fuelFigures"]
+        assert fuelFigures.resolvedDimensionType is messageSchema.lookupName(
+            "groupSizeEncoding"
+        )
+        assert messageSchema.resolvedHeaderType is messageSchema.lookupName(
+            "messageHeader"
+        )
+        model = messageSchema.lookupName("Model")
+        assert model.resolvedEncodingType is messageSchema.lookupName("char")
+
+    def test_qualified_names(self, test_data_dir):
+        messageSchema = SBESpecParser().parseFile(
+            os.path.join(test_data_dir, "car.xml")
+        )
+        names = messageSchema.qualifiedNameMap
+        engine = messageSchema.lookupName("Engine")
+        assert names["Engine"] is engine
+        assert names["Engine.capacity"] is engine.lookupName("capacity")
+        assert names["Model.C"].value == "C"
+        car = messageSchema.message_name_map["Car"]
+        messageNames = messageSchema.qualifiedMessageNameMap
+        assert messageNames["Car"] is car
+        assert "Car" not in names
+        assert (
+            messageNames["Car.fuelFigures.mpg"]
+            is car.fieldsNameMap["fuelFigures"].fieldsNameMap["mpg"]
+        )
+
+    def test_message_named_like_type(self):
+        """types and messages are separate namespaces"""
+        messageSchema = parse_schema(
+            types="""
+            <composite name="Order">
+                <type name="side" primitiveType="char"/>
+            </composite>
+            """
+        )
+        assert messageSchema.qualifiedNameMap["Order.side"].primitiveType
+        order = messageSchema.qualifiedMessageNameMap["Order"]
+        assert order is messageSchema.message_name_map["Order"]
+
+    def test_unknown_reference(self):
+        messageSchema = parse_schema(
+            types="""
+            <composite name="Outer">
+                <type name="inner" primitiveType="uint8"/>
+            </composite>
+            """
+        )
+        outer = messageSchema.lookupName("Outer")
+        outer.addType(createRef(name="missing", type="Missing"))
+        with pytest.raises(UnknownReference, match="unknown type 'Missing'"):
+            linkSchema(messageSchema)
+
+        messageSchema = parse_schema()
+        order = messageSchema.message_name_map["Order"]
+        order.fieldsNameMap["side"].field_type = "Missing"
+        with pytest.raises(UnknownReference, match="could not be resolved"):
+            linkSchema(messageSchema)
+
+    def test_circular_reference(self):
+        """xml only refers back to declared types, build the cycle directly"""
+        messageSchema = parse_schema(
+            types="""
+            <composite name="A">
+                <type name="x" primitiveType="uint8"/>
+            </composite>
+            <composite name="B">
+                <ref name="a" type="A"/>
+            </composite>
+            """
+        )
+        messageSchema.lookupName("A").addType(createRef(name="b", type="B"))
+        with pytest.raises(CircularReference, match="A -> B -> A"):
+            linkSchema(messageSchema)
+
+    def test_value_ref(self):
+        messageSchema = parse_schema(
+            fields="""
+            <field name="side" id="1" type="Side" presence="constant"
+                valueRef="Side.Sell"/>
+            """
+        )
+        layout = messageSchema.message_name_map["Order"].layout
+        assert layout.field("side").constValue == "2"
+
+        with pytest.raises(UnknownReference, match="'Side.Hold'"):
+            parse_schema(
+                fields="""
+                <field name="side" id="1" type="Side" presence="constant"
+                    valueRef="Side.Hold"/>
+                """
+            )
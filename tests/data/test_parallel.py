@@ -0,0 +1,93 @@
+"""test_parallel.py - test codec.parallel"""
+import io
+import operator
+import struct
+
+import pytest
+
+from pysbe.codec.compiler import compileSchema
+from pysbe.codec.parallel import mapCapture
+from pysbe.parser.fix_parser import SBESpecParser
+
+TICK_SCHEMA = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sbe:messageSchema xmlns:sbe="http://fixprotocol.io/2016/sbe" id="7" version="0">
+    <types>
+        <composite name="messageHeader">
+            <type name="blockLength" primitiveType="uint16"/>
+            <type name="templateId" primitiveType="uint16"/>
+            <type name="schemaId" primitiveType="uint16"/>
+            <type name="version" primitiveType="uint16"/>
+        </composite>
+        <composite name="varDataEncoding">
+            <type name="length" primitiveType="uint16"/>
+            <type name="varData" primitiveType="uint8" length="0"/>
+        </composite>
+    </types>
+    <sbe:message name="Tick" id="1">
+        <field name="price" id="1" type="int64"/>
+        <data name="venue" id="2" type="varDataEncoding"/>
+    </sbe:message>
+</sbe:messageSchema>
+"""
+
+
+@pytest.fixture
+def schemaCodec():
+    return compileSchema(SBESpecParser().parseFile(io.BytesIO(TICK_SCHEMA)))
+
+
+def write_capture(schemaCodec, filename, count, lengthPrefix=None):
+    codec = schemaCodec["Tick"]
+    with open(filename, "wb") as captureFile:
+        for price in range(count):
+            buffer = bytearray(64)
+            venue = b"X" * (price % 5)
+            length = codec.encode(buffer, 0, {"price": price, "venue": venue})
+            if lengthPrefix:
+                captureFile.write(struct.pack(lengthPrefix, length))
+
+            captureFile.write(buffer[:length])
+
+
+def sum_prices(messages):
+    return sum(message.price for message in messages)
+
+
+def prices(messages):
+    return [values["price"] for _, values in messages]
+
+
+class TestParallel:
+
+    @pytest.mark.parametrize("lengthPrefix", [None, "<H"])
+    def test_map_reduce(self, schemaCodec, tmp_path, lengthPrefix):
+        filename = str(tmp_path / "ticks.sbe")
+        write_capture(schemaCodec, filename, 1001, lengthPrefix)
+        total = mapCapture(
+            filename,
+            schemaCodec,
+            sum_prices,
+            operator.add,
+            lengthPrefix=lengthPrefix,
+            flyweights=True,
+            workers=2,
+            shards=7,
+        )
+        assert total == sum(range(1001))
+
+        results = mapCapture(
+            filename, schemaCodec, prices, lengthPrefix=lengthPrefix, workers=2
+        )
+        assert [price for shard in results for price in shard] == list(range(1001))
+
+    def test_decode_messages(self, schemaCodec, tmp_path):
+        """the default mapper returns data copied out of the mapping"""
+        filename = str(tmp_path / "ticks.sbe")
+        write_capture(schemaCodec, filename, 10)
+        results = mapCapture(filename, schemaCodec, workers=2, shards=3)
+        assert len(results) == 3
+        messages = [message for shard in results for message in shard]
+        assert messages[7] == (1, {"price": 7, "venue": b"XX"})
+
+        open(filename, "wb").close()
+        assert mapCapture(filename, schemaCodec) == [[]]
@@ -0,0 +1,95 @@
+"""test_pysbe.py - test ahead of time code generation"""
+import importlib.util
+import os
+import struct
+
+import pytest
+
+from pysbe.codec.compiler import compileSchema
+from pysbe.parser.fix_parser import SBESpecParser
+from pysbe.pysbe import generateSource, main
+
+
+def load_module(path, name="generated_codecs"):
+    """import a generated module from path"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestCodeGenerator:
+
+    def test_generated_module(
+        self, test_data_dir, tmpdir, filename="basic_sample1.xml"
+    ):
+        """generated module matches runtime compiled codecs"""
+        schema_filename = os.path.join(test_data_dir, filename)
+        output = str(tmpdir.join("codecs.py"))
+        assert main([schema_filename, output]) == 0
+
+        module = load_module(output)
+        assert module.SCHEMA_ID == 100
+        assert module.BYTE_ORDER == "littleEndian"
+
+        messageSchema = SBESpecParser().parseFile(schema_filename)
+        codec = compileSchema(messageSchema)["NewOrderSingle"]
+        values = {
+            "ClOrdID": b"ORD00001",
+            "Account": b"ACCT\x00\x00\x00\x00",
+            "Symbol": b"GEM4\x00\x00\x00\x00",
+            "Side": b"1",
+            "TransactTime": 1234567890,
+            "OrderQty": {"mantissa": 7, "exponent": 0},
+            "OrdType": b"2",
+            "Price": {"mantissa": 99250, "exponent": -3},
+            "StopPx": {"mantissa": -1, "exponent": -3},
+        }
+        generated = bytearray(62)
+        runtime = bytearray(62)
+        assert module.ENCODERS[99](generated, 0, values) == 62
+        codec.encode(runtime, 0, values)
+        assert generated == runtime
+
+        assert module.DECODERS[99](generated, 8) == values
+        assert module.decode(generated) == (99, values)
+        decoder = module.FLYWEIGHT_DECODERS[99](memoryview(generated), 8)
+        assert decoder.Price.mantissa == 99250
+
+    def test_standalone(self, test_data_dir, filename="fix-message-samples.xml"):
+        """generated source only depends on struct"""
+        sbe = SBESpecParser()
+        messageSchema = sbe.parseFile(os.path.join(test_data_dir, filename))
+        source = generateSource(messageSchema)
+
+        imports = [
+            line for line in source.splitlines() if line.startswith(("import", "from"))
+        ]
+        assert imports == ["import struct"]
+        compile(source, "generated", "exec")
+
+    def test_unknown_template_id(
+        self, test_data_dir, filename="basic_sample1.xml"
+    ):
+        """generated decode raises its own UnknownTemplateId, a ValueError"""
+        messageSchema = SBESpecParser().parseFile(os.path.join(test_data_dir, filename))
+        namespace = {}
+        exec(compile(generateSource(messageSchema), "generated", "exec"), namespace)
+        UnknownTemplateId = namespace["UnknownTemplateId"]
+        assert issubclass(UnknownTemplateId, ValueError)
+        buffer = struct.pack("<HHHH", 0, 999, 0, 0)
+        with pytest.raises(UnknownTemplateId, match="unknown templateId 999"):
+            namespace["decode"](buffer)
+
+        with pytest.raises(UnknownTemplateId, match="unknown templateId 999"):
+            namespace["messageLength"](buffer)
+
+    def test_escaped_header(self, test_data_dir, filename="basic_sample1.xml"):
+        """description and source path can not break the module docstring"""
+        messageSchema = SBESpecParser().parseFile(os.path.join(test_data_dir, filename))
+        messageSchema.description = 'say """hi\\'
+        source = generateSource(messageSchema, sourceName="C:\\Nodes\\user.xml")
+        namespace = {}
+        exec(compile(source, "generated", "exec"), namespace)
+        assert namespace["__doc__"].startswith('say """hi\\\n')
+        assert "C:\\Nodes\\user.xml" in namespace["__doc__"]
@@ -0,0 +1,134 @@
+"""test_registry.py - test codec.registry"""
+import io
+import os
+import threading
+
+import pytest
+
+from pysbe.codec.registry import SchemaRegistry
+from pysbe.parser.fix_parser import SBESpecParser
+from pysbe.schema.exceptions import DuplicateId, InvalidLayout, UnknownSchema
+
+
+def parse_schema(test_data_dir, filename, **replacements):
+    """parse a sample schema with messageSchema attributes replaced"""
+    with open(os.path.join(test_data_dir, filename), encoding="utf-8") as schema:
+        content = schema.read()
+
+    for old, new in replacements.items():
+        content = content.replace(old, new, 1)
+
+    return SBESpecParser().parseFile(io.BytesIO(content.encode("utf-8")))
+
+
+@pytest.fixture
+def registry(test_data_dir):
+    """car schema 1 versions 1 and 3, fix samples as schema 2"""
+    registry = SchemaRegistry()
+    registry.addSchema(parse_schema(test_data_dir, "car.xml"))
+    registry.addSchema(
+        parse_schema(test_data_dir, "car.xml", **{'version="1"': 'version="3"'})
+    )
+    registry.addSchema(
+        parse_schema(test_data_dir, "fix-message-samples.xml", **{'id="1"': 'id="2"'})
+    )
+    return registry
+
+
+def encode_car(registry, values, version=1):
+    """return buffer holding a car message with the header version"""
+    codec = registry.getCodec(1, 1)
+    buffer = bytearray(256)
+    codec["Car"].encode(buffer, 0, values)
+    blockLength, templateId, schemaId, _ = codec.unpackHeader(buffer)
+    codec.headerStruct.pack_into(buffer, 0, blockLength, templateId, schemaId, version)
+    return buffer
+
+
+class TestRegistry:
+
+    def test_decode(self, registry, car_values):
+        """the header schemaId and version pick the codec"""
+        buffer = encode_car(registry, car_values)
+        header, values = registry.decode(buffer)
+        assert (header.schemaId, header.version, header.templateId) == (1, 1, 1)
+        assert values == registry.getCodec(1, 1).decode(buffer)[1]
+        assert registry.wrap(buffer).serialNumber == 1234
+        assert registry.wrap(buffer) is not registry.wrap(buffer)
+
+        fix = registry.getCodec(2, 1)
+        codec = fix.getMessageById(70)
+        codec.Encoder().wrapAndApplyHeader(buffer, 0)
+        header, values = registry.decode(buffer)
+        assert (header.schemaId, header.templateId) == (2, 70)
+        assert registry.codecFor(buffer) is fix
+
+    def test_resolve_version(self, registry, car_values):
+        """messages use the newest registered version not newer than theirs"""
+        assert registry.resolve(1, 1) == (1, 1)
+        assert registry.resolve(1, 2) == (1, 1)
+        assert registry.resolve(1, 7) == (1, 3)
+        assert registry.getSchema(1, 3).version == 3
+        # older than every registered version
+        assert registry.resolve(1, 0) == (1, 1)
+        header, values = registry.decode(encode_car(registry, car_values, 0))
+        assert (header.version, values["serialNumber"]) == (0, 1234)
+
+        with pytest.raises(UnknownSchema, match="schema id 9"):
+            registry.decode(bytes([0, 0, 1, 0, 9, 0, 1, 0]))
+
+        registry.removeSchema(1, 3)
+        assert registry.resolve(1, 7) == (1, 1)
+        assert (1, 3) not in registry
+        assert len(registry) == 2
+
+    def test_lru(self, registry):
+        """least recently used codecs are dropped first"""
+        registry.maxCodecs = 2
+        car = registry.getCodec(1, 1)
+        registry.getCodec(2, 1)
+        assert registry.getCodec(1, 2) is car
+        registry.getCodec(1, 3)
+        assert list(registry.codecs) == [(1, 1), (1, 3)]
+        assert registry.getCodec(2, 1) is not None
+        assert list(registry.codecs) == [(1, 3), (2, 1)]
+        assert registry.getCodec(1, 1) is not car
+
+    def test_add_invalid(self, test_data_dir, registry):
+        with pytest.raises(DuplicateId, match="schema id 1 version 1"):
+            registry.addSchema(parse_schema(test_data_dir, "car.xml"))
+
+        bigEndian = parse_schema(
+            test_data_dir,
+            "car.xml",
+            **{'id="1"': 'id="5"', "littleEndian": "bigEndian"},
+        )
+        with pytest.raises(InvalidLayout, match="message header differs"):
+            registry.addSchema(bigEndian)
+
+    def test_threads(self, registry, car_values):
+        """concurrent lookups with codecs evicted between them"""
+        registry.maxCodecs = 1
+        buffers = [
+            encode_car(registry, car_values, version) for version in (1, 2, 3, 4)
+        ]
+        expected = registry.getCodec(1, 1).decode(buffers[0])[1]
+        errors = []
+
+        def decode():
+            try:
+                for _ in range(20):
+                    for buffer in buffers:
+                        assert registry.decode(buffer)[1] == expected
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=decode) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert len(registry.codecs) == 1
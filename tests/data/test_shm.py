@@ -0,0 +1,167 @@
+"""test_shm.py - test codec.shm"""
+import io
+import multiprocessing
+
+import pytest
+
+from pysbe.codec.compiler import compileSchema
+from pysbe.codec.shm import RingConsumer, RingProducer
+from pysbe.parser.fix_parser import SBESpecParser
+
+TICK_SCHEMA = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sbe:messageSchema xmlns:sbe="http://fixprotocol.io/2016/sbe" id="7" version="0">
+    <types>
+        <composite name="messageHeader">
+            <type name="blockLength" primitiveType="uint16"/>
+            <type name="templateId" primitiveType="uint16"/>
+            <type name="schemaId" primitiveType="uint16"/>
+            <type name="version" primitiveType="uint16"/>
+        </composite>
+        <composite name="varDataEncoding">
+            <type name="length" primitiveType="uint16"/>
+            <type name="varData" primitiveType="uint8" length="0"/>
+        </composite>
+    </types>
+    <sbe:message name="Tick" id="1">
+        <field name="price" id="1" type="int64"/>
+    </sbe:message>
+    <sbe:message name="Trade" id="2">
+        <field name="tradeId" id="1" type="uint32"/>
+        <data name="venue" id="2" type="varDataEncoding"/>
+    </sbe:message>
+</sbe:messageSchema>
+"""
+
+
+@pytest.fixture
+def schemaCodec():
+    return compileSchema(SBESpecParser().parseFile(io.BytesIO(TICK_SCHEMA)))
+
+
+@pytest.fixture
+def producer(schemaCodec):
+    producer = RingProducer(schemaCodec, capacity=256, maxMessageLength=40)
+    yield producer
+    producer.close()
+    producer.unlink()
+
+
+def consume(name, count, connection):
+    """read count ticks in another process, send back their prices"""
+    schemaCodec = compileSchema(SBESpecParser().parseFile(io.BytesIO(TICK_SCHEMA)))
+    consumer = RingConsumer(schemaCodec, name, 0)
+    connection.send("attached")
+    prices = []
+    while len(prices) < count:
+        prices.extend(tick.price for tick in consumer.poll())
+
+    consumer.close()
+    connection.send(prices)
+
+
+class TestRing:
+
+    def test_publish(self, schemaCodec, producer):
+        """messages wrap around the ring end, every consumer sees all"""
+        consumers = [RingConsumer(schemaCodec, producer.name, slot) for slot in (0, 3)]
+        for number in range(50):
+            if number % 2:
+                values = {"tradeId": number, "venue": b"X" * (number % 7)}
+                assert producer.offer("Trade", values)
+            else:
+                assert producer.offer("Tick", {"price": number})
+
+            for consumer in consumers:
+                messages = list(consumer.poll())
+                assert len(messages) == 1
+                if number % 2:
+                    assert messages[0].tradeId == number
+                else:
+                    assert messages[0].price == number
+
+        assert producer.position > producer.capacity
+        for consumer in consumers:
+            consumer.close()
+
+    def test_backpressure(self, schemaCodec, producer):
+        """the producer does not overwrite messages a consumer has not read"""
+        consumer = RingConsumer(schemaCodec, producer.name, 1)
+        published = 0
+        while producer.offer("Tick", {"price": published}):
+            published += 1
+
+        # 16 byte ticks in 24 byte records
+        assert published == 10
+        poll = consumer.poll(flyweights=False)
+        assert next(poll) == (1, {"price": 0})
+        assert not producer.offer("Tick", {"price": published})
+        # the first message is released, padding to the ring end now fits
+        assert next(poll) == (1, {"price": 1})
+        assert producer.offer("Tick", {"price": published})
+        assert [values["price"] for _, values in poll] == list(range(2, 10))
+
+        with pytest.raises(ValueError, match="slot 1 is in use"):
+            RingConsumer(schemaCodec, producer.name, 1)
+
+        consumer.close()
+        # no consumer left, the producer is never blocked
+        for price in range(100):
+            assert producer.offer("Tick", {"price": price})
+
+    def test_claim(self, schemaCodec, producer):
+        """flyweight encoders write into the claimed space"""
+        consumer = RingConsumer(schemaCodec, producer.name, 0)
+        encoder = schemaCodec["Tick"].Encoder()
+        offset = producer.claim(encoder.sbeHeaderLength + encoder.sbeBlockLength)
+        encoder.wrapAndApplyHeader(producer.buffer, offset).price = 42
+        assert list(consumer.poll()) == []
+        producer.commit(encoder.sbeHeaderLength + encoder.sbeBlockLength)
+        assert [tick.price for tick in consumer.poll()] == [42]
+        consumer.close()
+
+    def test_overrun(self, schemaCodec, producer):
+        """a message longer than its claim is not published"""
+        consumer = RingConsumer(schemaCodec, producer.name, 0)
+        with pytest.raises(ValueError):
+            producer.offer("Trade", {"tradeId": 1, "venue": b"X" * 100})
+
+        assert list(consumer.poll()) == []
+        assert producer.offer("Trade", {"tradeId": 2, "venue": b"Y"})
+        assert [trade.tradeId for trade in consumer.poll()] == [2]
+
+        producer.claim(16)
+        with pytest.raises(ValueError, match="overran"):
+            producer.commit(24)
+
+        assert producer.offer("Tick", {"price": 3})
+        assert [tick.price for tick in consumer.poll()] == [3]
+        consumer.close()
+
+    def test_break(self, schemaCodec, producer):
+        """breaking out of poll releases the message held"""
+        consumer = RingConsumer(schemaCodec, producer.name, 0)
+        for price in range(3):
+            assert producer.offer("Tick", {"price": price})
+
+        for tick in consumer.poll():
+            assert tick.price == 0
+            break
+
+        assert producer.consumerLimit() == 24
+        assert [tick.price for tick in consumer.poll()] == [1, 2]
+        assert producer.consumerLimit() == producer.position
+        consumer.close()
+
+    def test_processes(self, schemaCodec, producer):
+        context = multiprocessing.get_context()
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=consume, args=(producer.name, 500, sender))
+        process.start()
+        assert receiver.recv() == "attached"
+        price = 0
+        while price < 500:
+            if producer.offer("Tick", {"price": price}):
+                price += 1
+
+        assert receiver.recv() == list(range(500))
+        process.join()
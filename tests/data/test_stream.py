@@ -0,0 +1,60 @@
+"""test_stream.py - test codec.stream"""
+import io
+
+import pytest
+
+from pysbe.codec.stream import StreamDecoder
+
+
+@pytest.fixture
+def cars(encode_cars):
+    """return count cars of differing lengths, the model grows"""
+    return lambda count=20: encode_cars(count, model=lambda number: b"x" * number)
+
+
+def serial_numbers(messages):
+    """decoded data is only valid until the next message, check it here"""
+    result = []
+    for templateId, values in messages:
+        assert templateId == 1
+        assert bytes(values["model"]) == b"x" * values["serialNumber"]
+        result.append(values["serialNumber"])
+
+    return result
+
+
+class TestStream:
+
+    @pytest.mark.parametrize("chunkSize", [1, 7, 64, 1000, 100000])
+    def test_chunks(self, schemaCodec, cars, chunkSize):
+        """messages split at any chunk edge decode like a single buffer"""
+        stream = cars()
+        decoder = StreamDecoder(schemaCodec, capacity=128)
+        numbers = []
+        for position in range(0, len(stream), chunkSize):
+            chunk = stream[position : position + chunkSize]
+            numbers.extend(serial_numbers(decoder.feed(chunk)))
+
+        assert numbers == list(range(20))
+        assert decoder.pending == 0
+
+    def test_partial(self, schemaCodec, cars):
+        stream = cars(2)
+        decoder = StreamDecoder(schemaCodec)
+        length = schemaCodec.messageLength(stream)
+        assert list(decoder.feed(stream[: length - 1])) == []
+        assert decoder.pending == length - 1
+        assert serial_numbers(decoder.feed(stream[length - 1 : length + 10])) == [0]
+        assert decoder.pending == 10
+
+    def test_read_from(self, schemaCodec, cars):
+        stream = cars()
+        decoder = StreamDecoder(schemaCodec, capacity=256, flyweights=True)
+        numbers = [
+            flyweight.serialNumber
+            for flyweight in decoder.readFrom(io.BytesIO(stream), chunkSize=50)
+        ]
+        assert numbers == list(range(20))
+
+        with pytest.raises(ValueError, match="5 bytes left over"):
+            list(StreamDecoder(schemaCodec).readFrom(io.BytesIO(stream + stream[:5])))